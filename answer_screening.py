@@ -0,0 +1,124 @@
+import re
+import threading
+import time
+from collections import deque
+
+from hybrid_retrieval import tokenize
+from tracing import percentile
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Only phrases that can't be a real answer; "none", "nothing" or "unknown" can be, so those go to the LLM
+NON_ANSWERS = frozenset((
+    "idk", "i dont know", "i do not know", "dont know", "do not know", "no idea", "i have no idea",
+    "im not sure", "i am not sure", "dunno", "no clue",
+))
+
+VERDICTS = {
+    'blank': "Verdict: Incorrect\nFeedback: No answer was given.",
+    'non_answer': "Verdict: Incorrect\nFeedback: The answer says you don't know; review the document and try again.",
+    'copied_question': "Verdict: Incorrect\nFeedback: The answer only restates the question without answering it.",
+    'reference_match': "Verdict: Correct\nFeedback: Your answer covers the key points of the reference answer.",
+}
+
+def words(text):
+    # Drop apostrophes first so "don't" matches "dont"
+    return WORD_PATTERN.findall(re.sub(r"['\u2019]", "", text.lower()))
+
+class AnswerScreener:
+    """Settles trivial answers locally so only the ambiguous ones are graded by the LLM.
+
+    Lexical checks catch blank answers, "idk"-style non-answers and answers
+    that add nothing to the question's own words. With an embedding function,
+    answers nearly identical to the question are caught as restatements and
+    answers close to a banked reference answer are marked correct. Short
+    answers are never treated as restatements, since "X is Y" can answer
+    "Is X Y?". Every settled answer gets a fixed Verdict/Feedback text.
+
+    One instance is shared by the process and counts how many answers it
+    settled and how long screening took per answer.
+    """
+
+    def __init__(self, question_similarity=0.98, reference_similarity=None, restatement_min_words=8, window=1000):
+        self.question_similarity = question_similarity
+        self.reference_similarity = reference_similarity
+        self.restatement_min_words = restatement_min_words
+        self._lock = threading.Lock()
+        self._answers = 0
+        self._by_reason = {}
+        self._latencies = deque(maxlen=window)
+
+    def lexical_reason(self, question, answer):
+        answer_words = words(answer)
+        if not answer_words:
+            return 'blank'
+        if ' '.join(answer_words) in NON_ANSWERS:
+            return 'non_answer'
+        if len(answer_words) < self.restatement_min_words:
+            return None
+        answer_terms = set(tokenize(answer))
+        question_terms = set(tokenize(question))
+        # Only its words and most of them: a one-word pick from "X or Y?" questions is a real answer
+        if answer_terms <= question_terms and len(answer_terms) >= max(2, len(question_terms) / 2):
+            return 'copied_question'
+        return None
+
+    def screen(self, items, references=None, embed=None):
+        """Screen (number, question, answer) items before retrieval; returns {number: verdict text}.
+
+        references maps question text to a banked reference answer; embed is
+        an embed_documents-style function, only called if something is left
+        to compare.
+        """
+        start = time.perf_counter()
+        reasons = {}
+        for number, question, answer in items:
+            reason = self.lexical_reason(question, answer)
+            if reason:
+                reasons[number] = reason
+
+        remaining = [item for item in items if item[0] not in reasons]
+        if embed is not None and remaining:
+            # numpy only loads once there is something to embed, so importing this module stays cheap
+            from diversity import normalize_rows
+            references = references or {}
+            texts = []
+            for _, question, answer in remaining:
+                texts += [answer, question]
+            with_reference = [item for item in remaining if self.reference_similarity and item[1] in references]
+            texts += [references[question] for _, question, _ in with_reference]
+            vectors = normalize_rows(embed(texts))
+
+            reference_vectors = dict(zip(
+                (number for number, _, _ in with_reference), vectors[2 * len(remaining):]
+            ))
+            for index, (number, _, answer) in enumerate(remaining):
+                answer_vector, question_vector = vectors[2 * index], vectors[2 * index + 1]
+                if (len(words(answer)) >= self.restatement_min_words
+                        and float(answer_vector @ question_vector) >= self.question_similarity):
+                    reasons[number] = 'copied_question'
+                elif number in reference_vectors and float(answer_vector @ reference_vectors[number]) >= self.reference_similarity:
+                    reasons[number] = 'reference_match'
+
+        self._record(len(items), reasons, time.perf_counter() - start)
+        return {number: VERDICTS[reason] for number, reason in reasons.items()}
+
+    def _record(self, answers, reasons, seconds):
+        with self._lock:
+            self._answers += answers
+            for reason in reasons.values():
+                self._by_reason[reason] = self._by_reason.get(reason, 0) + 1
+            if answers:
+                self._latencies.append(seconds * 1000 / answers)
+
+    def get_stats(self):
+        with self._lock:
+            short_circuited = sum(self._by_reason.values())
+            return {
+                'answers': self._answers,
+                'short_circuited': short_circuited,
+                'short_circuit_fraction': round(short_circuited / self._answers, 3) if self._answers else None,
+                'by_reason': dict(self._by_reason),
+                'latency_per_answer_p50_ms': percentile(self._latencies, 50, digits=3),
+                'latency_per_answer_p95_ms': percentile(self._latencies, 95, digits=3),
+            }
@@ -1,31 +1,175 @@
-from flask import Flask, session
+from flask import Flask, session, request, has_request_context, g
 from flask_login import LoginManager
 from oauthlib.oauth2 import WebApplicationClient
-import requests
+import json
+import logging
 import pathlib
 import os
+import time
 from config import Config
-from document_processor import DocumentProcessor
-from rag_service import RAGService
+from model_registry import registry
+from startup import StartupReport
+from tracing import tracer
+from ingest_jobs import IngestJobQueue
+from response_cache import ResponseCache
+from oauth_provider import GoogleProvider, StubProvider
+from llm_usage import LLMUsageTracker
+from llm_scheduler import LLMScheduler
+from question_bank import QuestionBankFiller
+from answer_screening import AnswerScreener
+from blocking_executor import BlockingExecutor
+from session_store import create_store, ServerSideSessionInterface, QuizStore
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1' ##This is temporary for the app to run on http
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+logging.basicConfig(level=app.config['LOG_LEVEL'], format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+tracer.configure(
+    enabled=app.config['TRACING_ENABLED'],
+    profile_threshold_ms=app.config['PROFILE_SLOW_REQUESTS_MS']
+)
+
+# document_processor and rag_service (pandas, PyPDF2, docx, langchain, ...) load on first use; see get_user_services
+startup = StartupReport()
+
 # OAuth 2.0 client setup
 client = WebApplicationClient(app.config['GOOGLE_CLIENT_ID'])
 
+if app.config['OAUTH_PROVIDER'] == 'stub':
+    oauth_provider = StubProvider()
+else:
+    oauth_provider = GoogleProvider(
+        app.config['GOOGLE_DISCOVERY_URL'],
+        app.config['GOOGLE_CLIENT_ID'],
+        app.config['GOOGLE_CLIENT_SECRET'],
+        timeout=app.config['OAUTH_HTTP_TIMEOUT'],
+        default_ttl=app.config['OAUTH_DISCOVERY_TTL']
+    )
+
+# Session data and generated quizzes live server-side; the cookie only carries a session id
+session_store = create_store(
+    app.config['SESSION_STORE'],
+    path=os.path.join(app.config['BASE_STORAGE_DIR'], 'sessions.sqlite3'),
+    url=app.config['SESSION_STORE_URL']
+)
+app.session_interface = ServerSideSessionInterface(session_store, app.config['SESSION_TTL_SECONDS'])
+quiz_store = QuizStore(session_store, app.config['QUIZ_TTL_SECONDS'])
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login' #this is the route of login
 
+# Background document ingestion
+ingest_queue = IngestJobQueue(
+    os.path.join(app.config['BASE_STORAGE_DIR'], 'ingest_jobs.sqlite3'),
+    max_workers=app.config['INGEST_MAX_WORKERS'],
+    max_jobs_per_user=app.config['INGEST_MAX_JOBS_PER_USER']
+)
+
+# Retrieval and LLM responses are keyed on content digests, so one cache is shared by all users
+response_cache = None
+if app.config['RESPONSE_CACHE_ENABLED']:
+    response_cache = ResponseCache(
+        os.path.join(app.config['BASE_STORAGE_DIR'], 'response_cache.sqlite3'),
+        memory_items=app.config['RESPONSE_CACHE_MEMORY_ITEMS'],
+        ttl_seconds=app.config['RESPONSE_CACHE_TTL_SECONDS']
+    )
+
+registry.configure_embeddings(
+    batch_size=app.config['EMBEDDING_BATCH_SIZE'],
+    num_threads=app.config['EMBEDDING_THREADS'],
+    workers=app.config['EMBEDDING_WORKERS'],
+    backend=app.config['EMBEDDING_BACKEND']
+)
+
+# Token and latency accounting for every LLM call
+llm_usage = LLMUsageTracker(
+    daily_token_quota=app.config['DAILY_TOKEN_QUOTA'],
+    # Daily totals in SQLite so every worker process enforces the same quota
+    path=os.path.join(app.config['BASE_STORAGE_DIR'], 'llm_usage.sqlite3')
+)
+
+def per_worker(limit):
+    """This process's share of a per-key provider limit; the buckets are per process."""
+    return limit and max(1, limit // app.config['WEB_CONCURRENCY'])
+
+# One gate for all outbound LLM calls: concurrency cap, per-user fair queue, provider rate limits and retries
+llm_scheduler = LLMScheduler(
+    max_concurrency=app.config['LLM_MAX_CONCURRENCY'],
+    requests_per_minute=per_worker(app.config['LLM_REQUESTS_PER_MINUTE']),
+    tokens_per_minute=per_worker(app.config['LLM_TOKENS_PER_MINUTE']),
+    max_retries=app.config['LLM_MAX_RETRIES']
+)
+
+# Question banks are built and topped up off the request path
+question_bank_filler = QuestionBankFiller(max_workers=app.config['QUESTION_BANK_WORKERS'])
+
+# Settles blank, "idk", restated and reference-matching answers without the LLM; shared so its counters cover all users
+answer_screener = AnswerScreener(
+    question_similarity=app.config['SCREEN_QUESTION_SIMILARITY'],
+    reference_similarity=app.config['PREGRADE_SIMILARITY'],
+    restatement_min_words=app.config['SCREEN_RESTATEMENT_MIN_WORDS']
+)
+
+# Embedding, retrieval and SQLite work of the async routes (asgi.py) runs here rather than on the event loop
+blocking_executor = BlockingExecutor(max_workers=app.config['ASYNC_BLOCKING_WORKERS'])
+
+def warm_up(encode=True):
+    """Import the ingest/RAG modules and load the embedding model ahead of the first request.
+
+    encode=False is the fork-safe variant for a pre-fork master (see gunicorn.conf.py):
+    workers share the loaded pages copy-on-write and each finishes with warm_up_worker().
+    """
+    start = time.perf_counter()
+    for module_name in ('document_processor', 'rag_service'):
+        startup.load(module_name)
+    registry.warm_up([app.config['EMBEDDING_MODEL_NAME']], encode=encode)
+    startup.record_phase('warm_up', time.perf_counter() - start)
+
+def warm_up_worker():
+    """Run once in each forked worker: the first encode initialises torch's thread pool for this process."""
+    start = time.perf_counter()
+    registry.warm_up([app.config['EMBEDDING_MODEL_NAME']], encode=True)
+    startup.record_phase('worker_warm_up', time.perf_counter() - start)
+
+if app.config['PREFORK_PRELOAD']:
+    warm_up(encode=False)
+elif app.config['PRELOAD_EMBEDDINGS']:
+    warm_up()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # The profiler samples per thread; async views share the event loop thread with other requests
+    if tracer.profiler is not None and not request.environ.get('quiz.async_view'):
+        tracer.profiler.start()
+
+@app.after_request
+def record_first_request(response):
+    # Only each endpoint's first request is kept, for the startup report
+    if 'request_started' in g:
+        startup.record_request(request.endpoint or request.path, time.perf_counter() - g.request_started)
+    return response
+
+@app.teardown_request
+def record_route_span(exc):
+    # Teardown also runs after errors, and after the body of a stream_with_context response has been sent
+    if 'request_started' not in g:
+        return
+    name = f"route.{request.endpoint or 'unknown'}"
+    seconds = time.perf_counter() - g.request_started
+    tracer.record(name, seconds)
+    if tracer.profiler is not None and not request.environ.get('quiz.async_view'):
+        tracer.profiler.stop(name, seconds)
+
 # User session management
 @login_manager.user_loader
 def load_user(user_id):
     if not user_id:
         return None
-    # Get user data from session
+    # Get user data from the server-side session
     user_data = session.get('user_data')
     if user_data:
         from models import User
@@ -33,7 +177,7 @@ def load_user(user_id):
     return None
 
 def get_google_provider_cfg():
-    return requests.get(app.config['GOOGLE_DISCOVERY_URL']).json()
+    return oauth_provider.get_config()
 
 def get_user_storage_path(user_id):  #this code is responsible for genereating user specific path for embeddings
     """Create and return user-specific storage paths"""
@@ -46,29 +190,91 @@ def get_user_storage_path(user_id):  #this code is responsible for genereating u
     save_dir.mkdir(exist_ok=True)
     embeddings_dir = user_path / 'embeddings'
     embeddings_dir.mkdir(exist_ok=True)
+    cache_dir = user_path / 'cache'
+    cache_dir.mkdir(exist_ok=True)
     
-    return str(save_dir), str(embeddings_dir)
+    return str(save_dir), str(embeddings_dir), str(cache_dir)
+
+def get_user_services(user_id, route=None):
+    """Get or create user-specific document processor and RAG service.
 
-def get_user_services(user_id):
-    """Get or create user-specific document processor and RAG service"""
-    save_dir, embeddings_dir = get_user_storage_path(user_id)
+    LLM usage is attributed to `route`, or to the current request's endpoint.
+    """
+    save_dir, embeddings_dir, cache_dir = get_user_storage_path(user_id)
+    DocumentProcessor = startup.load('document_processor').DocumentProcessor
+    RAGService = startup.load('rag_service').RAGService
     
     doc_processor = DocumentProcessor(
         save_dir=save_dir,
         chunk_size=app.config['CHUNK_SIZE'],
-        chunk_overlap=app.config['CHUNK_OVERLAP'] ##chunk overlap is responsible for maintaining the continuity of the chunk
+        chunk_overlap=app.config['CHUNK_OVERLAP'], ##chunk overlap is responsible for maintaining the continuity of the chunk
+        pdf_workers=app.config['PDF_EXTRACT_WORKERS'],
+        pdf_parallel_min_pages=app.config['PDF_PARALLEL_MIN_PAGES'],
+        csv_chunk_rows=app.config['CSV_CHUNK_ROWS']
     )
 
+    shared_embedding_cache_path = None
+    if app.config['SHARED_EMBEDDING_CACHE_DIR']:
+        shared_embedding_cache_path = os.path.join(app.config['SHARED_EMBEDDING_CACHE_DIR'], 'embeddings.sqlite3')
+
     rag_service = RAGService(
         groq_api_key=app.config['GROQ_API_KEY'],
         model_name=app.config['MODEL_NAME'],
         embedding_model_name=app.config['EMBEDDING_MODEL_NAME'],
-        embeddings_dir=embeddings_dir
+        embeddings_dir=embeddings_dir,
+        validation_batch_size=app.config['VALIDATION_BATCH_SIZE'],
+        validation_concurrency=app.config['VALIDATION_CONCURRENCY'],
+        retrieval_k=app.config['RETRIEVAL_K'],
+        embedding_cache_path=os.path.join(cache_dir, 'embeddings.sqlite3'),
+        shared_embedding_cache_path=shared_embedding_cache_path,
+        embedding_cache_max_bytes=app.config['EMBEDDING_CACHE_MAX_BYTES'],
+        response_cache=response_cache,
+        hybrid_retrieval=app.config['HYBRID_RETRIEVAL'],
+        retrieval_candidates=app.config['RETRIEVAL_CANDIDATES'],
+        reranker_model_name=app.config['RERANKER_MODEL_NAME'],
+        context_token_budget=app.config['MODEL_CONTEXT_BUDGETS'].get(app.config['MODEL_NAME'], app.config['CONTEXT_TOKEN_BUDGET']),
+        questions_per_cluster=app.config['QUESTIONS_PER_CLUSTER'],
+        diversity_sample_size=app.config['DIVERSITY_SAMPLE_SIZE'],
+        duplicate_threshold=app.config['DUPLICATE_QUESTION_THRESHOLD'],
+        tokenizer_name=app.config['TOKENIZER_NAME'],
+        usage_tracker=llm_usage,
+        llm_scheduler=llm_scheduler,
+        groq_api_base=app.config['GROQ_API_BASE'],
+        user_id=user_id,
+        route=route or (request.endpoint if has_request_context() else None),
+        answer_screener=answer_screener,
+        vector_store_backend=app.config['VECTOR_STORE'],
+        vector_dtype=app.config['VECTOR_DTYPE'],
+        storage_quota_bytes=app.config['USER_STORAGE_QUOTA_MB'] and app.config['USER_STORAGE_QUOTA_MB'] * 2 ** 20,
+        max_collections=app.config['USER_COLLECTION_QUOTA'],
+        cold_after_days=app.config['COLD_AFTER_DAYS'],
+        blocking_executor=blocking_executor
     )
     
     return doc_processor, rag_service
 
+@app.cli.command('compact-storage')
+def compact_storage():
+    """Archive idle collections and compact vector files for every user, printing the bytes reclaimed."""
+    base_path = pathlib.Path(app.config['BASE_STORAGE_DIR'])
+    report = {}
+    user_paths = sorted(path for path in base_path.iterdir() if (path / 'embeddings').is_dir()) if base_path.is_dir() else []
+    for user_path in user_paths:
+        _, rag_service = get_user_services(user_path.name, route='storage')
+        archived = rag_service.evict_idle_collections()
+        compacted = rag_service.compact_collections()
+        storage = rag_service.storage_report()
+        report[user_path.name] = {
+            'archived': archived,
+            'compacted_bytes': compacted,
+            'bytes': storage['bytes'],
+            'reclaimed_bytes': storage['reclaimed_bytes'],
+        }
+    print(json.dumps(report, indent=2))
+
 from routes import *
 
+startup.mark_ready()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False)
\ No newline at end of file
@@ -0,0 +1,212 @@
+# uvicorn asgi:application --port 5000
+"""Async serving mode for the LLM-bound routes.
+
+POST /generate_questions and POST /submit_answers run as coroutines here: a
+request waiting on the LLM holds no thread, so one process can keep hundreds
+in flight. Their blocking parts (embedding, retrieval, SQLite) go through
+the bounded blocking executor. Every other route, including the SSE
+streams, is the unchanged Flask app behind WsgiToAsgi.
+"""
+import functools
+import io
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template, request, redirect, url_for, flash, session
+from flask_login import current_user
+
+from app import app, blocking_executor, get_user_services, quiz_store
+from llm_usage import QuotaExceededError
+from routes import take_banked_questions
+
+def login_required(view):
+    """flask_login.login_required for the async views."""
+    @functools.wraps(view)
+    async def wrapper():
+        if not app.config.get('LOGIN_DISABLED') and not current_user.is_authenticated:
+            return app.login_manager.unauthorized()
+        return await view()
+    return wrapper
+
+@login_required
+async def generate_questions():
+    collection_name = session.get(f'collection_name_{current_user.id}')
+    if not collection_name:
+        flash('Please upload a document first')
+        return redirect(url_for('upload_file'))
+
+    session['current_step'] = 1
+
+    question_count = int(request.form.get('question_count', 5))
+    complexity = request.form.get('complexity', 'Easy')
+    regenerate = request.form.get('regenerate') == '1'
+
+    _, rag_service = await blocking_executor.run(get_user_services, current_user.id)
+    if app.config['QUESTION_GENERATION_MODE'] == 'diverse':
+        generate = rag_service.agenerate_diverse_questions
+    else:
+        generate = rag_service.agenerate_questions
+    questions = await blocking_executor.run(take_banked_questions, rag_service, collection_name, question_count, complexity)
+    if not questions:
+        try:
+            questions = await generate(
+                collection_name,
+                question_count,
+                complexity,
+                use_cache=not regenerate
+            )
+        except QuotaExceededError as e:
+            flash(str(e))
+            return redirect(url_for('generate_questions'))
+
+    quiz_id = await blocking_executor.run(quiz_store.create, current_user.id, collection_name, questions, complexity)
+    session['current_step'] = 2
+    return render_template('questions.html',
+                         questions=questions,
+                         quiz_id=quiz_id,
+                         current_step=session['current_step'],
+                         user=current_user,
+                         show_progress_bar=True)
+
+@login_required
+async def submit_answers():
+    quiz = await blocking_executor.run(quiz_store.get, request.form.get('quiz_id'), current_user.id)
+    if quiz is None:
+        flash('These questions have expired, please generate a new set')
+        return redirect(url_for('generate_questions'))
+
+    session['current_step'] = 3
+
+    questions = quiz['questions']
+    answers = request.form.getlist('answers')[:len(questions)]
+
+    _, rag_service = await blocking_executor.run(get_user_services, current_user.id)
+    try:
+        validations = await rag_service.avalidate_answers(
+            quiz['collection_name'],
+            list(zip(questions, answers))
+        )
+    except QuotaExceededError as e:
+        flash(str(e))
+        return redirect(url_for('generate_questions'))
+
+    return render_template('results.html',
+                         questions=questions,
+                         answers=answers,
+                         validations=validations,
+                         current_step=session['current_step'],
+                         user=current_user,
+                         zip=zip,
+                         show_progress_bar=True)
+
+ASYNC_VIEWS = {
+    ('POST', '/generate_questions'): generate_questions,
+    ('POST', '/submit_answers'): submit_answers,
+}
+
+def request_path(scope):
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    return path[len(root_path):] if root_path and path.startswith(root_path) else path
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP request, so Flask's request, session and url_for work unchanged."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': request_path(scope).encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        # Tells app.py this request shares the event loop thread with others (see start_request_timer)
+        'quiz.async_view': True,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+async def dispatch(view):
+    # Flask's full_dispatch_request, awaiting the view
+    try:
+        rv = app.preprocess_request()
+        if rv is None:
+            rv = await view()
+    except Exception as e:
+        rv = app.handle_user_exception(e)
+    # Saving the session is a SQLite write, so it runs on the pool along with the after_request hooks
+    return await blocking_executor.run(app.finalize_request, rv)
+
+async def open_session(ctx):
+    """Load the session on the pool before the context is pushed, so push() doesn't read SQLite on the loop.
+
+    current_user then needs no I/O: the user loader only reads this session.
+    """
+    session = await blocking_executor.run(app.session_interface.open_session, app, ctx.request)
+    ctx.session = session if session is not None else app.session_interface.make_null_session(app)
+
+async def handle_async_view(view, scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return
+    ctx = app.request_context(build_environ(scope, body))
+    await open_session(ctx)
+    ctx.push()
+    error = None
+    try:
+        try:
+            response = await dispatch(view)
+        except Exception as e:
+            error = e
+            response = await blocking_executor.run(app.handle_exception, e)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.encode('latin1'), value.encode('latin1')) for name, value in response.headers.to_wsgi_list()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+    finally:
+        ctx.pop(error)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+wsgi_application = WsgiToAsgi(app)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    view = ASYNC_VIEWS.get((scope['method'], request_path(scope))) if scope['type'] == 'http' else None
+    if view is None:
+        await wsgi_application(scope, receive, send)
+        return
+    await handle_async_view(view, scope, receive, send)
@@ -0,0 +1,247 @@
+"""Load-test quiz generation and grading with hundreds of students in flight at once.
+
+Starts the fake LLM server and the app in a scratch directory (stub OAuth
+provider, no Groq), uploads a small document, then has every simulated
+student generate a quiz and submit answers at the same time. The app runs
+as one uvicorn process on asgi:application (--mode async), or as one
+threaded gunicorn worker for comparison (--mode sync). Reports completed
+and failed requests, latency percentiles, the server's RSS over the run
+and how many LLM calls the fake server saw at once.
+
+Usage:
+    python -m benchmarks.async_load --students 300 --llm-latency 2
+    python -m benchmarks.async_load --mode sync --threads 32 --students 300 --output sync.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.fake_llm_server import start_server
+from benchmarks.run import percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUIZ_ID_PATTERN = re.compile(r'name="quiz_id" value="([^"]+)"')
+
+DOCUMENT = "\n\n".join(
+    f"Section {number}. Photosynthesis converts light energy into chemical energy stored in glucose. "
+    f"Chlorophyll in the chloroplasts absorbs mostly red and blue light, and the Calvin cycle fixes "
+    f"carbon dioxide using ATP and NADPH produced by the light reactions (variant {number})."
+    for number in range(40)
+)
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def process_tree_rss_bytes(pid):
+    """RSS of a process and its children (gunicorn's master plus worker), from /proc."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/statm') as statm:
+                total += int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as children:
+                    pending.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+class RSSWatcher:
+    """Samples the server's RSS on a background thread."""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(process_tree_rss_bytes(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        return {
+            'start_mb': round(self.samples[0] / 2 ** 20, 1),
+            'peak_mb': round(max(self.samples) / 2 ** 20, 1),
+            'end_mb': round(self.samples[-1] / 2 ** 20, 1),
+        }
+
+def start_app(mode, port, llm_base_url, args, work_dir):
+    env = dict(os.environ)
+    env.update({
+        'OAUTH_PROVIDER': 'stub',
+        'SECRET_KEY': env.get('SECRET_KEY', 'async-load'),
+        'groq_api_key': 'fake-key',
+        'GROQ_API_BASE': llm_base_url,
+        'LLM_MAX_CONCURRENCY': str(args.llm_concurrency),
+        'LLM_REQUESTS_PER_MINUTE': '0',
+        'LLM_TOKENS_PER_MINUTE': '0',
+        # Every student should reach the LLM, not the response cache or a question bank
+        'RESPONSE_CACHE_ENABLED': 'false',
+        'QUESTION_BANK_SIZE': '0',
+        'QUESTION_GENERATION_MODE': args.generation_mode,
+        'ASYNC_BLOCKING_WORKERS': str(args.blocking_workers),
+        'LOG_LEVEL': 'WARNING',
+        'METRICS_ADMIN_EMAILS': 'student@example.com',  # the stub provider's user, so the report can read /metrics
+    })
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    if mode == 'async':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+                   '--log-level', 'warning', '--backlog', '4096']
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '--workers', '1', '--threads', str(args.threads),
+                   '--bind', f'127.0.0.1:{port}', '--backlog', '4096', '--timeout', '600', 'app:app']
+    return subprocess.Popen(command, cwd=work_dir, env=env)
+
+async def wait_until_up(client, server, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"App exited with status {server.returncode}")
+        try:
+            await client.get('/')
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('App did not start in time')
+
+async def log_in_and_upload(client):
+    await client.get('/login', follow_redirects=True)
+    response = await client.post(
+        '/upload_file', files={'file': ('notes.txt', DOCUMENT.encode(), 'text/plain')},
+        headers={'Accept': 'application/json'}
+    )
+    response.raise_for_status()
+    status_url = response.json()['status_url']
+    while True:
+        job = (await client.get(status_url)).json()
+        if job['status'] == 'done':
+            return
+        if job['status'] == 'failed':
+            raise RuntimeError(f"Upload failed: {job['error']}")
+        await asyncio.sleep(0.5)
+
+async def run_student(client, args, results, in_flight):
+    """Generate one quiz and answer it; records each step's latency, or the error."""
+    in_flight['now'] += 1
+    in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+    try:
+        start = time.perf_counter()
+        response = await client.post('/generate_questions', data={
+            'question_count': str(args.questions), 'complexity': 'Easy', 'regenerate': '1'
+        })
+        match = QUIZ_ID_PATTERN.search(response.text) if response.status_code == 200 else None
+        if match is None:
+            results['errors'].append(f"generate_questions: HTTP {response.status_code}")
+            return
+        results['generate'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        response = await client.post('/submit_answers', data={
+            'quiz_id': match.group(1),
+            'answers': [f"Chlorophyll absorbs light for answer {number}" for number in range(args.questions)],
+        })
+        if response.status_code != 200 or 'validation-text' not in response.text:
+            results['errors'].append(f"submit_answers: HTTP {response.status_code}")
+            return
+        results['submit'].append(time.perf_counter() - start)
+    except httpx.HTTPError as e:
+        results['errors'].append(f"{type(e).__name__}: {e}")
+    finally:
+        in_flight['now'] -= 1
+
+def latency_summary(seconds):
+    seconds = sorted(seconds)
+    return {
+        'completed': len(seconds),
+        'p50_s': round(percentile(seconds, 50), 2) if seconds else None,
+        'p95_s': round(percentile(seconds, 95), 2) if seconds else None,
+        'max_s': round(seconds[-1], 2) if seconds else None,
+    }
+
+async def run_load(args, base_url, server):
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        await wait_until_up(client, server)
+        await log_in_and_upload(client)
+        # The stub provider always logs in the same user, so all students share its session
+        results = {'generate': [], 'submit': [], 'errors': []}
+        in_flight = {'now': 0, 'peak': 0}
+        with RSSWatcher(server.pid) as rss:
+            start = time.perf_counter()
+            await asyncio.gather(*(run_student(client, args, results, in_flight) for _ in range(args.students)))
+            elapsed = time.perf_counter() - start
+        metrics = (await client.get('/metrics')).json()
+    return {
+        'students': args.students,
+        'elapsed_seconds': round(elapsed, 2),
+        'peak_in_flight': in_flight['peak'],
+        'generate_questions': latency_summary(results['generate']),
+        'submit_answers': latency_summary(results['submit']),
+        'errors': len(results['errors']),
+        'first_errors': results['errors'][:5],
+        'server_rss': rss.summary(),
+        'llm_scheduler': metrics.get('llm_scheduler'),
+        'blocking_executor': metrics.get('blocking_executor'),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('async', 'sync'), default='async')
+    parser.add_argument('--students', type=int, default=300, help='students generating and answering a quiz at once')
+    parser.add_argument('--questions', type=int, default=3, help='questions per quiz')
+    parser.add_argument('--llm-latency', type=float, default=2.0, help='fake LLM seconds per call')
+    parser.add_argument('--llm-concurrency', type=int, default=512, help="the app's LLM_MAX_CONCURRENCY")
+    parser.add_argument('--blocking-workers', type=int, default=8, help="the app's ASYNC_BLOCKING_WORKERS (async mode)")
+    parser.add_argument('--threads', type=int, default=32, help='gunicorn threads (sync mode)')
+    parser.add_argument('--generation-mode', default='standard', choices=('standard', 'diverse'))
+    parser.add_argument('--timeout', type=float, default=600, help='client timeout per request, seconds')
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    llm_server = start_server(latency=args.llm_latency)
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix='async_load_') as work_dir:
+        server = start_app(args.mode, port, llm_server.base_url, args, work_dir)
+        try:
+            report = asyncio.run(run_load(args, f'http://127.0.0.1:{port}', server))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    report = {'mode': args.mode, **report, 'llm_server': llm_server.get_stats()}
+    llm_server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Measure worker cold start: app import time, RSS, and first-request latency per endpoint.
+
+Each mode runs in a fresh interpreter (in a scratch directory, with the stub
+OAuth provider) so nothing is already imported or loaded.
+
+Usage:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --modes lazy,preload --output cold_start.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'lazy': {},
+    'preload': {'PRELOAD_EMBEDDINGS': 'true'},
+}
+
+PROBE = r"""
+import json, os, time
+
+def current_rss_bytes():
+    # Inline rather than from benchmarks.run, which imports the heavy modules being measured
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+start = time.perf_counter()
+import app as app_module
+import_seconds = time.perf_counter() - start
+rss_after_import = current_rss_bytes()
+
+client = app_module.app.test_client()
+requests = {}
+for path in ('/', '/login'):
+    start = time.perf_counter()
+    client.get(path)
+    requests[path] = round((time.perf_counter() - start) * 1000, 1)
+
+# First touch of the ingest/RAG path, as the first upload would do
+start = time.perf_counter()
+app_module.get_user_services('cold-start-user')
+services_ms = round((time.perf_counter() - start) * 1000, 1)
+
+print(json.dumps({
+    'import_app_ms': round(import_seconds * 1000, 1),
+    'rss_after_import_mb': round(rss_after_import / 2 ** 20, 1),
+    'first_request_ms': requests,
+    'first_user_services_ms': services_ms,
+    'rss_after_services_mb': round(current_rss_bytes() / 2 ** 20, 1),
+    'startup_report': app_module.startup.get_report(),
+}))
+"""
+
+def run_mode(name, env_overrides):
+    env = dict(os.environ)
+    env.update({'OAUTH_PROVIDER': 'stub', 'SECRET_KEY': env.get('SECRET_KEY', 'cold-start')}, **env_overrides)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    with tempfile.TemporaryDirectory(prefix='cold_start_') as work_dir:
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=work_dir, env=env, capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    report = {name: run_mode(name, MODES[name]) for name in args.modes.split(',')}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
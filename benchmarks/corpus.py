@@ -0,0 +1,110 @@
+import csv
+import io
+import random
+
+# Approximate amount of text per generated document
+SIZES = {
+    'small': 20_000,
+    'medium': 200_000,
+    'large': 2_000_000,
+}
+
+WORDS = (
+    "cell membrane protein energy system network model data process structure function "
+    "theory evidence analysis method result variable equation market policy history culture "
+    "language memory signal input output layer algorithm graph matrix vector gradient"
+).split()
+
+def generate_text(size, seed=0):
+    """Pseudo-random paragraphs of roughly `size` characters."""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+            sentences.append(' '.join(words).capitalize() + '.')
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)
+
+def generate_txt(size, seed=0):
+    return generate_text(size, seed).encode('utf-8')
+
+def generate_csv(size, seed=0):
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['student_id', 'topic', 'score', 'comment'])
+    row = 0
+    while buffer.tell() < size:
+        row += 1
+        comment = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        writer.writerow([row, rng.choice(WORDS), rng.randint(0, 100), comment])
+    return buffer.getvalue().encode('utf-8')
+
+def generate_docx(size, seed=0):
+    from docx import Document
+
+    document = Document()
+    for paragraph in generate_text(size, seed).split('\n\n'):
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def generate_pdf(size, seed=0, lines_per_page=45, chars_per_line=90):
+    """Minimal multi-page PDF with Helvetica text, enough for PyPDF2 to extract."""
+    text = generate_text(size, seed).replace('\n\n', ' ')
+    lines = [text[start:start + chars_per_line] for start in range(0, len(text), chars_per_line)]
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = []
+    page_ids = []
+    font_id = 3
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(None)  # page tree, filled in once the page ids are known
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + ' '.join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page_lines
+        ) + " ET"
+        stream = stream.encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (font_id, content_id)
+        )
+        page_ids.append(len(objects))
+    kids = b' '.join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref_offset = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return output.getvalue()
+
+GENERATORS = {
+    'txt': generate_txt,
+    'csv': generate_csv,
+    'docx': generate_docx,
+    'pdf': generate_pdf,
+}
+
+def generate(file_format, size_name, seed=0):
+    """Return (filename, bytes) for a synthetic document."""
+    return f"bench_{size_name}.{file_format}", GENERATORS[file_format](SIZES[size_name], seed)
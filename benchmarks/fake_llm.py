@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import re
+import time
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+class FakeChatGroq:
+    """Deterministic local stand-in for ChatGroq.
+
+    Answers the prompts from prompts.py in the format RAGService parses, after
+    sleeping `latency` seconds (split evenly across chunks when streaming).
+    """
+
+    def __init__(self, latency=0.0, stream_chunks=8):
+        self.latency = latency
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+
+    def _respond(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+        items = re.findall(r"Item (\d+):\s*\n\s*Question to evaluate", prompt)
+        if items:
+            return "\n\n".join(
+                f"Item {number}:\nVerdict: {self._verdict(digest, number)}\nFeedback: Deterministic feedback for item {number}."
+                for number in items
+            )
+
+        if "Student answer to evaluate" in prompt:
+            return f"Verdict: {self._verdict(digest, '0')}\nFeedback: Deterministic feedback for this answer."
+
+        count = re.search(r"Generate (\d+) unique questions", prompt)
+        if count and "reference answer" in prompt:
+            return "\n\n".join(
+                f"Question: What does section {digest[number % len(digest)]}{number} of the document explain?\n"
+                f"Answer: Section {digest[number % len(digest)]}{number} explains a deterministic topic."
+                for number in range(1, int(count.group(1)) + 1)
+            )
+        if count:
+            return "\n".join(
+                f"{number}. What does section {digest[number % len(digest)]}{number} of the document explain?"
+                for number in range(1, int(count.group(1)) + 1)
+            )
+
+        return f"Deterministic response {digest[:12]}"
+
+    @staticmethod
+    def _verdict(digest, number):
+        return "Correct" if int(digest[int(number) % len(digest)], 16) % 2 == 0 else "Incorrect"
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeMessage(self._respond(str(prompt)))
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return FakeMessage(self._respond(str(prompt)))
+
+    def stream(self, prompt):
+        self.calls += 1
+        content = self._respond(str(prompt))
+        size = max(1, len(content) // self.stream_chunks)
+        for start in range(0, len(content), size):
+            if self.latency:
+                time.sleep(self.latency / self.stream_chunks)
+            yield FakeMessage(content[start:start + size])
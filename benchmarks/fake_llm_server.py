@@ -0,0 +1,184 @@
+"""Local HTTP stand-in for Groq's OpenAI-compatible chat completions API.
+
+Answers with FakeChatGroq's deterministic responses and can be told to
+enforce a requests-per-minute limit (429 with Retry-After) and to fail a
+fraction of calls with 503, so rate limiting and retries can be exercised
+without Groq. Point the app at it with GROQ_API_BASE=http://127.0.0.1:8088.
+
+Usage:
+    python -m benchmarks.fake_llm_server --port 8088 --latency 0.3 --rpm 30 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fake_llm import FakeChatGroq
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open hundreds of connections at once
+
+    def __init__(self, address, latency=0.0, rpm=None, error_rate=0.0, stream_chunks=8, seed=0):
+        super().__init__(address, FakeLLMHandler)
+        self.fake = FakeChatGroq(stream_chunks=stream_chunks)
+        self.latency = latency
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque()  # accepted request times within the last minute
+        self.active = 0
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'errors': 0, 'max_concurrent': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        """Return (status, retry_after) for a new request: 200, 429 or 503."""
+        now = time.monotonic()
+        with self.lock:
+            self.stats['requests'] += 1
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            if self.rpm and len(self.recent) >= self.rpm:
+                self.stats['rate_limited'] += 1
+                return 429, max(1, int(60 - (now - self.recent[0])) + 1)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 503, None
+            self.recent.append(now)
+            self.stats['ok'] += 1
+            return 200, None
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.get_stats())
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+
+        status, retry_after = server.admit()
+        if status == 429:
+            self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'tokens', 'code': 'rate_limit_exceeded'}},
+                            {'retry-after': str(retry_after)})
+            return
+        if status == 503:
+            self._send_json(503, {'error': {'message': 'Service unavailable', 'type': 'internal_server_error'}})
+            return
+
+        with server.lock:
+            server.active += 1
+            server.stats['max_concurrent'] = max(server.stats['max_concurrent'], server.active)
+        try:
+            prompt = "\n".join(str(message.get('content', '')) for message in request.get('messages', []))
+            content = server.fake._respond(prompt)
+            usage = {
+                'prompt_tokens': len(prompt) // 4 + 1,
+                'completion_tokens': len(content) // 4 + 1,
+                'total_tokens': len(prompt) // 4 + len(content) // 4 + 2,
+            }
+            if request.get('stream'):
+                self._stream(request, content, usage)
+            else:
+                if server.latency:
+                    time.sleep(server.latency)
+                self._send_json(200, {
+                    'id': f"chatcmpl-fake-{time.time_ns()}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model', 'fake'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': usage,
+                })
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _stream(self, request, content, usage):
+        server = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(data):
+            payload = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(payload):x}\r\n".encode('ascii') + payload + b"\r\n")
+            self.wfile.flush()
+
+        chunk_id = f"chatcmpl-fake-{time.time_ns()}"
+        size = max(1, len(content) // server.fake.stream_chunks)
+        pieces = [content[start:start + size] for start in range(0, len(content), size)]
+        for index, piece in enumerate(pieces):
+            if server.latency:
+                time.sleep(server.latency / len(pieces))
+            last = index == len(pieces) - 1
+            chunk = {
+                'id': chunk_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': request.get('model', 'fake'),
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': 'stop' if last else None}],
+            }
+            if last:
+                chunk['x_groq'] = {'usage': usage}
+            send(json.dumps(chunk))
+        send('[DONE]')
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def start_server(port=0, **options):
+    """Start a server on a background thread; returns it (stop with .shutdown())."""
+    server = FakeLLMServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8088)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per completion')
+    parser.add_argument('--rpm', type=int, default=0, help='requests per minute before answering 429, 0 for no limit')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 503')
+    args = parser.parse_args()
+
+    server = FakeLLMServer(('127.0.0.1', args.port), latency=args.latency, rpm=args.rpm or None, error_rate=args.error_rate)
+    print(f"Fake LLM server on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
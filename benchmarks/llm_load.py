@@ -0,0 +1,92 @@
+"""Fire a classroom's worth of LLM calls through the LLM scheduler at the fake LLM server.
+
+Each simulated user makes --calls calls at once (like submitting a quiz).
+Reports failures, per-user completion times (fairness), the scheduler's
+queue metrics and what the server saw (429s, peak concurrency).
+
+Usage:
+    python -m benchmarks.llm_load --users 60 --calls 5 --heavy-user-calls 30 --rpm 120 --error-rate 0.05
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from benchmarks.fake_llm_server import start_server
+from benchmarks.run import percentile
+from llm_scheduler import LLMScheduler
+from model_registry import registry
+
+def run_user(llm, scheduler, user_id, calls, results):
+    start = time.perf_counter()
+    failures = 0
+    threads = []
+
+    def call(number):
+        nonlocal failures
+        prompt = f"Generate 1 unique questions about item {user_id}-{number}"
+        try:
+            if scheduler is not None:
+                scheduler.run(user_id, lambda: llm.invoke(prompt), tokens=len(prompt) // 4 + 1)
+            else:
+                llm.invoke(prompt)
+        except Exception:
+            failures += 1
+
+    for number in range(calls):
+        thread = threading.Thread(target=call, args=(number,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    results[user_id] = {'seconds': time.perf_counter() - start, 'calls': calls, 'failures': failures}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=60)
+    parser.add_argument('--calls', type=int, default=5, help='calls per user')
+    parser.add_argument('--heavy-user-calls', type=int, default=30, help='calls made by one extra user, 0 for none')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake LLM seconds per call')
+    parser.add_argument('--rpm', type=int, default=300, help='server-side requests per minute limit')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--no-scheduler', action='store_true', help='call the server directly for comparison')
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, rpm=args.rpm, error_rate=args.error_rate)
+    scheduler = None
+    if not args.no_scheduler:
+        scheduler = LLMScheduler(max_concurrency=args.concurrency, requests_per_minute=args.rpm)
+    llm = registry.get_llm('fake-key', 'fake-model', base_url=server.base_url, max_retries=0 if scheduler else 2)
+
+    users = {f"user-{number}": args.calls for number in range(args.users)}
+    if args.heavy_user_calls:
+        users['heavy-user'] = args.heavy_user_calls
+
+    results = {}
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_user, args=(llm, scheduler, user_id, calls, results))
+               for user_id, calls in users.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    light = sorted(result['seconds'] for user_id, result in results.items() if user_id != 'heavy-user')
+    report = {
+        'elapsed_seconds': round(elapsed, 2),
+        'calls': sum(result['calls'] for result in results.values()),
+        'failures': sum(result['failures'] for result in results.values()),
+        'user_seconds_p50': round(statistics.median(light), 2) if light else None,
+        'user_seconds_p95': round(percentile(light, 95), 2) if light else None,
+        'heavy_user_seconds': round(results['heavy-user']['seconds'], 2) if 'heavy-user' in results else None,
+        'scheduler': scheduler.get_stats() if scheduler else None,
+        'server': server.get_stats(),
+    }
+    server.shutdown()
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
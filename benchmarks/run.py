@@ -0,0 +1,226 @@
+"""Benchmark the ingest -> retrieve -> generate pipeline without Groq or real uploads.
+
+Usage:
+    python -m benchmarks.run --formats txt,pdf --sizes small,medium --output bench.json
+    python -m benchmarks.run --compare bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.corpus import SIZES, GENERATORS, generate
+from benchmarks.fake_llm import FakeChatGroq
+from config import Config
+from document_processor import DocumentProcessor
+from model_registry import registry
+from rag_service import RAGService
+
+STAGES = ('extract', 'split', 'embed', 'index', 'query', 'validate')
+
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Not Linux: fall back to the lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == 'Darwin' else peak * 1024
+
+class RSSSampler:
+    """Samples RSS on a background thread to find the peak during one stage."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+class StageRecorder:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def measure(self, stage, items, func, *args, **kwargs):
+        with RSSSampler() as sampler:
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+        self.add(stage, seconds, items(result), sampler.peak)
+        return result
+
+    def add(self, stage, seconds, items, peak_rss):
+        self.samples[stage].append({'seconds': seconds, 'items': items, 'peak_rss': peak_rss})
+
+    def summary(self):
+        report = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            latencies = sorted(sample['seconds'] for sample in samples)
+            total_seconds = sum(latencies)
+            total_items = sum(sample['items'] for sample in samples)
+            report[stage] = {
+                'runs': len(samples),
+                'items': total_items,
+                'throughput_per_sec': round(total_items / total_seconds, 2) if total_seconds else None,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'peak_rss_mb': round(max(sample['peak_rss'] for sample in samples) / 1024 / 1024, 1),
+            }
+        return report
+
+def percentile(sorted_values, pct):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    index = (len(sorted_values) - 1) * pct / 100
+    lower = int(index)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (index - lower)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_case(file_format, size_name, repeat, llm_latency, question_count, work_dir):
+    filename, payload = generate(file_format, size_name)
+    recorder = StageRecorder()
+    # Load the embedding model up front so the first index run doesn't include it
+    embedding_model = registry.get_embeddings(Config.EMBEDDING_MODEL_NAME)
+
+    for run in range(repeat):
+        run_dir = os.path.join(work_dir, f"{file_format}_{size_name}_{run}")
+        processor = DocumentProcessor(
+            save_dir=os.path.join(run_dir, 'documents'),
+            chunk_size=Config.CHUNK_SIZE,
+            chunk_overlap=Config.CHUNK_OVERLAP,
+            logging_enabled=False
+        )
+        rag_service = RAGService(
+            groq_api_key='benchmark',
+            model_name='fake',
+            embedding_model_name=Config.EMBEDDING_MODEL_NAME,
+            embeddings_dir=os.path.join(run_dir, 'embeddings')
+        )
+        rag_service.groq_chat = FakeChatGroq(latency=llm_latency)
+        upload = FileStorage(stream=io.BytesIO(payload), filename=filename)
+
+        if file_format == 'pdf':
+            # PDF pages are extracted lazily while splitting, so extract means draining the page documents
+            documents = recorder.measure('extract', len, lambda: list(processor.load_pdf_documents(upload)))
+        elif file_format == 'csv':
+            # The upload path reads CSVs in row blocks and groups rows into documents as it goes
+            documents = recorder.measure('extract', len, lambda: list(processor.load_csv_documents(upload)))
+        else:
+            text = recorder.measure('extract', lambda _: 1, processor.extract_text_from_file, upload)
+            documents = processor.load_documents(text, filename)
+        split_docs = recorder.measure('split', len, processor.split_documents, documents)
+
+        # Embedding happens inside the index call; its share comes from the engine's counters
+        before = embedding_model.get_stats()
+        collection_name = recorder.measure('index', lambda _: len(split_docs), rag_service.create_rag_chain, split_docs)
+        after = embedding_model.get_stats()
+        recorder.add(
+            'embed', after['seconds'] - before['seconds'], after['chunks'] - before['chunks'],
+            recorder.samples['index'][-1]['peak_rss']
+        )
+
+        questions = rag_service.generate_questions(collection_name, question_count, 'Easy')
+        recorder.measure(
+            'query', len,
+            lambda: [rag_service.retrieve(collection_name, question, use_cache=False) for question in questions]
+        )
+        recorder.measure(
+            'validate', len,
+            rag_service.validate_answers, collection_name,
+            [(question, 'A short student answer.') for question in questions]
+        )
+
+    return recorder.summary()
+
+def compare(previous_path, current):
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    for case, stages in current['results'].items():
+        for stage, stats in stages.items():
+            old = previous.get('results', {}).get(case, {}).get(stage)
+            if not old:
+                continue
+            change = (stats['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            print(f"{case:<14} {stage:<9} p50 {old['p50_ms']:>9.1f} -> {stats['p50_ms']:>9.1f} ms ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--formats', default=','.join(GENERATORS))
+    parser.add_argument('--sizes', default='small')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds per fake LLM call')
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help='previous results JSON to diff against')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='reviewai_bench_')
+    results = {}
+    try:
+        for size_name in args.sizes.split(','):
+            if size_name not in SIZES:
+                parser.error(f"unknown size {size_name}, choose from {', '.join(SIZES)}")
+            for file_format in args.formats.split(','):
+                case = f"{file_format}_{size_name}"
+                print(f"Running {case}...")
+                results[case] = run_case(
+                    file_format, size_name, args.repeat, args.llm_latency, args.questions, work_dir
+                )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'settings': {
+            'repeat': args.repeat,
+            'llm_latency': args.llm_latency,
+            'questions': args.questions,
+            'chunk_size': Config.CHUNK_SIZE,
+            'chunk_overlap': Config.CHUNK_OVERLAP,
+            'embedding_model': Config.EMBEDDING_MODEL_NAME,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == '__main__':
+    main()
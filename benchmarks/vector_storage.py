@@ -0,0 +1,118 @@
+"""Compare vector storage backends: disk bytes, RSS, query latency and recall against exact float32 search.
+
+Uses random unit vectors (all-MiniLM-L6-v2's 384 dimensions) so no model is
+loaded. Each backend runs in a fresh interpreter so RSS is comparable, and
+the cold-tier archive of the same collection is measured too.
+
+Usage:
+    python -m benchmarks.vector_storage
+    python -m benchmarks.vector_storage --chunks 50000 --backends chroma,int8 --output storage.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.run import current_rss_bytes, percentile
+from diversity import normalize_rows
+from vector_storage import QuantizedVectorStore, directory_bytes, write_archive
+
+BACKENDS = ('chroma', 'float16', 'int8')
+DIMENSIONS = 384
+BATCH = 256
+
+def make_corpus(chunks, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = normalize_rows(rng.normal(size=(chunks, DIMENSIONS)))
+    # Queries are noisy copies of stored chunks, like a question about one passage
+    targets = rng.integers(chunks, size=queries)
+    query_vectors = normalize_rows(vectors[targets] + rng.normal(scale=0.05, size=(queries, DIMENSIONS)))
+    return vectors, query_vectors
+
+def run_backend(backend, chunks, queries, k, work_dir):
+    vectors, query_vectors = make_corpus(chunks, queries)
+    ids = [f"chunk-{index}" for index in range(chunks)]
+    texts = [f"Text of chunk {index}." for index in range(chunks)]
+    metadatas = [{'page': index // 10} for index in range(chunks)]
+    rss_before = current_rss_bytes()
+
+    start = time.perf_counter()
+    if backend == 'chroma':
+        import chromadb
+        collection = chromadb.PersistentClient(path=work_dir).get_or_create_collection('bench')
+        for offset in range(0, chunks, BATCH):
+            collection.add(
+                ids=ids[offset:offset + BATCH], embeddings=vectors[offset:offset + BATCH].tolist(),
+                documents=texts[offset:offset + BATCH], metadatas=metadatas[offset:offset + BATCH]
+            )
+        search = lambda query: collection.query(query_embeddings=[query.tolist()], n_results=k)['ids'][0]
+    else:
+        store = QuantizedVectorStore(os.path.join(work_dir, 'bench'), dtype=backend)
+        for offset in range(0, chunks, BATCH):
+            store.add_embeddings(
+                ids[offset:offset + BATCH], vectors[offset:offset + BATCH],
+                texts[offset:offset + BATCH], metadatas[offset:offset + BATCH]
+            )
+        search = lambda query: [doc.id for doc, _ in store.similarity_search_by_vector_with_score(query, k)]
+    build_seconds = time.perf_counter() - start
+
+    exact = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+    latencies = []
+    overlap = 0
+    for query, expected in zip(query_vectors, exact):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        overlap += len(set(found) & {ids[index] for index in expected})
+    latencies.sort()
+
+    archive_path = os.path.join(work_dir, 'cold', 'bench.zip')
+    write_archive(archive_path, ids, vectors, texts, metadatas)
+    archive_bytes = os.path.getsize(archive_path)
+    os.remove(archive_path)
+    return {
+        'chunks': chunks,
+        'disk_mb': round(directory_bytes(work_dir) / 2 ** 20, 2),
+        'cold_archive_mb': round(archive_bytes / 2 ** 20, 2),
+        'rss_growth_mb': round((current_rss_bytes() - rss_before) / 2 ** 20, 1),
+        'build_seconds': round(build_seconds, 2),
+        'query_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'query_p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        f'recall_at_{k}': round(overlap / (len(query_vectors) * k), 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=4)
+    parser.add_argument('--single', help=argparse.SUPPRESS)  # run one backend in this process and print its JSON
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    if args.single:
+        with tempfile.TemporaryDirectory(prefix='vector_storage_') as work_dir:
+            print(json.dumps(run_backend(args.single, args.chunks, args.queries, args.k, work_dir)))
+        return
+
+    report = {}
+    for backend in args.backends.split(','):
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.vector_storage', '--single', backend, '--chunks', str(args.chunks),
+             '--queries', str(args.queries), '-k', str(args.k)],
+            capture_output=True, text=True, check=True
+        )
+        report[backend] = json.loads(result.stdout.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
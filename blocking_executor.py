@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import percentile
+
+class BlockingExecutor:
+    """Bounded thread pool for the blocking work of async requests (embedding, retrieval, SQLite).
+
+    run() awaits func(*args) on a pool thread, carrying the caller's context
+    variables along so Flask's request context and current_user still work
+    there. The pool caps how many of these run at once however many requests
+    are in flight; the rest wait in its queue without a thread each.
+    """
+
+    def __init__(self, max_workers=8, window=1000):
+        self.max_workers = max_workers
+        # Threads start on first use, so creating this in a pre-fork master is safe
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='blocking')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats = {'calls': 0, 'max_queued': 0}
+        self._waits = deque(maxlen=window)
+
+    def _dequeue(self, call_state):
+        # Caller holds self._lock; whichever of the call or its cancellation comes first takes it off the queue
+        if call_state['queued']:
+            call_state['queued'] = False
+            self._queued -= 1
+            return True
+        return False
+
+    def _call(self, call_state, context, func, args):
+        with self._lock:
+            if self._dequeue(call_state):
+                self._waits.append((time.monotonic() - call_state['enqueued_at']) * 1000)
+            self._running += 1
+        try:
+            return context.run(func, *args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run(self, func, *args):
+        call_state = {'queued': True, 'enqueued_at': time.monotonic()}
+        with self._lock:
+            self._queued += 1
+            self._stats['calls'] += 1
+            self._stats['max_queued'] = max(self._stats['max_queued'], self._queued)
+        call = functools.partial(self._call, call_state, contextvars.copy_context(), func, args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except asyncio.CancelledError:
+            with self._lock:
+                self._dequeue(call_state)
+            raise
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'running': self._running,
+                'queued': self._queued,
+                'wait_p50_ms': percentile(self._waits, 50),
+                'wait_p95_ms': percentile(self._waits, 95),
+                **self._stats,
+            }
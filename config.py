@@ -16,13 +16,90 @@ class Config:
     # Model Configuration
     GROQ_API_KEY = os.getenv('groq_api_key')
     MODEL_NAME = 'llama-3.3-70b-versatile'  # or 'mixtral-8x7b-32768l'
+    GROQ_API_BASE = os.getenv('GROQ_API_BASE')  # point at benchmarks/fake_llm_server.py to test without Groq
+
+    # LLM Scheduler Configuration (all outbound LLM calls in this process)
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))  # per worker process
+    # Provider limits for the whole API key, split evenly across WEB_CONCURRENCY workers. Defaults are Groq's
+    # Developer tier for llama-3.3-70b-versatile; on the free tier set 30 and 12000. 0 disables
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '1000')) or None
+    LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '300000')) or None
+    WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))  # worker processes sharing those limits; gunicorn.conf.py sets it
+    LLM_MAX_RETRIES = 4  # on 429/5xx, with jittered exponential backoff
     
     # Document Processing Configuration
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 100
+    PDF_EXTRACT_WORKERS = min(4, os.cpu_count() or 1)  # processes used to extract pages of large PDFs
+    PDF_PARALLEL_MIN_PAGES = 50  # smaller PDFs are extracted in-process
+    CSV_CHUNK_ROWS = 50000  # rows read from a CSV at a time, bounds memory for large spreadsheets
     
+    # Retrieval / LLM Response Cache Configuration
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_MEMORY_ITEMS = 2048  # entries kept in the in-memory LRU in front of SQLite
+    RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+    # Question Generation Configuration
+    QUESTION_GENERATION_MODE = os.getenv('QUESTION_GENERATION_MODE', 'standard')  # 'standard' is one top-k prompt, 'diverse' (opt-in) covers the whole document
+    QUESTIONS_PER_CLUSTER = 3  # questions asked of each topical cluster
+    DIVERSITY_SAMPLE_SIZE = 2000  # max chunks clustered per collection
+    DUPLICATE_QUESTION_THRESHOLD = 0.9  # cosine similarity above which a question counts as a duplicate
+    QUESTION_BANK_SIZE = int(os.getenv('QUESTION_BANK_SIZE', '0'))  # questions pre-generated per complexity after ingest, 0 disables
+    QUESTION_BANK_LOW_WATER = 10  # top the bank up in the background when fewer unserved questions remain
+    QUESTION_BANK_WORKERS = 1  # background threads building banks
+    PREGRADE_SIMILARITY = float(os.getenv('PREGRADE_SIMILARITY', '0')) or None  # opt-in: answer/reference cosine that counts as correct without the LLM; negated answers can still score above 0.9
+
+    # Background Ingestion Configuration
+    INGEST_MAX_WORKERS = 2  # documents processed at once per worker process
+    INGEST_MAX_JOBS_PER_USER = 1  # documents a single user may have queued or processing
+
+    # Answer Validation Configuration
+    VALIDATION_BATCH_SIZE = 5  # question/answer pairs graded per LLM call
+    VALIDATION_CONCURRENCY = 4  # max LLM calls in flight per submission
+    SCREEN_QUESTION_SIMILARITY = 0.98  # answer/question cosine above which the answer just restates the question
+    SCREEN_RESTATEMENT_MIN_WORDS = 8  # shorter answers are never treated as restatements ("X is Y" answers "Is X Y?")
+    RETRIEVAL_K = 4  # max chunks retrieved per question
+
+    # Retrieval Configuration
+    HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', 'true').lower() == 'true'  # fuse BM25 with vector search
+    RETRIEVAL_CANDIDATES = 20  # candidates taken from each retriever before fusion
+    RERANKER_MODEL_NAME = os.getenv('RERANKER_MODEL_NAME')  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2, off when unset
+    CONTEXT_TOKEN_BUDGET = 1500  # max context tokens stuffed into one prompt, unless MODEL_CONTEXT_BUDGETS says otherwise
+    MODEL_CONTEXT_BUDGETS = {
+        'llama-3.3-70b-versatile': 3000,
+        'mixtral-8x7b-32768': 3000,
+    }
+    TOKENIZER_NAME = os.getenv('TOKENIZER_NAME', 'sentence-transformers/all-MiniLM-L6-v2')  # local tokenizer for estimates, scaled to the provider's counts as calls report usage; '' to estimate from characters
+
+    # LLM Usage Configuration
+    DAILY_TOKEN_QUOTA = int(os.getenv('DAILY_TOKEN_QUOTA', '0')) or None  # per user in provider-reported tokens, shared by all workers; unlimited when unset
+
     # Embedding Model Configuration
     EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_CACHE_MAX_BYTES = 256 * 1024 * 1024  # per cache file, least recently used vectors are evicted first
+    SHARED_EMBEDDING_CACHE_DIR = os.getenv('SHARED_EMBEDDING_CACHE_DIR')  # optional cache shared by all users
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')  # 'torch', 'onnx' or 'onnx-int8' (quantized, fastest on CPU; needs optimum[onnxruntime])
+    EMBEDDING_BATCH_SIZE = 64  # chunks encoded per forward pass
+    EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0')) or None  # torch intra-op threads, None keeps the default
+    EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', '1'))  # processes to shard large uploads across
+    PRELOAD_EMBEDDINGS = os.getenv('PRELOAD_EMBEDDINGS', 'false').lower() == 'true'  # load the model at startup instead of on first upload
+    PREFORK_PRELOAD = os.getenv('PREFORK_PRELOAD', 'false').lower() == 'true'  # fork-safe preload in a gunicorn --preload master, set by gunicorn.conf.py
+
+    # Vector Storage Configuration
+    VECTOR_STORE = os.getenv('VECTOR_STORE', 'chroma')  # 'chroma', or 'quantized' for memory-mapped float16/int8 vectors; Chroma collections migrate on first use
+    VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'int8')  # quantized backend only: 'int8' (a quarter of float32) or 'float16' (half)
+    USER_STORAGE_QUOTA_MB = int(os.getenv('USER_STORAGE_QUOTA_MB', '0')) or None  # per user collections, least recently used archived then deleted past it; quantized backend only
+    USER_COLLECTION_QUOTA = int(os.getenv('USER_COLLECTION_QUOTA', '0')) or None  # collections kept per user, least recently used deleted past it
+    COLD_AFTER_DAYS = float(os.getenv('COLD_AFTER_DAYS', '0')) or None  # idle collections move to the compressed cold tier, 0 (default) disables; quantized backend only
+
+    # Async Serving Configuration (uvicorn asgi:application)
+    ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', '8'))  # threads for the embedding, retrieval and SQLite work of async requests
+
+    # Logging and tracing
+    METRICS_ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('METRICS_ADMIN_EMAILS', '').split(',') if email.strip()}  # who may read /metrics, /metrics/storage and /metrics/profiles; nobody when unset
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()  # DEBUG also logs every validation prompt and result
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'  # per-route and per-stage latency histograms on /metrics
+    PROFILE_SLOW_REQUESTS_MS = int(os.getenv('PROFILE_SLOW_REQUESTS_MS', '0'))  # sample stacks of requests slower than this, 0 = off; see /metrics/profiles
     
     # Allowed File Extensions
     ALLOWED_EXTENSIONS = ('.txt', '.pdf', '.docx', '.csv')
@@ -30,4 +107,12 @@ class Config:
     # Google OAuth 2.0 settings
     GOOGLE_CLIENT_ID = os.getenv('google_client_id')
     GOOGLE_CLIENT_SECRET = os.getenv('google_client_secret')
-    GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
\ No newline at end of file
+    GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+    OAUTH_PROVIDER = os.getenv('OAUTH_PROVIDER', 'google')  # 'stub' logs in a fixed local user without contacting Google
+    OAUTH_HTTP_TIMEOUT = 10  # seconds, for discovery, token and userinfo calls
+    OAUTH_DISCOVERY_TTL = 3600  # used when the discovery response has no cache headers
+    # Server-side Session Configuration
+    SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite')  # 'sqlite', 'memory' (single process only) or 'redis'
+    SESSION_STORE_URL = os.getenv('SESSION_STORE_URL', 'redis://localhost:6379/0')  # only used with 'redis'
+    SESSION_TTL_SECONDS = 7 * 24 * 3600  # idle sessions are dropped after this long
+    QUIZ_TTL_SECONDS = 24 * 3600  # generated question sets can be answered for this long
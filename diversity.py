@@ -0,0 +1,65 @@
+import numpy as np
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def kmeans(vectors, n_clusters, iterations=20, seed=0):
+    """Spherical k-means with k-means++ seeding; returns (labels, centroids) over normalized vectors."""
+    vectors = normalize_rows(vectors)
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+
+    centroids = [vectors[rng.integers(len(vectors))]]
+    for _ in range(1, n_clusters):
+        distances = 1 - np.max(vectors @ np.array(centroids).T, axis=1)
+        # float64 so the probabilities sum to 1 within numpy's tolerance
+        distances = np.maximum(distances, 0).astype(np.float64)
+        total = distances.sum()
+        probabilities = distances / total if total > 0 else None
+        centroids.append(vectors[rng.choice(len(vectors), p=probabilities)])
+    centroids = np.array(centroids)
+
+    labels = np.zeros(len(vectors), dtype=int)
+    for iteration in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(n_clusters):
+            members = vectors[labels == cluster]
+            if len(members):
+                centroids[cluster] = normalize_rows(members.mean(axis=0, keepdims=True))[0]
+    return labels, centroids
+
+def cluster_representatives(vectors, n_clusters, per_cluster, seed=0):
+    """Indices of the per_cluster vectors closest to each cluster centroid, one list per cluster, biggest clusters first."""
+    labels, centroids = kmeans(vectors, n_clusters, seed=seed)
+    normalized = normalize_rows(vectors)
+    clusters = []
+    for cluster in range(len(centroids)):
+        members = np.flatnonzero(labels == cluster)
+        if not len(members):
+            continue
+        similarity = normalized[members] @ centroids[cluster]
+        closest = members[np.argsort(-similarity)[:per_cluster]]
+        clusters.append((len(members), closest.tolist()))
+    clusters.sort(key=lambda cluster: cluster[0], reverse=True)
+    return [indices for _, indices in clusters]
+
+class NearDuplicateFilter:
+    """Keeps texts whose embedding isn't within `threshold` cosine similarity of one already kept."""
+
+    def __init__(self, threshold=0.9):
+        self.threshold = threshold
+        self.kept = None
+
+    def filter(self, texts, vectors):
+        accepted = []
+        for text, vector in zip(texts, normalize_rows(vectors)):
+            if self.kept is not None and float(np.max(self.kept @ vector)) >= self.threshold:
+                continue
+            self.kept = vector[None, :] if self.kept is None else np.vstack([self.kept, vector])
+            accepted.append(text)
+        return accepted
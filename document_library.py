@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+class StorageQuotaError(Exception):
+    """Raised when a user's stored collections can't be brought back under their quota."""
+
+def document_hash(model_name, texts):
+    """Content hash of one document's chunks; changes whenever the document (or the embedding model) does."""
+    digest = hashlib.sha256(model_name.encode('utf-8'))
+    for text in texts:
+        digest.update(b"\0")
+        digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+def chunk_ids(source_id, content_hash, chunk_count):
+    """Deterministic Chroma ids for a document's chunks, so they can be deleted without a lookup.
+
+    The source id is part of them, so the same file uploaded under two names
+    gets its own chunks instead of overwriting the other's.
+    """
+    prefix = hashlib.sha256(f"{source_id}\0{content_hash}".encode('utf-8')).hexdigest()[:32]
+    return [f"{prefix}-{index}" for index in range(chunk_count)]
+
+def legacy_chunk_ids(content_hash, chunk_count):
+    """Ids chunks were stored under before chunk_ids included the source id."""
+    return [f"{content_hash[:32]}-{index}" for index in range(chunk_count)]
+
+class DocumentLibrary:
+    """Per-user record of which documents live in which Chroma collection.
+
+    Each document is identified by its source id (the uploaded filename) and
+    remembers the content hash and chunk count it was indexed with. A
+    collection's revision is a digest of its documents' content hashes, so two
+    collections with the same revision hold exactly the same chunks.
+
+    It also remembers when each collection was last used, which decides what
+    moves to the cold tier or is dropped first under a quota, and logs the
+    bytes each storage move reclaimed.
+    """
+
+    TOUCH_INTERVAL = 3600  # seconds between last-used writes for one collection, per process
+    _touched = {}
+    _instances = {}  # path -> DocumentLibrary
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        """The process-wide library for path; its tables are only set up the first time."""
+        with cls._instances_lock:
+            library = cls._instances.get(path)
+            if library is None:
+                library = cls._instances[path] = cls(path)
+            return library
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS collections ("
+                "name TEXT PRIMARY KEY, revision TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection_name TEXT NOT NULL, source_id TEXT NOT NULL, content_hash TEXT NOT NULL, "
+                "chunk_count INTEGER NOT NULL, added_at REAL NOT NULL, "
+                "PRIMARY KEY (collection_name, source_id))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS collection_access (name TEXT PRIMARY KEY, last_used REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS storage_events ("
+                "at REAL NOT NULL, collection_name TEXT NOT NULL, action TEXT NOT NULL, "
+                "bytes_before INTEGER NOT NULL, bytes_after INTEGER NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def compute_revision(content_hashes):
+        return hashlib.sha256("\0".join(sorted(content_hashes)).encode('utf-8')).hexdigest()
+
+    def get_revision(self, collection_name):
+        """Revision of a collection, or None if the library doesn't know it."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT revision FROM collections WHERE name = ?", (collection_name,)).fetchone()
+        return row[0] if row else None
+
+    def list_collections(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM collections")]
+
+    def list_documents(self, collection_name):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT source_id, content_hash, chunk_count, added_at FROM documents "
+                "WHERE collection_name = ? ORDER BY added_at",
+                (collection_name,)
+            ).fetchall()
+        return [
+            {'source_id': source_id, 'content_hash': content_hash, 'chunk_count': chunk_count, 'added_at': added_at}
+            for source_id, content_hash, chunk_count, added_at in rows
+        ]
+
+    def get_document(self, collection_name, source_id):
+        for document in self.list_documents(collection_name):
+            if document['source_id'] == source_id:
+                return document
+        return None
+
+    def _refresh_revision(self, conn, collection_name):
+        hashes = [row[0] for row in conn.execute(
+            "SELECT content_hash FROM documents WHERE collection_name = ?", (collection_name,)
+        )]
+        now = time.time()
+        revision = self.compute_revision(hashes)
+        conn.execute(
+            "INSERT INTO collections (name, revision, created_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET revision = excluded.revision, updated_at = excluded.updated_at",
+            (collection_name, revision, now, now)
+        )
+        return revision
+
+    def put_document(self, collection_name, source_id, content_hash, chunk_count):
+        """Record (or replace) a document and return the collection's new revision."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (collection_name, source_id, content_hash, chunk_count, added_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (collection_name, source_id, content_hash, chunk_count, time.time())
+            )
+            return self._refresh_revision(conn, collection_name)
+
+    def remove_document(self, collection_name, source_id):
+        """Forget a document and return the collection's new revision."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM documents WHERE collection_name = ? AND source_id = ?", (collection_name, source_id)
+            )
+            return self._refresh_revision(conn, collection_name)
+
+    def remove_collection(self, collection_name):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM documents WHERE collection_name = ?", (collection_name,))
+            conn.execute("DELETE FROM collections WHERE name = ?", (collection_name,))
+            conn.execute("DELETE FROM collection_access WHERE name = ?", (collection_name,))
+        self._touched.pop((self.path, collection_name), None)
+
+    def touch(self, collection_name):
+        """Record that a collection was used; written at most once per TOUCH_INTERVAL per process."""
+        now = time.time()
+        key = (self.path, collection_name)
+        if now - self._touched.get(key, 0) < self.TOUCH_INTERVAL:
+            return
+        self._touched[key] = now
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO collection_access (name, last_used) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET last_used = excluded.last_used",
+                (collection_name, now)
+            )
+
+    def collections_by_last_use(self):
+        """[(name, last used)] least recently used first; collections never read count from their last change."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT c.name, MAX(c.updated_at, COALESCE(a.last_used, 0)) AS last_used FROM collections c "
+                "LEFT JOIN collection_access a ON a.name = c.name ORDER BY last_used"
+            ).fetchall()
+
+    def record_storage_event(self, collection_name, action, bytes_before, bytes_after):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO storage_events (at, collection_name, action, bytes_before, bytes_after) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), collection_name, action, bytes_before, bytes_after)
+            )
+
+    def storage_report(self, recent=20):
+        """Bytes reclaimed per action (archive, compact, delete, ...) and the most recent storage moves."""
+        with self._connect() as conn:
+            totals = conn.execute(
+                "SELECT action, COUNT(*), SUM(bytes_before - bytes_after) FROM storage_events GROUP BY action"
+            ).fetchall()
+            rows = conn.execute(
+                "SELECT at, collection_name, action, bytes_before, bytes_after FROM storage_events ORDER BY at DESC LIMIT ?",
+                (recent,)
+            ).fetchall()
+        return {
+            'reclaimed_bytes': sum(total or 0 for _, _, total in totals),
+            'by_action': {action: {'count': count, 'reclaimed_bytes': total or 0} for action, count, total in totals},
+            'recent': [
+                {'at': at, 'collection_name': name, 'action': action, 'bytes_before': before, 'bytes_after': after}
+                for at, name, action, before, after in rows
+            ],
+        }
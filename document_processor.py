@@ -1,54 +1,117 @@
 import os
+import time
 import uuid
 import pandas as pd
 from docx import Document
-from PyPDF2 import PdfReader
+from pdf_extraction import iter_pdf_pages
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document as LangchainDocument
+from werkzeug.datastructures import FileStorage
+from tracing import tracer
 import logging
 
 class DocumentProcessor:
-    def __init__(self, save_dir, chunk_size, chunk_overlap, logging_enabled=True):
+    def __init__(self, save_dir, chunk_size, chunk_overlap, logging_enabled=True,
+                 pdf_workers=1, pdf_parallel_min_pages=50, csv_chunk_rows=50000):
         self.save_dir = save_dir
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.pdf_workers = pdf_workers
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        self.csv_chunk_rows = csv_chunk_rows
         self.logging_enabled = logging_enabled
         os.makedirs(self.save_dir, exist_ok=True)
 
-        # Configure logging based on the logging_enabled flag
+        # Log level and handlers are configured once by the app (LOG_LEVEL)
         self.logger = logging.getLogger(__name__)
-        if self.logging_enabled:
-            logging.basicConfig(level=logging.DEBUG)
-        else:
-            self.logger.disabled = True
+        self.logger.disabled = not self.logging_enabled
 
     def toggle_logging(self, enable_logging):
         """Enable or disable logging dynamically."""
         self.logging_enabled = enable_logging
         self.logger.disabled = not enable_logging
 
-    def extract_text_from_pdf(self, file):
-        """Extract text from PDF files."""
-        try:
-            temp_path = os.path.join(self.save_dir, 'temp.pdf')
+    def iter_pdf_pages(self, file, progress=None):
+        """Yield (page_number, text) for each PDF page without building the whole text in memory."""
+        # Staged uploads are already on disk, so the page workers can read that file directly
+        source_path = getattr(file.stream, 'name', None)
+        temp_path = None
+        if not isinstance(source_path, str) or not os.path.isfile(source_path):
+            temp_path = os.path.join(self.save_dir, f"temp_{uuid.uuid4().hex}.pdf")
             file.save(temp_path)
-            
-            reader = PdfReader(temp_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            
-            os.remove(temp_path)
-            return text
-        except Exception as e:
-            self.logger.error(f"Error extracting PDF text: {str(e)}")
-            return None
+            source_path = temp_path
+
+        try:
+            for page_number, page_count, text in iter_pdf_pages(
+                source_path, self.pdf_workers, self.pdf_parallel_min_pages
+            ):
+                if progress:
+                    progress('extract', 100 * page_number / page_count)
+                yield page_number, text
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load_pdf_documents(self, file, progress=None):
+        """Yield one LangChain document per non-empty PDF page, tagged with its page number."""
+        for page_number, text in self.iter_pdf_pages(file, progress):
+            if text.strip():
+                yield LangchainDocument(
+                    page_content=text,
+                    metadata={"source": file.filename, "page": page_number}
+                )
+
+    @staticmethod
+    def csv_row_text(df):
+        """Render every row as "column: value | column: value" using vectorized string ops."""
+        columns = [str(column) for column in df.columns]
+        parts = [f"{column}: " + df.iloc[:, index] for index, column in enumerate(columns)]
+        if not parts:
+            return pd.Series([], dtype=str)
+        return parts[0].str.cat(parts[1:], sep=' | ') if len(parts) > 1 else parts[0]
+
+    def iter_csv_chunks(self, file, progress=None):
+        """Yield (first_row, row_text_series) for each block of csv_chunk_rows rows."""
+        stream = getattr(file, 'stream', file)
+        total_bytes = None
+        if stream.seekable():
+            stream.seek(0, os.SEEK_END)
+            total_bytes = stream.tell()
+            stream.seek(0)
+
+        first_row = 1
+        reader = pd.read_csv(stream, chunksize=self.csv_chunk_rows, dtype=str, keep_default_na=False)
+        for chunk in reader:
+            yield first_row, self.csv_row_text(chunk)
+            first_row += len(chunk)
+            if progress and total_bytes:
+                progress('extract', 100 * stream.tell() / total_bytes)
+
+    def load_csv_documents(self, file, progress=None):
+        """Yield row-group documents of about chunk_size characters, each starting with the column headers.
+
+        Only one block of csv_chunk_rows rows is held in memory at a time.
+        """
+        for first_row, rows in self.iter_csv_chunks(file, progress):
+            if rows.empty:
+                continue
+            header = "Rows from " + file.filename + "\n"
+            budget = max(1, self.chunk_size - len(header))
+            # Assign consecutive rows to groups whose combined length fits the budget
+            group_ids = ((rows.str.len() + 1).cumsum() - 1) // budget
+            for group_id, group in rows.groupby(group_ids.to_numpy(), sort=False):
+                start = first_row + group.index[0] - rows.index[0]
+                end = start + len(group) - 1
+                yield LangchainDocument(
+                    page_content=header + "\n".join(group),
+                    metadata={"source": file.filename, "rows": f"{start}-{end}"}
+                )
 
     def extract_text_from_docx(self, file):
         """Extract text from DOCX files."""
         try:
-            temp_path = os.path.join(self.save_dir, 'temp.docx')
+            temp_path = os.path.join(self.save_dir, f"temp_{uuid.uuid4().hex}.docx")
             file.save(temp_path)
             
             doc = Document(temp_path)
@@ -69,12 +132,9 @@ class DocumentProcessor:
             if filename.endswith('.txt'):
                 return uploaded_file.read().decode('utf-8')
             elif filename.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-                return ' '.join(df.astype(str).agg(' '.join, axis=1).tolist())
+                return ' '.join(' '.join(rows) for _, rows in self.iter_csv_chunks(uploaded_file))
             elif filename.endswith('.docx'):
                 return self.extract_text_from_docx(uploaded_file)
-            elif filename.endswith('.pdf'):
-                return self.extract_text_from_pdf(uploaded_file)
             
             self.logger.error(f"Unsupported file type: {filename}")
             return None
@@ -111,13 +171,24 @@ class DocumentProcessor:
             return None
 
     def split_documents(self, documents):
-        """Split documents into chunks."""
+        """Split documents into chunks.
+
+        documents may be a generator; each one is split as soon as it arrives
+        so the full text never has to be held alongside its chunks.
+        """
         try:
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=self.chunk_size,
                 chunk_overlap=self.chunk_overlap
             )
-            return text_splitter.split_documents(documents)
+            split_docs = []
+            split_seconds = 0.0
+            for document in documents:
+                start = time.perf_counter()
+                split_docs.extend(text_splitter.split_documents([document]))
+                split_seconds += time.perf_counter() - start
+            tracer.record('split', split_seconds)
+            return split_docs
         except Exception as e:
             self.logger.error(f"Error splitting documents: {str(e)}")
             return None
@@ -126,33 +197,72 @@ class DocumentProcessor:
         """Remove files in the SAVE_DIR after processing."""
         try:
             for filename in os.listdir(self.save_dir):
-                if filename != 'temp.pdf' and filename != 'temp.docx':
+                # temp_ and upload_ files belong to uploads that are still being processed
+                if not filename.startswith(('temp_', 'upload_')):
                     file_path = os.path.join(self.save_dir, filename)
                     os.remove(file_path)
         except Exception as e:
             self.logger.error(f"Error cleaning up documents: {str(e)}")
 
-    def process_file(self, uploaded_file):
-        """Process a file from upload to splitting."""
+    def stage_upload(self, uploaded_file):
+        """Save an upload to a unique path so it can be processed after the request ends."""
+        try:
+            uploaded_file.seek(0)
+            staged_path = os.path.join(self.save_dir, f"upload_{uuid.uuid4().hex}")
+            uploaded_file.save(staged_path)
+            self.logger.debug(f"Staged upload {uploaded_file.filename} at {staged_path}")
+            return staged_path
+        except Exception as e:
+            self.logger.error(f"Error staging upload: {str(e)}")
+            return None
+
+    def process_staged_file(self, staged_path, filename, progress=None):
+        """Process a file saved by stage_upload, removing it afterwards."""
+        try:
+            with open(staged_path, 'rb') as stream:
+                return self.process_file(FileStorage(stream=stream, filename=filename), progress)
+        finally:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+    def process_file(self, uploaded_file, progress=None):
+        """Process a file from upload to splitting.
+
+        progress, if given, is called as progress(stage, percent) for the extract and split stages.
+        """
         try:
             self.logger.info(f"Starting to process file: {uploaded_file.filename}")
             
             uploaded_file.seek(0)
             
-            text = self.extract_text_from_file(uploaded_file)
-            if not text:
-                self.logger.error("Failed to extract text from file")
-                return None
+            if progress:
+                progress('extract', 0)
+            if uploaded_file.filename.lower().endswith('.pdf'):
+                # Pages are extracted and split one at a time, keeping their page numbers
+                documents = tracer.timed_iter('extract', self.load_pdf_documents(uploaded_file, progress))
+            elif uploaded_file.filename.lower().endswith('.csv'):
+                # Row groups are read and split one block at a time
+                documents = tracer.timed_iter('extract', self.load_csv_documents(uploaded_file, progress))
+            else:
+                with tracer.span('extract'):
+                    text = self.extract_text_from_file(uploaded_file)
+                if not text:
+                    self.logger.error("Failed to extract text from file")
+                    return None
+                if progress:
+                    progress('extract', 100)
 
-            documents = self.load_documents(text, uploaded_file.filename)
-            if not documents:
-                self.logger.error("Failed to create document")
-                return None
+                documents = self.load_documents(text, uploaded_file.filename)
+                if not documents:
+                    self.logger.error("Failed to create document")
+                    return None
 
             split_docs = self.split_documents(documents)
             if not split_docs:
                 self.logger.error("Failed to split documents")
                 return None
+            if progress:
+                progress('split', 100)
 
             return split_docs
             
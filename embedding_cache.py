@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from langchain_core.embeddings import Embeddings
+
+def chunk_digest(model_name, text):
+    """Stable key for a chunk's vector; unlike hash() it doesn't change between processes."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """SQLite-backed map of chunk digest -> vector with size-based LRU eviction.
+
+    The total size is kept in a one-row table updated with each write, so
+    eviction never has to sum the whole cache. Use open() to get the
+    process-wide instance for a path.
+    """
+
+    _instances = {}  # path -> EmbeddingCache
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path, max_bytes):
+        """The shared instance for path, created (and its tables) on first use."""
+        with cls._instances_lock:
+            cache = cls._instances.get(path)
+            if cache is None:
+                cache = cls._instances[path] = cls(path, max_bytes)
+            cache.max_bytes = max_bytes
+            return cache
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+            # Caches created before the size table get their total summed once here
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM embeddings"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached and mark them as recently used."""
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows]
+                )
+        return found
+
+    def put_many(self, items):
+        """Store {key: vector} and evict least recently used entries past max_bytes."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array('f', vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock, self._connect() as conn:
+            # Entries being replaced no longer count towards the total
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                batch = [row[0] for row in rows[start:start + 500]]
+                placeholders = ','.join('?' * len(batch))
+                replaced += conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchone()[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._add_size(conn, sum(row[2] for row in rows) - replaced)
+            self._evict(conn)
+
+    @staticmethod
+    def _add_size(conn, delta):
+        conn.execute("UPDATE cache_size SET total = total + ? WHERE id = 0", (delta,))
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        freed = 0
+        for key, size in conn.execute("SELECT key, size FROM embeddings ORDER BY last_used ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self._add_size(conn, -freed)
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model so only chunks missing from the cache get embedded.
+
+    Lookups go to the per-user cache first, then the optional shared cache;
+    newly computed vectors are written to both.
+    """
+
+    def __init__(self, embedding_model, model_name, user_cache, shared_cache=None):
+        self.embedding_model = embedding_model
+        self.model_name = model_name
+        self.user_cache = user_cache
+        self.shared_cache = shared_cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        keys = [chunk_digest(self.model_name, text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        vectors = self.user_cache.get_many(unique_keys)
+        if self.shared_cache is not None:
+            missing = [key for key in unique_keys if key not in vectors]
+            shared_vectors = self.shared_cache.get_many(missing)
+            # Promote shared hits into the user's own cache
+            self.user_cache.put_many(shared_vectors)
+            vectors.update(shared_vectors)
+
+        to_embed = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in to_embed:
+                to_embed[key] = text
+
+        self.hits += len(unique_keys) - len(to_embed)
+        self.misses += len(to_embed)
+
+        if to_embed:
+            new_vectors = dict(zip(to_embed, self.embedding_model.embed_documents(list(to_embed.values()))))
+            self.user_cache.put_many(new_vectors)
+            if self.shared_cache is not None:
+                self.shared_cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embedding_model.embed_query(text)
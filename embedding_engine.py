@@ -0,0 +1,96 @@
+import atexit
+import threading
+import time
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+from tracing import tracer
+
+# ONNX weights shipped in the sentence-transformers model repos
+ONNX_FILES = {
+    'onnx': 'onnx/model.onnx',
+    'onnx-int8': 'onnx/model_qint8_avx2.onnx',
+}
+
+def embedding_cache_name(model_name, backend='torch'):
+    """Name used in cache keys and collection digests; differs per backend since the vectors do."""
+    return model_name if backend == 'torch' else f"{model_name}#{backend}"
+
+class EmbeddingEngine(Embeddings):
+    """CPU embedding engine used in place of HuggingFaceEmbeddings.
+
+    backend is 'torch' (same vectors as before), 'onnx', or 'onnx-int8' for the
+    quantized export. Documents are encoded in batches of batch_size; lists of
+    at least shard_min_texts are split across a pool of `workers` processes.
+    """
+
+    def __init__(self, model_name, batch_size=64, num_threads=None, workers=1,
+                 backend='torch', shard_min_texts=2048):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.workers = workers
+        self.backend = backend
+        self.shard_min_texts = shard_min_texts
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {'chunks': 0, 'seconds': 0.0, 'calls': 0, 'last_chunks_per_sec': None}
+
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        if backend == 'torch':
+            self.model = SentenceTransformer(model_name, device='cpu')
+        elif backend in ONNX_FILES:
+            self.model = SentenceTransformer(
+                model_name,
+                device='cpu',
+                backend='onnx',
+                model_kwargs={'file_name': ONNX_FILES[backend]}
+            )
+        else:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(['cpu'] * self.workers)
+                atexit.register(self.close)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+    def embed_documents(self, texts):
+        texts = [text.replace('\n', ' ') for text in texts]
+        start = time.perf_counter()
+        if self.workers > 1 and len(texts) >= self.shard_min_texts:
+            vectors = self.model.encode_multi_process(texts, self._get_pool(), batch_size=self.batch_size)
+        else:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        seconds = time.perf_counter() - start
+        tracer.record('embed', seconds)
+
+        with self._lock:
+            self._stats['chunks'] += len(texts)
+            self._stats['seconds'] += seconds
+            self._stats['calls'] += 1
+            if seconds > 0:
+                self._stats['last_chunks_per_sec'] = round(len(texts) / seconds, 1)
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        with tracer.span('embed_query'):
+            return self.model.encode(text.replace('\n', ' '), show_progress_bar=False).tolist()
+
+    def get_stats(self):
+        """Embedding throughput so far, for sizing hardware."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['seconds'] = round(stats['seconds'], 3)
+        stats['chunks_per_sec'] = round(stats['chunks'] / stats['seconds'], 1) if stats['seconds'] else None
+        stats.update(backend=self.backend, batch_size=self.batch_size, workers=self.workers)
+        return stats
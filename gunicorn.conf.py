@@ -0,0 +1,24 @@
+# gunicorn -c gunicorn.conf.py app:app
+# The master imports the app and loads the embedding model once; forked workers
+# share those pages copy-on-write instead of each loading their own copy.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# The app splits the provider's rate limits across this many workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = 120
+preload_app = True
+
+# Tells app.py to preload without running inference, which isn't fork-safe
+os.environ.setdefault('PREFORK_PRELOAD', 'true')
+
+def pre_fork(server, worker):
+    # Keep the collector from touching (and so copying) objects loaded in the master
+    gc.freeze()
+
+def post_fork(server, worker):
+    from app import warm_up_worker
+    warm_up_worker()
@@ -0,0 +1,144 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which who "
+    "with why how does do did".split()
+)
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked id lists; ids ranked high in any list float to the top."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class BM25Index:
+    """Lexical BM25 index over one collection's chunks, persisted as JSON beside the Chroma data.
+
+    Only term frequencies are stored; chunk text stays in Chroma. Loaded
+    indexes are shared between threads through a small LRU and never
+    modified once shared: writers take a private copy with
+    load_for_update(), and save() swaps the cached reference.
+    """
+
+    CACHE_SIZE = 64  # indexes kept in memory per process, least recently used dropped first
+    _cache = OrderedDict()  # path -> (mtime, index)
+    _cache_lock = threading.Lock()
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.docs = {}  # chunk id -> {term: count}
+        self.lengths = {}
+        self.postings = {}  # term -> {chunk id: count}
+
+    @classmethod
+    def load(cls, path):
+        """Load an index, reusing the in-memory copy while the file hasn't changed."""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return cls(path)
+        with cls._cache_lock:
+            cached = cls._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                cls._cache.move_to_end(path)
+                return cached[1]
+
+        index = cls(path)
+        with open(path, encoding='utf-8') as index_file:
+            index.docs = json.load(index_file)['docs']
+        for doc_id, terms in index.docs.items():
+            index._index_terms(doc_id, terms)
+        cls._publish(path, mtime, index)
+        return index
+
+    @classmethod
+    def load_for_update(cls, path):
+        """A private copy to add() to or remove() from and then save(); the shared one keeps serving searches."""
+        return cls.load(path).copy()
+
+    @classmethod
+    def _publish(cls, path, mtime, index):
+        with cls._cache_lock:
+            cls._cache[path] = (mtime, index)
+            cls._cache.move_to_end(path)
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+    def copy(self):
+        index = type(self)(self.path, self.k1, self.b)
+        # Term dicts are replaced, never changed, by add(), so they can be shared
+        index.docs = dict(self.docs)
+        index.lengths = dict(self.lengths)
+        index.postings = {term: dict(postings) for term, postings in self.postings.items()}
+        return index
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as index_file:
+            json.dump({'docs': self.docs}, index_file)
+        os.replace(temp_path, self.path)
+        self._publish(self.path, os.path.getmtime(self.path), self)
+
+    @classmethod
+    def forget(cls, path):
+        """Drop a deleted index from the cache."""
+        with cls._cache_lock:
+            cls._cache.pop(path, None)
+
+    def _index_terms(self, doc_id, terms):
+        self.lengths[doc_id] = sum(terms.values())
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def add(self, ids, texts):
+        for doc_id, text in zip(ids, texts):
+            self.remove([doc_id])
+            terms = dict(Counter(tokenize(text)))
+            self.docs[doc_id] = terms
+            self._index_terms(doc_id, terms)
+
+    def remove(self, ids):
+        for doc_id in ids:
+            terms = self.docs.pop(doc_id, None)
+            if terms is None:
+                continue
+            del self.lengths[doc_id]
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def search(self, query, k):
+        """Return up to k chunk ids ranked by BM25 score."""
+        query_terms = tokenize(query)
+        if not query_terms or not self.docs:
+            return []
+        doc_count = len(self.docs)
+        average_length = sum(self.lengths.values()) / doc_count
+        scores = {}
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            freq = len(postings)
+            idf = math.log(1 + (doc_count - freq + 0.5) / (freq + 0.5))
+            for doc_id, count in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Share of the overall progress bar each ingestion stage accounts for
+STAGE_WEIGHTS = (
+    ('extract', 30),
+    ('split', 10),
+    ('embed', 55),
+    ('persist', 5),
+)
+
+class TooManyJobsError(Exception):
+    """Raised when a user already has the maximum number of ingestion jobs in flight."""
+
+JOB_FIELDS = (
+    'id', 'user_id', 'filename', 'status', 'stage', 'stage_percent', 'percent',
+    'collection_name', 'error', 'created_at', 'updated_at', 'finished_at',
+)
+
+class IngestJobQueue:
+    """Background queue for document ingestion.
+
+    Jobs run on a bounded thread pool in the process that took the upload
+    (the global limit is per worker) and each user may only have
+    max_jobs_per_user jobs queued or running at once. Job state lives in
+    SQLite, so any worker can answer a status poll and the per-user limit
+    holds across workers. Finished jobs are dropped after retention_seconds;
+    unfinished ones not updated for that long (their worker died) are marked
+    failed.
+    """
+
+    def __init__(self, path, max_workers=2, max_jobs_per_user=1, retention_seconds=3600):
+        self.path = path
+        self.max_jobs_per_user = max_jobs_per_user
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, filename TEXT NOT NULL, status TEXT NOT NULL, "
+                "stage TEXT, stage_percent INTEGER NOT NULL, percent INTEGER NOT NULL, collection_name TEXT, "
+                "error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_user ON ingest_jobs (user_id, status)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def submit(self, user_id, filename, task):
+        """Queue task(progress) for user_id and return the new job id.
+
+        task receives a progress(stage, percent) callback and returns the
+        collection name of the ingested document.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            # Take the write lock up front so two workers can't both pass the per-user check
+            conn.execute("BEGIN IMMEDIATE")
+            self._prune(conn, now)
+            active = conn.execute(
+                "SELECT COUNT(*) FROM ingest_jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                (str(user_id),)
+            ).fetchone()[0]
+            if active >= self.max_jobs_per_user:
+                raise TooManyJobsError(
+                    f"You already have {active} document(s) processing, please wait for it to finish"
+                )
+            conn.execute(
+                "INSERT INTO ingest_jobs (id, user_id, filename, status, stage_percent, percent, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', 0, 0, ?, ?)",
+                (job_id, str(user_id), filename, now, now)
+            )
+
+        self._executor.submit(self._run, job_id, task)
+        return job_id
+
+    def get(self, job_id, user_id):
+        """Return a copy of the job's state, or None if it doesn't exist or belongs to someone else."""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM ingest_jobs WHERE id = ? AND user_id = ?",
+                (job_id, str(user_id))
+            ).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _progress(self, job_id, stage, percent):
+        percent = max(0, min(100, percent))
+        overall = 0
+        for name, weight in STAGE_WEIGHTS:
+            if name == stage:
+                overall += weight * percent / 100
+                break
+            overall += weight
+        self._update(job_id, stage=stage, stage_percent=round(percent), percent=round(overall))
+
+    def _run(self, job_id, task):
+        self._update(job_id, status='running')
+        try:
+            collection_name = task(lambda stage, percent: self._progress(job_id, stage, percent))
+            self._update(
+                job_id,
+                status='done',
+                stage='persist',
+                stage_percent=100,
+                percent=100,
+                collection_name=collection_name,
+                finished_at=time.time()
+            )
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    def _prune(self, conn, now):
+        cutoff = now - self.retention_seconds
+        conn.execute("DELETE FROM ingest_jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+        conn.execute(
+            "UPDATE ingest_jobs SET status = 'failed', error = 'Processing was interrupted', finished_at = ? "
+            "WHERE status IN ('queued', 'running') AND updated_at < ?",
+            (now, cutoff)
+        )
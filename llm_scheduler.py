@@ -0,0 +1,310 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from tracing import percentile
+
+RETRYABLE_STATUS = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+def error_status(exc):
+    """HTTP status carried by a provider/client exception, or None."""
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status
+
+def retry_after_seconds(exc):
+    """Retry-After from the error response (seconds form only), or None."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exc):
+    status = error_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Timeouts and dropped connections have no status
+    return type(exc).__name__ in ('APIConnectionError', 'APITimeoutError', 'ConnectionError', 'Timeout')
+
+class TokenBucket:
+    """Refills `rate_per_minute` units a minute, holding at most one minute's worth.
+
+    acquire() reserves the units up front and sleeps off any deficit, so
+    callers are served in the order they asked and the bucket may go negative.
+    reserve() does the same without sleeping, for callers that wait on an
+    event loop instead.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self._lock = threading.Lock()
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Take `amount` units; returns the seconds the caller must wait before using them."""
+        # A single request bigger than the bucket would otherwise never fit
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+            return -self._level / self.rate if self._level < 0 else 0.0
+
+    def acquire(self, amount):
+        """Take `amount` units; returns the seconds spent waiting."""
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def charge(self, amount):
+        """Debit usage that was only known after the call (e.g. completion tokens)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+
+    def drain(self, seconds):
+        """Push the bucket `seconds` into deficit, after the provider told us to back off."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self._level, -seconds * self.rate)
+
+class _Ticket:
+    __slots__ = ('user_id', 'enqueued_at', 'granted', 'loop', 'future')
+
+    def __init__(self, user_id, loop=None):
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+        # Async waiters get a future on their own loop; slots may be freed from any thread
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self):
+        self.granted.set()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class LLMScheduler:
+    """Process-wide gate for outbound LLM calls.
+
+    At most `max_concurrency` calls run at once. Waiting calls are queued per
+    user and free slots are handed out round-robin across users, so one
+    user's 30-question quiz can't starve everyone else. Calls also draw from
+    request and token buckets sized to the provider's per-minute limits, and
+    429/5xx responses are retried with jittered exponential backoff (or the
+    provider's Retry-After). Threads call run()/stream() and coroutines call
+    arun(); both share the same slots, queues and buckets.
+    """
+
+    def __init__(self, max_concurrency=8, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=4, base_delay=0.5, max_delay=20.0, window=1000):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # user id -> deque of tickets, in round-robin order
+        self._active = 0
+        self._stats = {
+            'calls': 0,
+            'retries': 0,
+            'failures': 0,
+            'max_queue_depth': 0,
+            'rate_limited_seconds': 0.0,
+            'errors_by_status': {},
+        }
+        self._waits = deque(maxlen=window)
+
+    def _dispatch(self):
+        # Caller holds self._lock
+        while self._active < self.max_concurrency and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            # Rotate this user to the back so the next slot goes to someone else
+            del self._queues[user_id]
+            if queue:
+                self._queues[user_id] = queue
+            self._active += 1
+            ticket.grant()
+
+    def _enqueue(self, ticket):
+        with self._lock:
+            self._queues.setdefault(ticket.user_id, deque()).append(ticket)
+            depth = sum(len(queue) for queue in self._queues.values())
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], depth)
+            self._dispatch()
+
+    def _record_wait(self, ticket):
+        wait = time.monotonic() - ticket.enqueued_at
+        with self._lock:
+            self._waits.append(wait * 1000)
+
+    def _acquire_slot(self, user_id):
+        ticket = _Ticket(user_id)
+        self._enqueue(ticket)
+        ticket.granted.wait()
+        self._record_wait(ticket)
+
+    async def _aacquire_slot(self, user_id):
+        ticket = _Ticket(user_id, asyncio.get_running_loop())
+        self._enqueue(ticket)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            # Leave the queue, or hand back the slot if it was granted as we were cancelled
+            with self._lock:
+                queue = self._queues.get(ticket.user_id)
+                queued = queue is not None and ticket in queue
+                if queued:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[ticket.user_id]
+            if not queued:
+                self._release_slot()
+            raise
+        self._record_wait(ticket)
+
+    def _release_slot(self):
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
+
+    def _reserve(self, tokens):
+        """Draw one request and `tokens` from the buckets; returns how long to wait before calling."""
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        if wait:
+            with self._lock:
+                self._stats['rate_limited_seconds'] += wait
+        return wait
+
+    def _throttle(self, tokens):
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    def _backoff_delay(self, attempt, exc):
+        status = error_status(exc)
+        with self._lock:
+            self._stats['retries'] += 1
+            key = str(status or type(exc).__name__)
+            self._stats['errors_by_status'][key] = self._stats['errors_by_status'].get(key, 0) + 1
+        delay = retry_after_seconds(exc)
+        if delay is None:
+            # Full jitter keeps a burst of rate-limited calls from retrying in lockstep
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        elif status == 429 and self.request_bucket is not None:
+            # The provider asked everyone to wait, not just this call
+            self.request_bucket.drain(delay)
+        return delay
+
+    def _backoff(self, attempt, exc):
+        time.sleep(self._backoff_delay(attempt, exc))
+
+    def _failed(self, exc):
+        with self._lock:
+            self._stats['failures'] += 1
+            key = str(error_status(exc) or type(exc).__name__)
+            self._stats['errors_by_status'][key] = self._stats['errors_by_status'].get(key, 0) + 1
+
+    def run(self, user_id, func, tokens=0):
+        """Run func() once a slot and rate budget are free, retrying retryable errors."""
+        self._acquire_slot(user_id)
+        try:
+            with self._lock:
+                self._stats['calls'] += 1
+            for attempt in range(self.max_retries + 1):
+                self._throttle(tokens)
+                try:
+                    return func()
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        self._failed(e)
+                        raise
+                    self._backoff(attempt, e)
+        finally:
+            self._release_slot()
+
+    async def arun(self, user_id, coro_func, tokens=0):
+        """Async run(): awaits coro_func() once a slot and rate budget are free, without holding a thread while queued."""
+        await self._aacquire_slot(user_id)
+        try:
+            with self._lock:
+                self._stats['calls'] += 1
+            for attempt in range(self.max_retries + 1):
+                wait = self._reserve(tokens)
+                if wait:
+                    await asyncio.sleep(wait)
+                try:
+                    return await coro_func()
+                except Exception as e:
+                    if attempt == self.max_retries or not is_retryable(e):
+                        self._failed(e)
+                        raise
+                    await asyncio.sleep(self._backoff_delay(attempt, e))
+        finally:
+            self._release_slot()
+
+    def stream(self, user_id, func, tokens=0):
+        """Like run() for a streaming call: func() returns an iterator, which holds the slot until exhausted.
+
+        Only failures before the first chunk are retried; after that the
+        caller has already seen partial output.
+        """
+        self._acquire_slot(user_id)
+        try:
+            with self._lock:
+                self._stats['calls'] += 1
+            for attempt in range(self.max_retries + 1):
+                self._throttle(tokens)
+                started = False
+                try:
+                    for chunk in func():
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started or attempt == self.max_retries or not is_retryable(e):
+                        self._failed(e)
+                        raise
+                    self._backoff(attempt, e)
+        finally:
+            self._release_slot()
+
+    def charge_tokens(self, tokens):
+        if self.token_bucket is not None and tokens:
+            self.token_bucket.charge(tokens)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'active': self._active,
+                'max_concurrency': self.max_concurrency,
+                'queue_depth': sum(len(queue) for queue in self._queues.values()),
+                'queued_users': len(self._queues),
+                'wait_p50_ms': percentile(self._waits, 50),
+                'wait_p95_ms': percentile(self._waits, 95),
+                **self._stats,
+                'rate_limited_seconds': round(self._stats['rate_limited_seconds'], 2),
+                'errors_by_status': dict(self._stats['errors_by_status']),
+            }
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from tracing import percentile
+
+class QuotaExceededError(Exception):
+    """Raised before an LLM call when the user has used up their daily token quota."""
+
+class LLMUsageTracker:
+    """Records tokens and latency for every LLM call, aggregated per user and per route.
+
+    Keeps running totals plus the last `window` latencies per route for
+    percentiles; these are per process. Daily token counts per user back the
+    optional quota. With a path they are kept in SQLite, so every worker
+    process enforces the same quota; without one each process counts on its
+    own and the effective quota is multiplied by the number of workers.
+
+    Token counts are the provider's reported usage. Calls without it fall
+    back to the local estimate and are counted under 'estimated_calls'. The
+    ratio of provider to local prompt tokens is tracked so local estimates
+    can be scaled to the model's tokenizer (see token_ratio).
+    """
+
+    RATIO_SMOOTHING = 0.1  # weight of each new call in the provider/local token ratio
+
+    def __init__(self, daily_token_quota=None, window=1000, path=None):
+        self.daily_token_quota = daily_token_quota
+        self.window = window
+        self.path = path
+        self._lock = threading.Lock()
+        self._by_user = {}
+        self._by_route = {}
+        self._daily = {}
+        self._token_ratio = None
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS daily_usage ("
+                    "user_id TEXT NOT NULL, day TEXT NOT NULL, tokens INTEGER NOT NULL, PRIMARY KEY (user_id, day))"
+                )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _today():
+        return time.strftime('%Y-%m-%d')
+
+    def _new_totals(self):
+        return {
+            'calls': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'estimated_calls': 0,
+            'latency_ms': deque(maxlen=self.window),
+            'ttft_ms': deque(maxlen=self.window),
+        }
+
+    def tokens_today(self, user_id):
+        if self.path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT tokens FROM daily_usage WHERE user_id = ? AND day = ?", (str(user_id), self._today())
+                ).fetchone()
+            return row[0] if row else 0
+        with self._lock:
+            return self._daily.get((user_id, self._today()), 0)
+
+    def _add_daily(self, user_id, tokens):
+        today = self._today()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO daily_usage (user_id, day, tokens) VALUES (?, ?, ?) "
+                    "ON CONFLICT (user_id, day) DO UPDATE SET tokens = tokens + excluded.tokens",
+                    (str(user_id), today, tokens)
+                )
+                # Only today's counts matter for the quota
+                conn.execute("DELETE FROM daily_usage WHERE day < ?", (today,))
+            return
+        with self._lock:
+            self._daily[(user_id, today)] = self._daily.get((user_id, today), 0) + tokens
+            for stale in [key for key in self._daily if key[1] != today]:
+                del self._daily[stale]
+
+    def token_ratio(self):
+        """Provider prompt tokens per locally counted token, 1.0 until a call has reported usage."""
+        with self._lock:
+            return self._token_ratio or 1.0
+
+    def check_quota(self, user_id):
+        if not self.daily_token_quota or user_id is None:
+            return
+        used = self.tokens_today(user_id)
+        if used >= self.daily_token_quota:
+            raise QuotaExceededError(
+                f"Daily token quota of {self.daily_token_quota} reached, please try again tomorrow"
+            )
+
+    def record(self, user_id, route, model, prompt_tokens, completion_tokens, ttft, latency,
+               estimated=False, local_prompt_tokens=None):
+        """Record one call. estimated marks counts that came from the local tokenizer instead of the provider.
+
+        local_prompt_tokens (the unscaled local count of a prompt the provider
+        did report on) updates token_ratio.
+        """
+        with self._lock:
+            for group, key in ((self._by_user, user_id), (self._by_route, route or 'unknown')):
+                totals = group.setdefault(key, self._new_totals())
+                totals['calls'] += 1
+                totals['prompt_tokens'] += prompt_tokens
+                totals['completion_tokens'] += completion_tokens
+                totals['estimated_calls'] += int(estimated)
+                totals['latency_ms'].append(latency * 1000)
+                totals['ttft_ms'].append(ttft * 1000)
+            if not estimated and local_prompt_tokens:
+                ratio = prompt_tokens / local_prompt_tokens
+                if self._token_ratio is None:
+                    self._token_ratio = ratio
+                else:
+                    self._token_ratio += self.RATIO_SMOOTHING * (ratio - self._token_ratio)
+        if user_id is not None:
+            self._add_daily(user_id, prompt_tokens + completion_tokens)
+
+    def _summarize(self, totals):
+        return {
+            'calls': totals['calls'],
+            'prompt_tokens': totals['prompt_tokens'],
+            'completion_tokens': totals['completion_tokens'],
+            'estimated_calls': totals['estimated_calls'],
+            'latency_p50_ms': percentile(totals['latency_ms'], 50),
+            'latency_p95_ms': percentile(totals['latency_ms'], 95),
+            'ttft_p50_ms': percentile(totals['ttft_ms'], 50),
+        }
+
+    def get_user_stats(self, user_id):
+        with self._lock:
+            totals = self._by_user.get(user_id)
+            summary = self._summarize(totals) if totals else self._summarize(self._new_totals())
+        summary['tokens_today'] = self.tokens_today(user_id)
+        summary['daily_token_quota'] = self.daily_token_quota
+        return summary
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'by_route': {route: self._summarize(totals) for route, totals in self._by_route.items()},
+                'by_user': {str(user): self._summarize(totals) for user, totals in self._by_user.items()},
+                'provider_token_ratio': round(self._token_ratio, 3) if self._token_ratio else None,
+            }
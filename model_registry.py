@@ -0,0 +1,143 @@
+import threading
+import time
+
+class ModelRegistry:
+    """Process-wide cache of embedding models, Chroma clients and LLM clients.
+
+    Loading all-MiniLM-L6-v2 or reopening a persistent Chroma store costs seconds,
+    so each worker process builds them once and every request reuses them.
+    The libraries behind them (torch, chromadb, langchain) are imported on
+    first use too, so a worker can serve / and /login without them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._embeddings = {}
+        self._chroma_clients = {}
+        self._llms = {}
+        self._rerankers = {}
+        self._tokenizers = {}
+        self._stats = {
+            'embeddings': {'hits': 0, 'misses': 0},
+            'chroma_clients': {'hits': 0, 'misses': 0},
+            'llms': {'hits': 0, 'misses': 0},
+            'rerankers': {'hits': 0, 'misses': 0},
+            'tokenizers': {'hits': 0, 'misses': 0},
+        }
+        self._warm_up = {'done': False, 'seconds': None, 'models': []}
+        self._embedding_options = {}
+
+    def configure_embeddings(self, **options):
+        """Set the EmbeddingEngine options (batch_size, num_threads, workers, backend) used for new models."""
+        with self._lock:
+            self._embedding_options = dict(options)
+
+    def _get_or_create(self, kind, cache, key, factory):
+        # Fast path without the per-key lock once the object exists
+        obj = cache.get(key)
+        if obj is not None:
+            with self._lock:
+                self._stats[kind]['hits'] += 1
+            return obj
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault((kind, key), threading.Lock())
+
+        # Only one thread builds a given object, the others wait and reuse it
+        with key_lock:
+            obj = cache.get(key)
+            if obj is not None:
+                with self._lock:
+                    self._stats[kind]['hits'] += 1
+                return obj
+            obj = factory()
+            with self._lock:
+                cache[key] = obj
+                self._stats[kind]['misses'] += 1
+            return obj
+
+    def get_embeddings(self, model_name):
+        """Return the shared embedding engine for model_name, loading it on first use."""
+        from embedding_engine import EmbeddingEngine
+        return self._get_or_create(
+            'embeddings', self._embeddings, model_name,
+            lambda: EmbeddingEngine(model_name, **self._embedding_options)
+        )
+
+    def get_embedding_cache_name(self, model_name):
+        """Cache/digest name for model_name under the configured backend, without loading the model."""
+        from embedding_engine import embedding_cache_name
+        return embedding_cache_name(model_name, self._embedding_options.get('backend', 'torch'))
+
+    def get_chroma_client(self, persist_directory):
+        """Return the pooled persistent Chroma client for a directory."""
+        import chromadb
+        key = str(persist_directory)
+        return self._get_or_create(
+            'chroma_clients', self._chroma_clients, key,
+            lambda: chromadb.PersistentClient(path=key)
+        )
+
+    def get_llm(self, groq_api_key, model_name, base_url=None, max_retries=2):
+        """Return a shared ChatGroq client for the given key, model and endpoint."""
+        from langchain_groq import ChatGroq
+        return self._get_or_create(
+            'llms', self._llms, (groq_api_key, model_name, base_url, max_retries),
+            lambda: ChatGroq(groq_api_key=groq_api_key, model_name=model_name, base_url=base_url, max_retries=max_retries)
+        )
+
+    def get_reranker(self, model_name):
+        """Return a shared cross-encoder used to re-rank retrieval candidates."""
+        from sentence_transformers import CrossEncoder
+        return self._get_or_create(
+            'rerankers', self._rerankers, model_name,
+            lambda: CrossEncoder(model_name, device='cpu')
+        )
+
+    def get_tokenizer(self, model_name):
+        """Return a shared local tokenizer used to count prompt tokens."""
+        from transformers import AutoTokenizer
+        return self._get_or_create(
+            'tokenizers', self._tokenizers, model_name,
+            lambda: AutoTokenizer.from_pretrained(model_name)
+        )
+
+    def warm_up(self, embedding_model_names, encode=True):
+        """Preload embedding models so the first request doesn't pay for it.
+
+        encode=False only loads the weights. Use it in a pre-fork master: running
+        inference there starts torch's thread pool, which doesn't survive fork(),
+        while loaded weights are shared with the workers copy-on-write.
+        """
+        start = time.perf_counter()
+        for model_name in embedding_model_names:
+            engine = self.get_embeddings(model_name)
+            if encode:
+                engine.embed_query("warm up")
+        with self._lock:
+            self._warm_up = {
+                'done': True,
+                'seconds': round(time.perf_counter() - start, 3),
+                'models': list(embedding_model_names),
+                'encoded': encode,
+            }
+
+    def get_stats(self):
+        """Return hit/miss counters and warm-up info for the metrics endpoint."""
+        with self._lock:
+            return {
+                'warm_up': dict(self._warm_up),
+                'counters': {kind: dict(counts) for kind, counts in self._stats.items()},
+                'embedding_throughput': {
+                    model_name: engine.get_stats() for model_name, engine in self._embeddings.items()
+                },
+                'loaded': {
+                    'embeddings': list(self._embeddings),
+                    'chroma_clients': list(self._chroma_clients),
+                    'llms': [key[1] for key in self._llms],
+                    'rerankers': list(self._rerankers),
+                },
+            }
+
+registry = ModelRegistry()
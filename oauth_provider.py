@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class LoginTimings:
+    """Per-step latency counters for the login flow (discovery, token, userinfo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = {}
+
+    def record(self, step, seconds):
+        with self._lock:
+            stats = self._steps.setdefault(step, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0})
+            ms = seconds * 1000
+            stats['count'] += 1
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['last_ms'] = ms
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                step: {
+                    'count': stats['count'],
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'last_ms': round(stats['last_ms'], 2),
+                }
+                for step, stats in self._steps.items()
+            }
+
+class GoogleProvider:
+    """Google OpenID Connect calls over one pooled keep-alive session.
+
+    The discovery document is cached for as long as its Cache-Control/Expires
+    headers allow (default_ttl if it sends none) and refreshed in the
+    background once refresh_fraction of that time has passed, so logins never
+    wait on it after the first one. A stale copy is served if a refresh fails.
+    """
+
+    def __init__(self, discovery_url, client_id, client_secret, timeout=10,
+                 default_ttl=3600, refresh_fraction=0.8, pool_size=20):
+        self.discovery_url = discovery_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+        self.refresh_fraction = refresh_fraction
+        self.timings = LoginTimings()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._config = None
+        self._fetched_at = 0.0
+        self._ttl = 0.0
+        self._refreshing = False
+
+    def _timed(self, step, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings.record(step, time.perf_counter() - start)
+
+    def _ttl_from_headers(self, headers):
+        match = re.search(r"max-age=(\d+)", headers.get('Cache-Control', ''))
+        if match:
+            return int(match.group(1))
+        if headers.get('Expires'):
+            try:
+                return max(0, parsedate_to_datetime(headers['Expires']).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+        return self.default_ttl
+
+    def _fetch_config(self):
+        response = self._timed('discovery', self.session.get, self.discovery_url, timeout=self.timeout)
+        response.raise_for_status()
+        config = response.json()
+        with self._lock:
+            self._config = config
+            self._fetched_at = time.time()
+            self._ttl = self._ttl_from_headers(response.headers)
+        return config
+
+    def _background_refresh(self):
+        try:
+            self._fetch_config()
+        except requests.RequestException:
+            pass  # keep serving the cached copy; the next login will try again
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get_config(self):
+        """Return the OpenID discovery document."""
+        with self._lock:
+            config = self._config
+            age = time.time() - self._fetched_at
+            ttl = self._ttl
+            start_refresh = (
+                config is not None and age >= ttl * self.refresh_fraction and not self._refreshing
+            )
+            if start_refresh:
+                self._refreshing = True
+
+        if config is None:
+            return self._fetch_config()
+        if age >= ttl:
+            try:
+                return self._fetch_config()
+            except requests.RequestException:
+                return config
+        if start_refresh:
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+        return config
+
+    def fetch_token(self, token_url, headers, body):
+        """Exchange the authorization code; returns the token response as a dict."""
+        response = self._timed(
+            'token', self.session.post, token_url,
+            headers=headers, data=body, auth=(self.client_id, self.client_secret), timeout=self.timeout
+        )
+        return response.json()
+
+    def fetch_userinfo(self, uri, headers, body):
+        """Return the userinfo claims as a dict."""
+        response = self._timed('userinfo', self.session.get, uri, headers=headers, data=body, timeout=self.timeout)
+        return response.json()
+
+class StubProvider:
+    """Local stand-in for GoogleProvider so the login flow runs without Google (tests, offline dev).
+
+    authorization_endpoint points at the app's own /login/stub_authorize route,
+    which immediately redirects back with a fixed code. Endpoints are relative
+    to the app unless base_url is given.
+    """
+
+    def __init__(self, base_url='', userinfo=None):
+        self.base_url = base_url.rstrip('/')
+        self.timings = LoginTimings()
+        self.userinfo = userinfo or {
+            'sub': 'stub-user',
+            'email': 'student@example.com',
+            'email_verified': True,
+            'given_name': 'Student',
+        }
+
+    def get_config(self):
+        return {
+            'authorization_endpoint': f"{self.base_url}/login/stub_authorize",
+            'token_endpoint': f"{self.base_url}/login/stub_token",
+            'userinfo_endpoint': f"{self.base_url}/login/stub_userinfo",
+        }
+
+    def fetch_token(self, token_url, headers, body):
+        self.timings.record('token', 0.0)
+        return {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600}
+
+    def fetch_userinfo(self, uri, headers, body):
+        self.timings.record('userinfo', 0.0)
+        return dict(self.userinfo)
@@ -0,0 +1,37 @@
+# Page-level PDF text extraction. Kept separate from document_processor so the
+# worker processes used for large PDFs only have to import PyPDF2, not pandas and langchain.
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+
+PAGES_PER_TASK = 16
+
+def extract_page_range(path, start, end):
+    """Extract pages [start, end) of the PDF at path as (page_number, text) pairs."""
+    reader = PdfReader(path)
+    return [(number + 1, reader.pages[number].extract_text() or "") for number in range(start, end)]
+
+def iter_pdf_pages(source, workers=1, parallel_min_pages=50):
+    """Yield (page_number, page_count, text) for each page, in order.
+
+    source is a path or a binary stream. Documents with at least
+    parallel_min_pages pages are extracted in a process pool when a path
+    is available and workers > 1; otherwise pages are read one by one so
+    only a single page of text is held at a time.
+    """
+    reader = PdfReader(source)
+    page_count = len(reader.pages)
+
+    if workers <= 1 or page_count < parallel_min_pages or not isinstance(source, str):
+        for number, page in enumerate(reader.pages, 1):
+            yield number, page_count, page.extract_text() or ""
+        return
+
+    starts = list(range(0, page_count, PAGES_PER_TASK))
+    ends = [min(start + PAGES_PER_TASK, page_count) for start in starts]
+    # spawn rather than fork: we're usually called from a worker thread
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for pages in executor.map(extract_page_range, [source] * len(starts), starts, ends):
+            for number, text in pages:
+                yield number, page_count, text
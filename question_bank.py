@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class QuestionBank:
+    """Per-user store of pre-generated questions with reference answers.
+
+    Questions belong to a collection revision, so they are ignored once
+    documents are added or removed. Each remembers the chunk ids it was
+    generated from and how often it has been served; sampling prefers the
+    least-served questions so repeat quizzes get fresh ones first.
+    """
+
+    _instances = {}  # path -> QuestionBank
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        """The bank for path shared by every request in this process, created on first use."""
+        with cls._instances_lock:
+            bank = cls._instances.get(path)
+            if bank is None:
+                bank = cls._instances[path] = cls(path)
+            return bank
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, collection_name TEXT NOT NULL, revision TEXT NOT NULL, "
+                "complexity TEXT NOT NULL, question TEXT NOT NULL, reference_answer TEXT NOT NULL, "
+                "chunk_ids TEXT NOT NULL, served_count INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_questions_collection ON questions (collection_name, revision, complexity)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, collection_name, revision, complexity, entries):
+        """Store (question, reference_answer, chunk_ids) entries."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO questions (collection_name, revision, complexity, question, reference_answer, chunk_ids, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (collection_name, revision, complexity, question, reference, json.dumps(list(ids)), now)
+                    for question, reference, ids in entries
+                ]
+            )
+
+    def questions(self, collection_name, revision, complexity):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT question FROM questions WHERE collection_name = ? AND revision = ? AND complexity = ?",
+                (collection_name, revision, complexity)
+            )]
+
+    def count_fresh(self, collection_name, revision, complexity):
+        """Number of questions that have never been served."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE collection_name = ? AND revision = ? AND complexity = ? "
+                "AND served_count = 0",
+                (collection_name, revision, complexity)
+            ).fetchone()[0]
+
+    def sample(self, collection_name, revision, complexity, count):
+        """Take `count` questions, least served first, and mark them served. Returns [] if there aren't enough."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, question, served_count FROM questions "
+                "WHERE collection_name = ? AND revision = ? AND complexity = ?",
+                (collection_name, revision, complexity)
+            ).fetchall()
+            if len(rows) < count:
+                return []
+            random.shuffle(rows)
+            rows.sort(key=lambda row: row[2])
+            chosen = rows[:count]
+            conn.executemany(
+                "UPDATE questions SET served_count = served_count + 1 WHERE id = ?", [(row[0],) for row in chosen]
+            )
+        return [row[1] for row in chosen]
+
+    def references(self, collection_name, revision, questions):
+        """Reference answers for the given question texts at this revision, as {question: reference_answer}."""
+        if not questions:
+            return {}
+        placeholders = ",".join("?" * len(questions))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT question, reference_answer FROM questions "
+                f"WHERE collection_name = ? AND revision = ? AND question IN ({placeholders})",
+                (collection_name, revision, *questions)
+            ).fetchall()
+        return dict(rows)
+
+    def prune(self, collection_name, keep_revision):
+        """Drop questions generated for older revisions of a collection."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM questions WHERE collection_name = ? AND revision != ?", (collection_name, keep_revision)
+            )
+
+    def remove_collection(self, collection_name):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM questions WHERE collection_name = ?", (collection_name,))
+
+class QuestionBankFiller:
+    """Background pool that builds and tops up question banks off the request path.
+
+    A (user, collection, complexity) key is only queued once at a time, so
+    repeated "running low" signals don't pile up duplicate LLM calls.
+    """
+
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='question-bank')
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._stats = {'scheduled': 0, 'skipped': 0, 'failed': 0}
+
+    def schedule(self, key, task):
+        """Queue task() unless the same key is already queued or running. Returns True if queued."""
+        with self._lock:
+            if key in self._pending:
+                self._stats['skipped'] += 1
+                return False
+            self._pending.add(key)
+            self._stats['scheduled'] += 1
+        self._executor.submit(self._run, key, task)
+        return True
+
+    def _run(self, key, task):
+        try:
+            task()
+        except Exception:
+            logger.exception("Question bank task %s failed", key)
+            with self._lock:
+                self._stats['failed'] += 1
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def get_stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': len(self._pending)}
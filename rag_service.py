@@ -1,70 +1,1228 @@
-from langchain.chains import RetrievalQA
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-from prompts import get_question_generation_prompt, get_answer_validation_prompt
+from langchain.schema import Document as LangchainDocument
+from model_registry import registry
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from document_library import DocumentLibrary, StorageQuotaError, document_hash, chunk_ids, legacy_chunk_ids
+from response_cache import cache_key
+from hybrid_retrieval import BM25Index, reciprocal_rank_fusion
+from diversity import cluster_representatives, NearDuplicateFilter
+from llm_usage import QuotaExceededError
+from question_bank import QuestionBank
+from answer_screening import AnswerScreener
+from tracing import tracer
+from vector_storage import QuantizedVectorStore, directory_bytes, read_archive, write_archive
+from prompts import (
+    COMPLEXITY_INSTRUCTIONS, get_question_generation_prompt, get_question_bank_prompt, get_answer_validation_prompt,
+    get_batch_answer_validation_prompt, get_rag_prompt
+)
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 256
+
+# Moves between the hot and cold tiers happen one at a time per process
+TIER_LOCK = threading.Lock()
+
+BATCH_ITEM_PATTERN = re.compile(
+    r"Item\s*(\d+)\s*:\s*Verdict\s*:\s*(Correct|Incorrect)\s*Feedback\s*:\s*(.+?)(?=\n\s*Item\s*\d+\s*:|\Z)",
+    re.IGNORECASE | re.DOTALL
+)
+
+QUESTION_BANK_PATTERN = re.compile(
+    r"Question\s*:\s*(.+?)\s*\n\s*Answer\s*:\s*(.+?)(?=\n\s*Question\s*:|\Z)",
+    re.IGNORECASE | re.DOTALL
+)
 
 class RAGService:
-    def __init__(self, groq_api_key, model_name, embedding_model_name, embeddings_dir):
+    def __init__(self, groq_api_key, model_name, embedding_model_name, embeddings_dir,
+                 validation_batch_size=5, validation_concurrency=4, retrieval_k=4,
+                 embedding_cache_path=None, shared_embedding_cache_path=None,
+                 embedding_cache_max_bytes=256 * 1024 * 1024, response_cache=None,
+                 hybrid_retrieval=True, retrieval_candidates=20, reranker_model_name=None,
+                 context_token_budget=1500, questions_per_cluster=3, diversity_sample_size=2000,
+                 duplicate_threshold=0.9, tokenizer_name=None, usage_tracker=None, user_id=None, route=None,
+                 llm_scheduler=None, groq_api_base=None, answer_screener=None, vector_store_backend='chroma',
+                 vector_dtype='int8', storage_quota_bytes=None, max_collections=None, cold_after_days=None,
+                 blocking_executor=None):
         self.groq_api_key = groq_api_key
         self.model_name = model_name
         self.embedding_model_name = embedding_model_name
         self.embeddings_dir = embeddings_dir
-        self.groq_chat = ChatGroq(
-            groq_api_key=self.groq_api_key,
-            model_name=self.model_name
+        self.validation_batch_size = max(1, validation_batch_size)
+        self.validation_concurrency = max(1, validation_concurrency)
+        self.retrieval_k = retrieval_k
+        self.embedding_cache_path = embedding_cache_path
+        self.shared_embedding_cache_path = shared_embedding_cache_path
+        self.embedding_cache_max_bytes = embedding_cache_max_bytes
+        self.response_cache = response_cache
+        self.hybrid_retrieval = hybrid_retrieval
+        self.retrieval_candidates = max(retrieval_k, retrieval_candidates)
+        self.reranker_model_name = reranker_model_name
+        self.context_token_budget = context_token_budget
+        self.questions_per_cluster = max(1, questions_per_cluster)
+        self.diversity_sample_size = diversity_sample_size
+        self.duplicate_threshold = duplicate_threshold
+        self.tokenizer_name = tokenizer_name
+        self.usage_tracker = usage_tracker
+        self.user_id = user_id
+        self.route = route
+        self.llm_scheduler = llm_scheduler
+        self.answer_screener = answer_screener or AnswerScreener()
+        self.vector_store_backend = vector_store_backend
+        self.vector_dtype = vector_dtype
+        self.max_collections = max_collections
+        # Chroma's SQLite file doesn't shrink when a collection is deleted, so moving or deleting
+        # collections frees no space there; byte quotas and the cold tier need the quantized backend
+        if vector_store_backend != 'quantized' and (storage_quota_bytes or cold_after_days):
+            logger.warning("Storage byte quotas and the cold tier need VECTOR_STORE=quantized; ignoring them")
+            storage_quota_bytes = cold_after_days = None
+        self.storage_quota_bytes = storage_quota_bytes
+        self.cold_after_days = cold_after_days
+        self.cold_dir = os.path.join(self.embeddings_dir, 'cold')
+        self.blocking_executor = blocking_executor
+        # Shared per path, so building a service per request doesn't rerun their schema setup
+        self.library = DocumentLibrary.open(os.path.join(self.embeddings_dir, 'library.sqlite3'))
+        self.question_bank = QuestionBank.open(os.path.join(self.embeddings_dir, 'question_bank.sqlite3'))
+        # With a scheduler, retries happen there so they are paced with everyone else's calls
+        self.groq_chat = registry.get_llm(
+            self.groq_api_key, self.model_name,
+            base_url=groq_api_base,
+            max_retries=0 if llm_scheduler is not None else 2
         )
-    
-    def create_rag_chain(self, split_docs): #responsible for creating the numerical representation of the provided documents.
-        embedding_model = HuggingFaceEmbeddings(
-            model_name=self.embedding_model_name
+
+    @property
+    def embedding_cache_name(self):
+        """Model name plus backend, so vectors from different backends never share cache entries or collections."""
+        return registry.get_embedding_cache_name(self.embedding_model_name)
+
+    def get_embedding_function(self):
+        """Shared embedding model, wrapped in the content-addressed cache when one is configured."""
+        embedding_model = registry.get_embeddings(self.embedding_model_name)
+        if not self.embedding_cache_path:
+            return embedding_model
+        shared_cache = None
+        if self.shared_embedding_cache_path:
+            shared_cache = EmbeddingCache.open(self.shared_embedding_cache_path, self.embedding_cache_max_bytes)
+        return CachedEmbeddings(
+            embedding_model,
+            self.embedding_cache_name,
+            EmbeddingCache.open(self.embedding_cache_path, self.embedding_cache_max_bytes),
+            shared_cache
         )
-        
-        # Create a unique collection name for this upload
-        collection_name = f"document_embeddings_{hash(str(split_docs))}"
-        
-        vector_store = Chroma(
+
+    def get_vector_store(self, collection_name, embedding_function=None):
+        """Open a collection with the shared embedding model, bringing it back from the cold tier first if needed."""
+        if os.path.exists(self.cold_path(collection_name)):
+            self.rehydrate_collection(collection_name)
+        self.library.touch(collection_name)
+        return self._open_vector_store(
+            collection_name, embedding_function or registry.get_embeddings(self.embedding_model_name)
+        )
+
+    def _open_vector_store(self, collection_name, embedding_function=None):
+        if self.vector_store_backend == 'quantized':
+            store = QuantizedVectorStore(self.vectors_dir(collection_name), embedding_function, self.vector_dtype)
+            if not store.exists() and self._has_chroma_data():
+                self._migrate_from_chroma(collection_name, store)
+            return store
+        return Chroma(
             collection_name=collection_name,
-            embedding_function=embedding_model,
-            persist_directory=self.embeddings_dir
+            embedding_function=embedding_function,
+            client=registry.get_chroma_client(self.embeddings_dir)
         )
+
+    def vectors_dir(self, collection_name):
+        """Directory of a collection under the quantized backend."""
+        return os.path.join(self.embeddings_dir, 'vectors', collection_name)
+
+    def cold_path(self, collection_name):
+        """Compressed cold-tier copy of a collection, see archive_collection."""
+        return os.path.join(self.cold_dir, f"{collection_name}.zip")
+
+    def collection_bytes(self, collection_name):
+        """Bytes one collection takes on disk: quantized vectors, BM25 index and cold copy."""
+        total = directory_bytes(self.vectors_dir(collection_name))
+        for path in (self.bm25_path(collection_name), self.cold_path(collection_name)):
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+        return total
+
+    def stored_bytes(self):
+        """Bytes counted against the storage quota: the sum of the user's collections."""
+        return sum(self.collection_bytes(name) for name in self.library.list_collections())
+
+    def _has_chroma_data(self):
+        return os.path.exists(os.path.join(self.embeddings_dir, 'chroma.sqlite3'))
+
+    def _migrate_from_chroma(self, collection_name, store):
+        """Copy a collection written by the Chroma backend into the quantized store, then drop the Chroma copy."""
+        client = registry.get_chroma_client(self.embeddings_dir)
+        try:
+            collection = client.get_collection(collection_name)
+        except Exception:
+            return  # not in Chroma either; chromadb raises ValueError or NotFoundError depending on version
+        found = collection.get(include=['embeddings', 'documents', 'metadatas'])
+        if len(found['ids']):
+            store.add_embeddings(found['ids'], found['embeddings'], found['documents'], found['metadatas'])
+        client.delete_collection(collection_name)
+
+    def _add_embeddings(self, collection_name, ids, vectors, texts, metadatas):
+        """Write precomputed vectors to the hot store, without embedding anything."""
+        if self.vector_store_backend == 'quantized':
+            QuantizedVectorStore(self.vectors_dir(collection_name), dtype=self.vector_dtype).add_embeddings(
+                ids, vectors, texts, metadatas
+            )
+            return
+        collection = registry.get_chroma_client(self.embeddings_dir).get_or_create_collection(collection_name)
+        for start in range(0, len(ids), EMBED_BATCH_SIZE):
+            end = start + EMBED_BATCH_SIZE
+            collection.add(
+                ids=ids[start:end],
+                embeddings=[list(map(float, vector)) for vector in vectors[start:end]],
+                documents=texts[start:end],
+                metadatas=[metadata or None for metadata in metadatas[start:end]]
+            )
+
+    def _drop_hot(self, collection_name):
+        """Delete a collection's vectors and BM25 index, leaving the library and any cold copy alone."""
+        if self.vector_store_backend == 'quantized':
+            shutil.rmtree(self.vectors_dir(collection_name), ignore_errors=True)
+        if self.vector_store_backend != 'quantized' or self._has_chroma_data():
+            try:
+                registry.get_chroma_client(self.embeddings_dir).delete_collection(collection_name)
+            except Exception:
+                pass  # didn't exist; chromadb raises ValueError or NotFoundError depending on version
+        if os.path.exists(self.bm25_path(collection_name)):
+            os.remove(self.bm25_path(collection_name))
+        BM25Index.forget(self.bm25_path(collection_name))
+
+    def _stored_collections(self):
+        """Names of the collections with data on disk, hot or cold."""
+        names = set()
+        vectors_root = os.path.join(self.embeddings_dir, 'vectors')
+        if os.path.isdir(vectors_root):
+            names.update(os.listdir(vectors_root))
+        if self.vector_store_backend != 'quantized' or self._has_chroma_data():
+            for collection in registry.get_chroma_client(self.embeddings_dir).list_collections():
+                names.add(getattr(collection, 'name', collection))
+        if os.path.isdir(self.cold_dir):
+            names.update(name[:-len('.zip')] for name in os.listdir(self.cold_dir) if name.endswith('.zip'))
+        return names
+    
+    def create_rag_chain(self, split_docs, progress=None): #responsible for creating the numerical representation of the provided documents.
+        content_hash = document_hash(self.embedding_cache_name, [doc.page_content for doc in split_docs])
+        revision = DocumentLibrary.compute_revision([content_hash])
+        
+        # Name the collection after its content so an identical upload maps to the same collection
+        collection_name = f"document_embeddings_{revision[:32]}"
+        existing_revision = self.library.get_revision(collection_name)
+        if existing_revision == revision:
+            # Already embedded on a previous upload
+            if progress:
+                progress('persist', 100)
+            return collection_name
+        
+        if existing_revision is not None:
+            # Documents have since been added to or removed from that collection, so start a separate one
+            collection_name = f"document_embeddings_{revision[:24]}_{uuid.uuid4().hex[:8]}"
+        else:
+            # Collections from before the library existed have random chunk ids; rebuild them
+            self.delete_collection(collection_name)
         
-        vector_store.add_documents(split_docs)
+        self._index_document(collection_name, self.source_id(split_docs), content_hash, split_docs, progress)
         
         # Return only the collection name
         return collection_name
+
+    @staticmethod
+    def source_id(split_docs):
+        return split_docs[0].metadata.get('source', 'document') if split_docs else 'document'
+
+    def bm25_path(self, collection_name):
+        """Lexical index for a collection, stored beside the Chroma data."""
+        return os.path.join(self.embeddings_dir, 'bm25', f"{collection_name}.json")
+
+    def get_collection_revision(self, collection_name):
+        """Content revision of a collection; cache keys use it so they change whenever the collection does."""
+        return self.library.get_revision(collection_name) or collection_name
+
+    def _invalidate(self, collection_name):
+        if self.response_cache is not None:
+            self.response_cache.invalidate_collection(collection_name)
+
+    def _index_document(self, collection_name, source_id, content_hash, split_docs, progress=None):
+        ids = chunk_ids(source_id, content_hash, len(split_docs))
+        vector_store = self.get_vector_store(collection_name, self.get_embedding_function())
+        
+        # Add in batches so background jobs can report embedding progress
+        for start in range(0, len(split_docs), EMBED_BATCH_SIZE):
+            if progress:
+                progress('embed', 100 * start / len(split_docs))
+            # Includes the 'embed' span of the batch
+            with tracer.span('chroma_add'):
+                vector_store.add_documents(
+                    split_docs[start:start + EMBED_BATCH_SIZE],
+                    ids=ids[start:start + EMBED_BATCH_SIZE]
+                )
+        
+        with tracer.span('bm25_index'):
+            bm25 = BM25Index.load_for_update(self.bm25_path(collection_name))
+            bm25.add(ids, [doc.page_content for doc in split_docs])
+            bm25.save()
+        
+        self.library.put_document(collection_name, source_id, content_hash, len(split_docs))
+        self._invalidate(collection_name)
+        if progress:
+            progress('persist', 100)
+
+    def add_documents(self, collection_name, split_docs, progress=None):
+        """Append documents to an existing collection.
+
+        Chunks are grouped by their 'source' metadata. A source that is already
+        in the collection with the same content hash is skipped; one whose
+        content changed has its old chunks deleted and only it is re-embedded.
+        """
+        by_source = OrderedDict()
+        for doc in split_docs:
+            by_source.setdefault(doc.metadata.get('source', 'document'), []).append(doc)
+
+        for source_id, docs in by_source.items():
+            content_hash = document_hash(self.embedding_cache_name, [doc.page_content for doc in docs])
+            existing = self.library.get_document(collection_name, source_id)
+            if existing is not None:
+                if existing['content_hash'] == content_hash:
+                    continue
+                self._delete_chunks(collection_name, existing)
+            self._index_document(collection_name, source_id, content_hash, docs, progress)
+
+        if progress:
+            progress('persist', 100)
+        return collection_name
+
+    def _delete_chunks(self, collection_name, document):
+        ids = chunk_ids(document['source_id'], document['content_hash'], document['chunk_count'])
+        # Documents indexed before the source id was part of the ids; skipped if another source shares them
+        if not any(
+            other['source_id'] != document['source_id'] and other['content_hash'] == document['content_hash']
+            for other in self.library.list_documents(collection_name)
+        ):
+            ids += legacy_chunk_ids(document['content_hash'], document['chunk_count'])
+        vector_store = self.get_vector_store(collection_name)
+        for start in range(0, len(ids), EMBED_BATCH_SIZE):
+            vector_store.delete(ids=ids[start:start + EMBED_BATCH_SIZE])
+        bm25 = BM25Index.load_for_update(self.bm25_path(collection_name))
+        bm25.remove(ids)
+        bm25.save()
+
+    def remove_document(self, collection_name, source_id):
+        """Delete one document's chunks from a collection. Returns False if it wasn't there."""
+        document = self.library.get_document(collection_name, source_id)
+        if document is None:
+            return False
+        self._delete_chunks(collection_name, document)
+        self.library.remove_document(collection_name, source_id)
+        self._invalidate(collection_name)
+        return True
+
+    def list_documents(self, collection_name):
+        return self.library.list_documents(collection_name)
+
+    def delete_collection(self, collection_name):
+        self._drop_hot(collection_name)
+        if os.path.exists(self.cold_path(collection_name)):
+            os.remove(self.cold_path(collection_name))
+        self.library.remove_collection(collection_name)
+        self.question_bank.remove_collection(collection_name)
+        self._invalidate(collection_name)
+
+    def garbage_collect(self, keep=()):
+        """Delete collections the library doesn't know about or that have no documents left.
+
+        Returns the names of the deleted collections.
+        """
+        known = set(self.library.list_collections())
+        removed = []
+        for name in self._stored_collections():
+            if name in keep:
+                continue
+            if name not in known or not self.library.list_documents(name):
+                self.delete_collection(name)
+                removed.append(name)
+        for name in known - set(keep) - set(removed):
+            if not self.library.list_documents(name):
+                self.library.remove_collection(name)
+        return removed
     
-    def get_rag_chain(self, collection_name): #this is similar to a librarian who knows how to find the relevant parts from the chroma embedding
-        embedding_model = HuggingFaceEmbeddings(
-            model_name=self.embedding_model_name
+    def archive_collection(self, collection_name):
+        """Move a collection to the cold tier and return the bytes reclaimed.
+
+        Its vectors (as int8), text, metadata and BM25 index go into one
+        compressed file and the hot copy is deleted; get_vector_store brings
+        it back on next use.
+        """
+        with TIER_LOCK:
+            if os.path.exists(self.cold_path(collection_name)):
+                return 0
+            before = self.collection_bytes(collection_name)
+            found = self._open_vector_store(collection_name).get(include=['embeddings', 'documents', 'metadatas'])
+            if not len(found['ids']):
+                return 0
+            write_archive(
+                self.cold_path(collection_name), found['ids'], found['embeddings'], found['documents'],
+                found['metadatas'], attachments={'bm25.json': self.bm25_path(collection_name)}
+            )
+            self._drop_hot(collection_name)
+            after = self.collection_bytes(collection_name)
+        self.library.record_storage_event(collection_name, 'archive', before, after)
+        return before - after
+
+    def rehydrate_collection(self, collection_name):
+        """Restore a collection from the cold tier into the hot store."""
+        with TIER_LOCK:
+            path = self.cold_path(collection_name)
+            if not os.path.exists(path):
+                return
+            before = self.collection_bytes(collection_name)
+            ids, vectors, texts, metadatas, attachments = read_archive(path)
+            self._add_embeddings(collection_name, ids, vectors, texts, metadatas)
+            if 'bm25.json' in attachments:
+                os.makedirs(os.path.dirname(self.bm25_path(collection_name)), exist_ok=True)
+                with open(self.bm25_path(collection_name), 'wb') as bm25_file:
+                    bm25_file.write(attachments['bm25.json'])
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another worker process restored it at the same time
+            after = self.collection_bytes(collection_name)
+        self.library.record_storage_event(collection_name, 'rehydrate', before, after)
+
+    def evict_idle_collections(self, idle_days=None, keep=()):
+        """Archive collections unused for idle_days (cold_after_days by default). Returns the names archived."""
+        idle_days = self.cold_after_days if idle_days is None else idle_days
+        if not idle_days:
+            return []
+        cutoff = time.time() - idle_days * 86400
+        archived = []
+        for name, last_used in self.library.collections_by_last_use():
+            if last_used >= cutoff:
+                break
+            if name not in keep and not os.path.exists(self.cold_path(name)) and self.archive_collection(name):
+                archived.append(name)
+        return archived
+
+    def compact_collections(self):
+        """Rewrite quantized collections without their deleted rows. Returns the bytes reclaimed."""
+        if self.vector_store_backend != 'quantized':
+            return 0
+        reclaimed = 0
+        for name in self.library.list_collections():
+            store = QuantizedVectorStore(self.vectors_dir(name), dtype=self.vector_dtype)
+            if not store.exists():
+                continue
+            saved = store.compact()
+            if saved:
+                after = directory_bytes(store.directory)
+                self.library.record_storage_event(name, 'compact', after + saved, after)
+                reclaimed += saved
+        return reclaimed
+
+    def _delete_for_quota(self, collection_name):
+        before = self.collection_bytes(collection_name)
+        self.delete_collection(collection_name)
+        self.library.record_storage_event(collection_name, 'quota_delete', before, self.collection_bytes(collection_name))
+
+    def enforce_storage_quota(self, keep=()):
+        """Bring the user's stored collections under quota; the ingest job runs this once an upload is indexed.
+
+        Idle collections move to the cold tier first. Past the collection
+        quota the least recently used are deleted; past the byte quota they
+        are archived, then deleted. Collections in keep are never touched, and
+        StorageQuotaError is raised if they alone are over quota.
+        """
+        keep = {name for name in keep if name}
+        self.evict_idle_collections(keep=keep)
+        by_use = [name for name, _ in self.library.collections_by_last_use() if name not in keep]
+
+        if self.max_collections:
+            excess = len(self.library.list_collections()) - self.max_collections
+            if excess > len(by_use):
+                raise StorageQuotaError(
+                    f"You can keep {self.max_collections} document sets; remove documents from the current one first"
+                )
+            for name in by_use[:max(0, excess)]:
+                self._delete_for_quota(name)
+            by_use = by_use[max(0, excess):]
+
+        if self.storage_quota_bytes:
+            for name in by_use:
+                if self.stored_bytes() < self.storage_quota_bytes:
+                    break
+                self.archive_collection(name)
+            for name in by_use:
+                if self.stored_bytes() < self.storage_quota_bytes:
+                    break
+                self._delete_for_quota(name)
+            used = self.stored_bytes()
+            if used >= self.storage_quota_bytes:
+                raise StorageQuotaError(
+                    f"Your documents use {used / 2 ** 20:.1f} MB of your {self.storage_quota_bytes / 2 ** 20:.0f} MB "
+                    "storage; remove some before uploading more"
+                )
+
+    def storage_report(self):
+        """Disk use by tier, quotas, quantization savings and the bytes storage moves have reclaimed."""
+        names = self.library.list_collections()
+        cold = {name for name in names if os.path.exists(self.cold_path(name))}
+        report = {
+            'backend': self.vector_store_backend,
+            'dtype': self.vector_dtype if self.vector_store_backend == 'quantized' else 'float32',
+            # Chroma collections share one file, so only the quantized backend can be measured per collection
+            'bytes': self.stored_bytes() if self.vector_store_backend == 'quantized' else directory_bytes(self.embeddings_dir),
+            'cold_bytes': directory_bytes(self.cold_dir),
+            'collections': {'hot': len(names) - len(cold), 'cold': len(cold)},
+            'quota': {'bytes': self.storage_quota_bytes, 'collections': self.max_collections},
+        }
+        if self.vector_store_backend == 'quantized':
+            stats = [QuantizedVectorStore(self.vectors_dir(name)).get_stats() for name in names if name not in cold]
+            report['vectors'] = {
+                'bytes': sum(stat['vector_bytes'] for stat in stats),
+                'float32_bytes': sum(stat['float32_bytes'] for stat in stats),
+            }
+        report.update(self.library.storage_report())
+        return report
+
+    @staticmethod
+    def chunk_ids(docs):
+        """Ids of retrieved chunks, falling back to a content digest when Chroma didn't return one."""
+        return [doc.id or hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest() for doc in docs]
+
+    @staticmethod
+    def format_context(docs):
+        return "\n\n".join(
+            f"[Page {doc.metadata['page']}] {doc.page_content}" if 'page' in doc.metadata else doc.page_content
+            for doc in docs
         )
-        
-        vector_store = Chroma(
-            collection_name=collection_name,
-            embedding_function=embedding_model,
-            persist_directory=self.embeddings_dir
+
+    def build_prompt(self, docs, prompt):
+        with tracer.span('prompt_build'):
+            return get_rag_prompt(self.format_context(docs), prompt)
+
+    @staticmethod
+    def normalize_answer(answer):
+        return ' '.join(answer.split())
+
+    def retrieve(self, collection_name, query, use_cache=True):
+        """Similarity search, served from the response cache when the same query was run on this collection."""
+        with tracer.span('retrieve'):
+            return self._retrieve(collection_name, query, use_cache)
+
+    def _retrieve(self, collection_name, query, use_cache):
+        key = cache_key(
+            'retrieval', self.get_collection_revision(collection_name), query, self.retrieval_k,
+            self.embedding_cache_name, self.hybrid_retrieval, self.retrieval_candidates,
+            self.reranker_model_name, self.context_token_budget
         )
-        
-        retriever = vector_store.as_retriever()
-        return RetrievalQA.from_chain_type(
-            llm=self.groq_chat,
-            chain_type="stuff",
-            retriever=retriever
+        if use_cache and self.response_cache is not None:
+            cached = self.response_cache.get('retrieval', key)
+            if cached is not None:
+                return [
+                    LangchainDocument(id=item['id'], page_content=item['page_content'], metadata=item['metadata'])
+                    for item in cached
+                ]
+
+        docs = self.search(collection_name, query)
+        if self.response_cache is not None:
+            self.response_cache.set('retrieval', key, [
+                {'id': doc.id, 'page_content': doc.page_content, 'metadata': doc.metadata}
+                for doc in docs
+            ], collection_name)
+        return docs
+
+    def search(self, collection_name, query):
+        """Retrieve context chunks for a query.
+
+        With hybrid retrieval, vector and BM25 candidates are fused with
+        reciprocal rank fusion and optionally re-ranked by a cross-encoder.
+        The result is capped at retrieval_k chunks and context_token_budget tokens.
+        """
+        vector_store = self.get_vector_store(collection_name)
+        if not self.hybrid_retrieval:
+            with tracer.span('chroma_query'):
+                docs = vector_store.similarity_search(query, k=self.retrieval_k)
+            return self.fit_to_budget(docs)
+
+        with tracer.span('chroma_query'):
+            vector_docs = vector_store.similarity_search(query, k=self.retrieval_candidates)
+        vector_ids = [doc.id or hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest() for doc in vector_docs]
+        by_id = dict(zip(vector_ids, vector_docs))
+
+        with tracer.span('bm25_query'):
+            lexical_ids = BM25Index.load(self.bm25_path(collection_name)).search(query, self.retrieval_candidates)
+        missing = [doc_id for doc_id in lexical_ids if doc_id not in by_id]
+        if missing:
+            found = vector_store.get(ids=missing)
+            for doc_id, text, metadata in zip(found['ids'], found['documents'], found['metadatas']):
+                by_id[doc_id] = LangchainDocument(id=doc_id, page_content=text, metadata=metadata or {})
+
+        docs = [by_id[doc_id] for doc_id in reciprocal_rank_fusion([vector_ids, lexical_ids]) if doc_id in by_id]
+        if self.reranker_model_name and len(docs) > 1:
+            reranker = registry.get_reranker(self.reranker_model_name)
+            with tracer.span('rerank'):
+                scores = reranker.predict([(query, doc.page_content) for doc in docs])
+            docs = [doc for _, doc in sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True)]
+        return self.fit_to_budget(docs)
+
+    def local_token_count(self, text):
+        """Tokens by the local tokenizer, or ~4 characters per token without one; not the model's own tokenizer."""
+        if not self.tokenizer_name:
+            return len(text) // 4 + 1
+        tokenizer = registry.get_tokenizer(self.tokenizer_name)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def estimate_tokens(self, text, local_count=None):
+        """Estimate of the model's token count, for context budgets and rate-limit reservations.
+
+        The local count is scaled by the provider/local ratio seen on earlier
+        calls. Usage accounting and quotas use the provider's reported counts.
+        """
+        local_count = self.local_token_count(text) if local_count is None else local_count
+        ratio = self.usage_tracker.token_ratio() if self.usage_tracker is not None else 1.0
+        return math.ceil(local_count * ratio)
+
+    def fit_to_budget(self, docs, limit=None, budget=None):
+        """Keep the best-ranked chunks that fit in `limit` (retrieval_k) chunks and the context token budget.
+
+        The first chunk is always kept so a prompt never goes out without context.
+        """
+        limit = self.retrieval_k if limit is None else limit
+        budget = self.context_token_budget if budget is None else budget
+        selected = []
+        used = 0
+        for doc in docs[:limit]:
+            tokens = self.estimate_tokens(doc.page_content)
+            if selected and used + tokens > budget:
+                break
+            selected.append(doc)
+            used += tokens
+        return selected
+
+    def _record_usage(self, prompt, content, usage, ttft, latency, local_prompt_tokens):
+        # The provider's counts when it reports them, the scaled local estimate otherwise
+        usage = usage or {}
+        estimated = not (usage.get('input_tokens') and usage.get('output_tokens'))
+        prompt_tokens = usage.get('input_tokens') or self.estimate_tokens(prompt, local_prompt_tokens)
+        completion_tokens = usage.get('output_tokens') or self.estimate_tokens(content)
+        if self.llm_scheduler is not None:
+            # The prompt was reserved up front; the completion is only known now
+            self.llm_scheduler.charge_tokens(completion_tokens)
+        if self.usage_tracker is not None:
+            self.usage_tracker.record(
+                self.user_id, self.route, self.model_name, prompt_tokens, completion_tokens, ttft, latency,
+                estimated=estimated, local_prompt_tokens=local_prompt_tokens
+            )
+
+    def call_llm(self, prompt):
+        """Single LLM call with quota check, scheduling and token/latency accounting."""
+        if self.usage_tracker is not None:
+            self.usage_tracker.check_quota(self.user_id)
+
+        def invoke():
+            start = time.perf_counter()
+            response = self.groq_chat.invoke(prompt)
+            latency = time.perf_counter() - start
+            tracer.record('llm_call', latency)
+            return response, latency
+
+        local_tokens = self.local_token_count(prompt)
+        if self.llm_scheduler is not None:
+            response, latency = self.llm_scheduler.run(
+                self.user_id, invoke, tokens=self.estimate_tokens(prompt, local_tokens)
+            )
+        else:
+            response, latency = invoke()
+        # Non-streaming, so the first token arrives with the rest
+        self._record_usage(
+            prompt, response.content, getattr(response, 'usage_metadata', None), latency, latency, local_tokens
         )
-    
-    def generate_questions(self, collection_name, question_count, complexity): ##since we're using RAG the prompt we're passing to the LLM is more specific and focused because it includes the relevant context retrieved from the embeddings.
-        rag_chain = self.get_rag_chain(collection_name)
+        return response.content
+
+    async def run_blocking(self, func, *args):
+        """Await a blocking call (embedding, retrieval, SQLite) off the event loop, on the shared executor if there is one."""
+        if self.blocking_executor is not None:
+            return await self.blocking_executor.run(func, *args)
+        return await asyncio.to_thread(func, *args)
+
+    async def acall_llm(self, prompt):
+        """Async call_llm: the request waits on the scheduler and the provider without holding a thread."""
+        if self.usage_tracker is not None:
+            # The quota and the usage record are SQLite reads and writes, so they stay off the event loop too
+            await self.run_blocking(self.usage_tracker.check_quota, self.user_id)
+
+        async def invoke():
+            start = time.perf_counter()
+            response = await self.groq_chat.ainvoke(prompt)
+            latency = time.perf_counter() - start
+            tracer.record('llm_call', latency)
+            return response, latency
+
+        local_tokens = await self.run_blocking(self.local_token_count, prompt)
+        if self.llm_scheduler is not None:
+            response, latency = await self.llm_scheduler.arun(
+                self.user_id, invoke, tokens=self.estimate_tokens(prompt, local_tokens)
+            )
+        else:
+            response, latency = await invoke()
+        await self.run_blocking(
+            self._record_usage,
+            prompt, response.content, getattr(response, 'usage_metadata', None), latency, latency, local_tokens
+        )
+        return response.content
+
+    def stream_llm(self, prompt):
+        """Streaming LLM call; yields content pieces and records time to first token."""
+        if self.usage_tracker is not None:
+            self.usage_tracker.check_quota(self.user_id)
+        timing = {'start': None}
+
+        def open_stream():
+            # Timed from here so queueing in the scheduler isn't counted as provider latency
+            timing['start'] = time.perf_counter()
+            return self.groq_chat.stream(prompt)
+
+        local_tokens = self.local_token_count(prompt)
+        if self.llm_scheduler is not None:
+            chunks = self.llm_scheduler.stream(self.user_id, open_stream, tokens=self.estimate_tokens(prompt, local_tokens))
+        else:
+            chunks = open_stream()
+        ttft = None
+        content = ""
+        usage = None
+        try:
+            for chunk in chunks:
+                if ttft is None:
+                    ttft = time.perf_counter() - timing['start']
+                    tracer.record('llm_stream_ttft', ttft)
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                content += chunk.content
+                yield chunk.content
+        finally:
+            if timing['start'] is not None:
+                latency = time.perf_counter() - timing['start']
+                tracer.record('llm_stream', latency)
+                self._record_usage(prompt, content, usage, ttft if ttft is not None else latency, latency, local_tokens)
+
+    def complete(self, namespace, key, collection_name, prompt, use_cache=True):
+        """Run one LLM call, served from the response cache when possible.
+
+        use_cache=False skips the lookup (e.g. "regenerate") but still stores the fresh result.
+        """
+        if use_cache and self.response_cache is not None:
+            cached = self.response_cache.get(namespace, key)
+            if cached is not None:
+                return cached
+
+        result = self.call_llm(prompt)
+        if self.response_cache is not None:
+            self.response_cache.set(namespace, key, result, collection_name)
+        return result
+
+    async def acomplete(self, namespace, key, collection_name, prompt, use_cache=True):
+        """Async complete()."""
+        if use_cache and self.response_cache is not None:
+            cached = await self.run_blocking(self.response_cache.get, namespace, key)
+            if cached is not None:
+                return cached
+
+        result = await self.acall_llm(prompt)
+        if self.response_cache is not None:
+            await self.run_blocking(self.response_cache.set, namespace, key, result, collection_name)
+        return result
+
+    def question_cache_key(self, prompt, docs):
+        return cache_key('questions', prompt, self.chunk_ids(docs), self.model_name)
+
+    def validation_cache_key(self, question, answer, docs):
+        return cache_key('validation', question, self.normalize_answer(answer), self.chunk_ids(docs), self.model_name)
+
+    def generate_questions(self, collection_name, question_count, complexity, use_cache=True): ##since we're using RAG the prompt we're passing to the LLM is more specific and focused because it includes the relevant context retrieved from the embeddings.
         prompt = get_question_generation_prompt(question_count, complexity)
-        response = rag_chain.invoke({"query": prompt})
+        docs = self.retrieve(collection_name, prompt, use_cache)
+        result = self.complete(
+            'questions',
+            self.question_cache_key(prompt, docs),
+            collection_name,
+            self.build_prompt(docs, prompt),
+            use_cache
+        )
         
         # Process and return the questions
-        questions = [q.strip() for q in response['result'].split('\n') if q.strip() and not q.startswith("Here are")]
-        return questions
+        return [q.strip() for q in result.split('\n') if self.is_question_line(q)]
+
+    async def agenerate_questions(self, collection_name, question_count, complexity, use_cache=True):
+        """Async generate_questions."""
+        prompt = get_question_generation_prompt(question_count, complexity)
+        docs = await self.run_blocking(self.retrieve, collection_name, prompt, use_cache)
+        result = await self.acomplete(
+            'questions',
+            self.question_cache_key(prompt, docs),
+            collection_name,
+            self.build_prompt(docs, prompt),
+            use_cache
+        )
+        return [q.strip() for q in result.split('\n') if self.is_question_line(q)]
+
+    @staticmethod
+    def is_question_line(line):
+        """Skip blank lines and the model's "Here are ..." preamble."""
+        return bool(line.strip()) and not line.startswith("Here are")
+
+    def stream_questions(self, collection_name, question_count, complexity, use_cache=True):
+        """Yield questions one at a time as soon as each line of the streamed completion is finished."""
+        prompt = get_question_generation_prompt(question_count, complexity)
+        docs = self.retrieve(collection_name, prompt, use_cache)
+        key = self.question_cache_key(prompt, docs)
+
+        if use_cache and self.response_cache is not None:
+            cached = self.response_cache.get('questions', key)
+            if cached is not None:
+                for line in cached.split('\n'):
+                    if self.is_question_line(line):
+                        yield line.strip()
+                return
+
+        result = ""
+        buffer = ""
+        for content in self.stream_llm(self.build_prompt(docs, prompt)):
+            result += content
+            buffer += content
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                if self.is_question_line(line):
+                    yield line.strip()
+        if self.is_question_line(buffer):
+            yield buffer.strip()
+
+        if self.response_cache is not None:
+            self.response_cache.set('questions', key, result, collection_name)
     
-    def validate_answer(self, collection_name, question, answer):
-        rag_chain = self.get_rag_chain(collection_name)
-        prompt = get_answer_validation_prompt(question, answer)
-        validation_response = rag_chain.invoke({"query": prompt})
-        print(f"Prompt: {prompt}")
-        print(f"Result: {validation_response['result']}")
-        return validation_response['result'].strip()
\ No newline at end of file
+    def sample_clusters(self, collection_name, n_clusters, seed=0):
+        """Split the collection into n_clusters topical clusters and return the central chunks of each.
+
+        Works on the stored embeddings, so nothing is re-embedded; very large
+        collections are evenly subsampled to diversity_sample_size chunks first.
+        """
+        vector_store = self.get_vector_store(collection_name)
+        ids = vector_store.get(include=[])['ids']
+        if len(ids) > self.diversity_sample_size:
+            step = len(ids) / self.diversity_sample_size
+            ids = [ids[int(index * step)] for index in range(self.diversity_sample_size)]
+        found = vector_store.get(ids=ids, include=['embeddings', 'documents', 'metadatas'])
+        docs = [
+            LangchainDocument(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(found['ids'], found['documents'], found['metadatas'])
+        ]
+        if not docs:
+            return []
+        clusters = cluster_representatives(found['embeddings'], n_clusters, self.retrieval_k, seed=seed)
+        return [self.fit_to_budget([docs[index] for index in indices]) for indices in clusters]
+
+    def iter_diverse_questions(self, collection_name, question_count, complexity, use_cache=True):
+        """Yield questions spread across the whole document.
+
+        The collection is clustered, each cluster gets its own question
+        generation call (run in parallel), and questions too similar to one
+        already yielded are dropped.
+        """
+        n_clusters = max(1, math.ceil(question_count / self.questions_per_cluster))
+        clusters = self.sample_clusters(collection_name, n_clusters)
+        if len(clusters) <= 1:
+            yield from self.generate_questions(collection_name, question_count, complexity, use_cache)[:question_count]
+            return
+
+        # Ask each cluster for one extra question to make up for duplicates
+        per_cluster = math.ceil(question_count / len(clusters)) + 1
+        embedding_model = registry.get_embeddings(self.embedding_model_name)
+        duplicates = NearDuplicateFilter(self.duplicate_threshold)
+        yielded = 0
+
+        def generate_for_cluster(docs):
+            prompt = get_question_generation_prompt(per_cluster, complexity)
+            result = self.complete(
+                'questions',
+                self.question_cache_key(prompt, docs),
+                collection_name,
+                self.build_prompt(docs, prompt),
+                use_cache
+            )
+            return [line.strip() for line in result.split('\n') if self.is_question_line(line)]
+
+        with ThreadPoolExecutor(max_workers=min(self.validation_concurrency, len(clusters))) as executor:
+            futures = [executor.submit(generate_for_cluster, docs) for docs in clusters]
+            for future in as_completed(futures):
+                questions = future.result()
+                if not questions:
+                    continue
+                for question in duplicates.filter(questions, embedding_model.embed_documents(questions)):
+                    if yielded >= question_count:
+                        break
+                    yield question
+                    yielded += 1
+                if yielded >= question_count:
+                    # Enough questions; don't start calls for clusters still waiting
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    def generate_diverse_questions(self, collection_name, question_count, complexity, use_cache=True):
+        return list(self.iter_diverse_questions(collection_name, question_count, complexity, use_cache))
+
+    async def agenerate_diverse_questions(self, collection_name, question_count, complexity, use_cache=True):
+        """Async generate_diverse_questions: the per-cluster calls are tasks on the event loop instead of threads."""
+        n_clusters = max(1, math.ceil(question_count / self.questions_per_cluster))
+        clusters = await self.run_blocking(self.sample_clusters, collection_name, n_clusters)
+        if len(clusters) <= 1:
+            return (await self.agenerate_questions(collection_name, question_count, complexity, use_cache))[:question_count]
+
+        per_cluster = math.ceil(question_count / len(clusters)) + 1
+        embedding_model = await self.run_blocking(registry.get_embeddings, self.embedding_model_name)
+        duplicates = NearDuplicateFilter(self.duplicate_threshold)
+        concurrency = asyncio.Semaphore(min(self.validation_concurrency, len(clusters)))
+
+        async def generate_for_cluster(docs):
+            prompt = get_question_generation_prompt(per_cluster, complexity)
+            async with concurrency:
+                result = await self.acomplete(
+                    'questions',
+                    self.question_cache_key(prompt, docs),
+                    collection_name,
+                    self.build_prompt(docs, prompt),
+                    use_cache
+                )
+            return [line.strip() for line in result.split('\n') if self.is_question_line(line)]
+
+        questions = []
+        tasks = [asyncio.ensure_future(generate_for_cluster(docs)) for docs in clusters]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                batch = await next_done
+                if not batch:
+                    continue
+                vectors = await self.run_blocking(embedding_model.embed_documents, batch)
+                questions.extend(duplicates.filter(batch, vectors)[:question_count - len(questions)])
+                if len(questions) >= question_count:
+                    break
+        finally:
+            # Enough questions (or the request went away); drop the calls still queued
+            for task in tasks:
+                task.cancel()
+        return questions
+
+    @staticmethod
+    def parse_question_bank(text):
+        """Parse "Question: ... / Answer: ..." blocks into (question, reference answer) pairs."""
+        return [
+            (' '.join(question.split()), ' '.join(answer.split()))
+            for question, answer in QUESTION_BANK_PATTERN.findall(text)
+        ]
+
+    def fill_question_bank(self, collection_name, complexity, target, use_cache=True):
+        """Generate questions with reference answers until `target` unserved ones are banked for this complexity.
+
+        Questions come from topical clusters as in iter_diverse_questions, and
+        near-duplicates of questions already banked are dropped. Returns the
+        number of questions added.
+        """
+        revision = self.get_collection_revision(collection_name)
+        self.question_bank.prune(collection_name, revision)
+        needed = target - self.question_bank.count_fresh(collection_name, revision, complexity)
+        if needed <= 0:
+            return 0
+
+        existing = self.question_bank.questions(collection_name, revision, complexity)
+        n_clusters = max(1, math.ceil(needed / self.questions_per_cluster))
+        # A different seed on each top-up groups the chunks differently, so the new calls see new context
+        clusters = self.sample_clusters(collection_name, n_clusters, seed=len(existing))
+        if not clusters:
+            return 0
+        per_cluster = math.ceil(needed / len(clusters)) + 1
+        embedding_model = registry.get_embeddings(self.embedding_model_name)
+        duplicates = NearDuplicateFilter(self.duplicate_threshold)
+        if existing:
+            duplicates.filter(existing, embedding_model.embed_documents(existing))
+
+        def generate_for_cluster(docs):
+            prompt = get_question_bank_prompt(per_cluster, complexity)
+            result = self.complete(
+                'question_bank',
+                self.question_cache_key(prompt, docs),
+                collection_name,
+                self.build_prompt(docs, prompt),
+                use_cache
+            )
+            return docs, self.parse_question_bank(result)
+
+        added = 0
+        with ThreadPoolExecutor(max_workers=min(self.validation_concurrency, len(clusters))) as executor:
+            for future in as_completed([executor.submit(generate_for_cluster, docs) for docs in clusters]):
+                docs, pairs = future.result()
+                if not pairs:
+                    continue
+                references = dict(pairs)
+                questions = duplicates.filter(list(references), embedding_model.embed_documents(list(references)))
+                ids = self.chunk_ids(docs)
+                self.question_bank.add(
+                    collection_name, revision, complexity,
+                    [(question, references[question], ids) for question in questions]
+                )
+                added += len(questions)
+        return added
+
+    def build_question_bank(self, collection_name, per_complexity):
+        """Fill the bank for every complexity level; run after ingestion, off the request path."""
+        for complexity in COMPLEXITY_INSTRUCTIONS:
+            self.fill_question_bank(collection_name, complexity, per_complexity)
+
+    def sample_question_bank(self, collection_name, question_count, complexity):
+        """Banked questions for an instant quiz, least served first; [] when the bank can't cover the request."""
+        revision = self.get_collection_revision(collection_name)
+        return self.question_bank.sample(collection_name, revision, complexity, question_count)
+
+    def question_bank_low(self, collection_name, complexity, low_water):
+        revision = self.get_collection_revision(collection_name)
+        return self.question_bank.count_fresh(collection_name, revision, complexity) < low_water
+
+    def screen_answers(self, collection_name, items):
+        """Settle trivial answers locally (see AnswerScreener); returns {number: "Verdict/Feedback" text}.
+
+        items is a list of (number, question, answer). Banked reference answers
+        are passed along so close matches can be marked correct.
+        """
+        references = self.question_bank.references(
+            collection_name, self.get_collection_revision(collection_name), [question for _, question, _ in items]
+        )
+        embedding_model = registry.get_embeddings(self.embedding_model_name)
+        return self.answer_screener.screen(items, references, embedding_model.embed_documents)
+
+    def validate_answer(self, collection_name, question, answer, use_cache=True):
+        prompt = get_answer_validation_prompt(question, self.normalize_answer(answer))
+        docs = self.retrieve(collection_name, question, use_cache)
+        result = self.complete(
+            'validation',
+            self.validation_cache_key(question, answer, docs),
+            collection_name,
+            self.build_prompt(docs, prompt),
+            use_cache
+        )
+        logger.debug("Validation prompt: %s", prompt)
+        logger.debug("Validation result: %s", result)
+        return result.strip()
+
+    async def avalidate_answer(self, collection_name, question, answer, use_cache=True):
+        """Async validate_answer."""
+        prompt = get_answer_validation_prompt(question, self.normalize_answer(answer))
+        docs = await self.run_blocking(self.retrieve, collection_name, question, use_cache)
+        result = await self.acomplete(
+            'validation',
+            self.validation_cache_key(question, answer, docs),
+            collection_name,
+            self.build_prompt(docs, prompt),
+            use_cache
+        )
+        return result.strip()
+
+    def retrieve_context(self, collection_name, queries, use_cache=True):
+        """Run one similarity search per query and return the matches for each, deduplicated across queries."""
+        seen = {}
+        per_query = []
+        for query in queries:
+            matches = []
+            for doc in self.retrieve(collection_name, query, use_cache):
+                key = doc.page_content
+                if key not in seen:
+                    seen[key] = doc
+                matches.append(seen[key])
+            per_query.append(matches)
+        return per_query
+
+    def parse_batch_validation(self, text, numbers):
+        """Parse the structured batch output into {item number: "Verdict/Feedback" text}.
+
+        Returns None unless every item in `numbers` appears exactly once and
+        nothing else does, so the caller regrades the batch item by item.
+        """
+        results = {}
+        for match in BATCH_ITEM_PATTERN.finditer(text):
+            number = int(match.group(1))
+            if number not in numbers or number in results:
+                return None
+            verdict = match.group(2).capitalize()
+            feedback = ' '.join(match.group(3).split())
+            results[number] = f"Verdict: {verdict}\nFeedback: {feedback}"
+        if len(results) != len(numbers):
+            return None
+        return results
+
+    def batch_validation_prompt(self, batch, batch_docs):
+        # batch is a list of (number, question, answer)
+        # Take chunks round-robin by rank so every item keeps its best chunks when the budget trims the tail
+        with tracer.span('prompt_build'):
+            docs = []
+            for rank in range(max((len(item_docs) for item_docs in batch_docs), default=0)):
+                for item_docs in batch_docs:
+                    if rank < len(item_docs) and item_docs[rank] not in docs:
+                        docs.append(item_docs[rank])
+            docs = self.fit_to_budget(docs, limit=len(docs))
+            return get_batch_answer_validation_prompt(
+                self.format_context(docs),
+                [(number, question, self.normalize_answer(answer)) for number, question, answer in batch]
+            )
+
+    def cache_batch_validation(self, collection_name, batch, batch_docs, parsed):
+        if self.response_cache is None:
+            return
+        for (number, question, answer), item_docs in zip(batch, batch_docs):
+            self.response_cache.set(
+                'validation',
+                self.validation_cache_key(question, answer, item_docs),
+                parsed[number],
+                collection_name
+            )
+
+    def _validate_batch(self, collection_name, batch, batch_docs, use_cache=True):
+        prompt = self.batch_validation_prompt(batch, batch_docs)
+        try:
+            parsed = self.parse_batch_validation(self.call_llm(prompt), [number for number, _, _ in batch])
+        except QuotaExceededError:
+            raise
+        except Exception:
+            parsed = None
+
+        if parsed is None:
+            # Fall back to grading each item on its own
+            return {
+                number: self.validate_answer(collection_name, question, answer, use_cache)
+                for number, question, answer in batch
+            }
+
+        self.cache_batch_validation(collection_name, batch, batch_docs, parsed)
+        return parsed
+
+    async def _avalidate_batch(self, collection_name, batch, batch_docs, use_cache=True):
+        prompt = await self.run_blocking(self.batch_validation_prompt, batch, batch_docs)
+        try:
+            parsed = self.parse_batch_validation(await self.acall_llm(prompt), [number for number, _, _ in batch])
+        except QuotaExceededError:
+            raise
+        except Exception:
+            parsed = None
+
+        if parsed is None:
+            results = await asyncio.gather(*(
+                self.avalidate_answer(collection_name, question, answer, use_cache)
+                for _, question, answer in batch
+            ))
+            return {number: result for (number, _, _), result in zip(batch, results)}
+
+        await self.run_blocking(self.cache_batch_validation, collection_name, batch, batch_docs, parsed)
+        return parsed
+
+    def validate_answers(self, collection_name, question_answer_pairs, use_cache=True):
+        """Grade many answers at once: a single retrieval pass, several items per LLM call, batches run concurrently."""
+        validations = self.iter_validations(collection_name, question_answer_pairs, use_cache)
+        return sorted(validations, key=lambda validation: int(validation['number']))
+
+    def iter_validations(self, collection_name, question_answer_pairs, use_cache=True):
+        """Like validate_answers, but yields each batch's results as soon as that batch finishes."""
+        settled, questions, batches = self.plan_validations(collection_name, question_answer_pairs, use_cache)
+        yield from settled
+        if not batches:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.validation_concurrency, len(batches))) as executor:
+            futures = [
+                executor.submit(self._validate_batch, collection_name, batch, batch_docs, use_cache)
+                for batch, batch_docs in batches
+            ]
+            for future in as_completed(futures):
+                for number, validation_text in sorted(future.result().items()):
+                    yield {
+                        'number': str(number),
+                        'question': questions[number],
+                        'validation': validation_text
+                    }
+
+    async def avalidate_answers(self, collection_name, question_answer_pairs, use_cache=True):
+        """Async validate_answers: screening, retrieval and cache lookups run on the blocking executor, the LLM batches as tasks."""
+        settled, questions, batches = await self.run_blocking(
+            self.plan_validations, collection_name, question_answer_pairs, use_cache
+        )
+        concurrency = asyncio.Semaphore(self.validation_concurrency)
+
+        async def validate_batch(batch, batch_docs):
+            async with concurrency:
+                return await self._avalidate_batch(collection_name, batch, batch_docs, use_cache)
+
+        validations = list(settled)
+        for results in await asyncio.gather(*(validate_batch(batch, batch_docs) for batch, batch_docs in batches)):
+            validations.extend(
+                {'number': str(number), 'question': questions[number], 'validation': validation_text}
+                for number, validation_text in results.items()
+            )
+        return sorted(validations, key=lambda validation: int(validation['number']))
+
+    def plan_validations(self, collection_name, question_answer_pairs, use_cache=True):
+        """Settle what can be graded without the LLM and batch the rest.
+
+        Returns (settled validations, {number: question}, [(batch, batch_docs)]).
+        """
+        items = [(number, question, answer) for number, (question, answer) in enumerate(question_answer_pairs, 1)]
+        questions = {number: question for number, question, _ in items}
+        if not items:
+            return [], questions, []
+
+        # Trivial answers are settled locally; only the ambiguous ones need retrieval and the LLM
+        screened = self.screen_answers(collection_name, items)
+        items = [item for item in items if item[0] not in screened]
+        item_docs = self.retrieve_context(collection_name, [question for _, question, _ in items], use_cache)
+        settled = [
+            {
+                'number': str(number),
+                'question': questions[number],
+                'validation': screened[number]
+            }
+            for number in sorted(screened)
+        ]
+
+        # Answers graded before (e.g. the same canonical answer from another student) are served from the cache
+        pending = []
+        for item, docs in zip(items, item_docs):
+            number, question, answer = item
+            cached = None
+            if use_cache and self.response_cache is not None:
+                cached = self.response_cache.get('validation', self.validation_cache_key(question, answer, docs))
+            if cached is not None:
+                settled.append({
+                    'number': str(number),
+                    'question': question,
+                    'validation': cached
+                })
+            else:
+                pending.append((item, docs))
+
+        batches = []
+        for start in range(0, len(pending), self.validation_batch_size):
+            batch = pending[start:start + self.validation_batch_size]
+            batches.append(([item for item, _ in batch], [docs for _, docs in batch]))
+        return settled, questions, batches
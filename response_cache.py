@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+def cache_key(*parts):
+    """Digest of the parts that decide a cached value (prompt, chunk ids, model name, ...)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Two-level cache for retrieval results and LLM responses.
+
+    An in-memory LRU sits in front of a SQLite file. Entries are tagged with
+    the collection they were computed from so they can be dropped when that
+    collection changes, and expire after ttl_seconds (None keeps them forever).
+    """
+
+    def __init__(self, path, memory_items=2048, ttl_seconds=None):
+        self.path = path
+        self.memory_items = memory_items
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, collection_name TEXT, "
+                "value TEXT NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_collection ON responses (collection_name)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, namespace, outcome):
+        counts = self._stats.setdefault(namespace, {'memory_hits': 0, 'disk_hits': 0, 'misses': 0})
+        counts[outcome] += 1
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, namespace, key):
+        """Return the cached value or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, collection_name, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._count(namespace, 'memory_hits')
+                    return value
+                del self._memory[key]
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, collection_name, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[2] is not None and row[2] <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+
+        with self._lock:
+            if row is None:
+                self._count(namespace, 'misses')
+                return None
+            value = json.loads(row[0])
+            self._remember(key, (value, row[1], row[2]))
+            self._count(namespace, 'disk_hits')
+            return value
+
+    def set(self, namespace, key, value, collection_name=None, ttl_seconds=None):
+        """Store a JSON-serializable value."""
+        ttl_seconds = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, namespace, collection_name, value, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, collection_name, json.dumps(value), expires_at)
+            )
+        with self._lock:
+            self._remember(key, (value, collection_name, expires_at))
+
+    def invalidate_collection(self, collection_name):
+        """Drop everything computed from a collection, e.g. after documents are added to it."""
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if entry[1] == collection_name]:
+                del self._memory[key]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE collection_name = ?", (collection_name,))
+
+    def get_stats(self):
+        """Hit/miss counts and hit rate per namespace."""
+        with self._lock:
+            stats = {}
+            for namespace, counts in self._stats.items():
+                lookups = sum(counts.values())
+                hits = counts['memory_hits'] + counts['disk_hits']
+                stats[namespace] = dict(counts, hit_rate=round(hits / lookups, 3) if lookups else None)
+            return {'memory_items': len(self._memory), 'namespaces': stats}
@@ -1,11 +1,29 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-import requests
+from functools import wraps
 import json
+import os
+from oauthlib.oauth2 import WebApplicationClient
 from datetime import datetime
 
-from app import app, client, get_google_provider_cfg, get_user_services
+from app import app, client, get_google_provider_cfg, get_user_services, ingest_queue, response_cache, oauth_provider, llm_usage, llm_scheduler, quiz_store, question_bank_filler, answer_screener, startup, blocking_executor
+from document_library import StorageQuotaError
+from ingest_jobs import TooManyJobsError
+from llm_usage import QuotaExceededError
+from model_registry import registry
 from models import User
+from prompts import COMPLEXITY_INSTRUCTIONS
+from tracing import tracer
+
+def admin_required(view):
+    """Like login_required, but only for the users in METRICS_ADMIN_EMAILS; everyone else gets a 403"""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if (current_user.email or '').lower() not in app.config['METRICS_ADMIN_EMAILS']:
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
 
 @app.route("/login")
 def login():
@@ -25,34 +43,33 @@ def callback():
     google_provider_cfg = get_google_provider_cfg()
     token_endpoint = google_provider_cfg["token_endpoint"]
     
+    # The token ends up stored on the client, so use a fresh one per login instead of the shared one
+    login_client = WebApplicationClient(app.config['GOOGLE_CLIENT_ID'])
+    
     # Get tokens
-    token_url, headers, body = client.prepare_token_request(
+    token_url, headers, body = login_client.prepare_token_request(
         token_endpoint,
         authorization_response=request.url,
         redirect_url=request.base_url,
         code=code
     )
-    token_response = requests.post(
-        token_url,
-        headers=headers,
-        data=body,
-        auth=(app.config['GOOGLE_CLIENT_ID'], app.config['GOOGLE_CLIENT_SECRET']),
-    )
+    token = oauth_provider.fetch_token(token_url, headers, body)
     
-    client.parse_request_body_response(json.dumps(token_response.json()))
+    login_client.parse_request_body_response(json.dumps(token))
     
     # Get user info
     userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
-    uri, headers, body = client.add_token(userinfo_endpoint)
-    userinfo_response = requests.get(uri, headers=headers, data=body)
+    uri, headers, body = login_client.add_token(userinfo_endpoint)
+    userinfo = oauth_provider.fetch_userinfo(uri, headers, body)
     
-    if userinfo_response.json().get("email_verified"):
-        unique_id = userinfo_response.json()["sub"]
-        users_email = userinfo_response.json()["email"]
-        users_name = userinfo_response.json()["given_name"]
+    if userinfo.get("email_verified"):
+        unique_id = userinfo["sub"]
+        users_email = userinfo["email"]
+        users_name = userinfo["given_name"]
         
         # Create user object and log them in
         user = User(unique_id, users_email, users_name)
+        app.session_interface.regenerate(session)
         login_user(user)
         session['user_data'] = {
             'email': users_email,
@@ -63,11 +80,18 @@ def callback():
     
     return "User email not verified by Google.", 400
 
+if app.config['OAUTH_PROVIDER'] == 'stub':
+    @app.route("/login/stub_authorize")
+    def stub_authorize():
+        """Stand-in for Google's consent screen, only registered with OAUTH_PROVIDER=stub"""
+        return redirect(f"{request.args['redirect_uri']}?code=stub-code&state={request.args.get('state', '')}")
+
 @app.route("/logout")
 @login_required
 def logout():
     logout_user()
     session.clear()
+    app.session_interface.regenerate(session)
     return render_template('index.html', show_progress_bar=False, current_year=datetime.now().year)
 
 @app.route("/", methods=['GET'])
@@ -92,18 +116,51 @@ def upload_file():
         if uploaded_file and uploaded_file.filename.lower().endswith(app.config['ALLOWED_EXTENSIONS']):
             try:
                 doc_processor, rag_service = get_user_services(current_user.id)
-                split_docs = doc_processor.process_file(uploaded_file)
-                
-                if split_docs:
-                    collection_name = rag_service.create_rag_chain(split_docs)
-                    session[f'collection_name_{current_user.id}'] = collection_name
-                    session['current_step'] = 1
-                    return redirect(url_for('generate_questions'))
-                else:
-                    app.logger.error("Document processing returned None")
-                    flash('Error processing document: No content could be extracted')
+                # Optionally add the document to the current collection instead of starting a new one
+                current_collection = session.get(f'collection_name_{current_user.id}')
+                append_to = current_collection if request.form.get('append') == '1' else None
+                staged_path = doc_processor.stage_upload(uploaded_file)
+                if not staged_path:
+                    flash('Error processing document: Upload could not be saved')
                     return redirect(request.url)
+                filename = uploaded_file.filename
+                user_id = current_user.id
+
+                def ingest(progress):
+                    split_docs = doc_processor.process_staged_file(staged_path, filename, progress)
+                    if not split_docs:
+                        app.logger.error("Document processing returned None")
+                        raise ValueError('No content could be extracted')
+                    existing = set(rag_service.library.list_collections())
+                    if append_to:
+                        collection_name = rag_service.add_documents(append_to, split_docs, progress)
+                    else:
+                        collection_name = rag_service.create_rag_chain(split_docs, progress)
+                    rag_service.garbage_collect(keep=[collection_name, current_collection])
+                    # Make room: idle collections go cold, least recently used ones go past the quota
+                    try:
+                        rag_service.enforce_storage_quota(keep=[collection_name, current_collection])
+                    except StorageQuotaError:
+                        # A new set that can't fit is not kept
+                        if collection_name not in existing:
+                            rag_service.delete_collection(collection_name)
+                        raise
+                    schedule_question_bank(user_id, collection_name)
+                    return collection_name
+
+                job_id = ingest_queue.submit(current_user.id, filename, ingest)
+
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({'job_id': job_id, 'status_url': url_for('upload_status', job_id=job_id)}), 202
+                return render_template('upload.html',
+                                     job_id=job_id,
+                                     current_step=session.get('current_step', 0),
+                                     user=current_user,
+                                     show_progress_bar=True)
                 
+            except TooManyJobsError as e:
+                flash(str(e))
+                return redirect(request.url)
             except Exception as e:
                 app.logger.error(f"Error processing document: {str(e)}")
                 flash(f'Error processing document: {str(e)}')
@@ -113,10 +170,94 @@ def upload_file():
         return redirect(request.url)
     
     return render_template('upload.html', 
+                         has_collection=bool(session.get(f'collection_name_{current_user.id}')),
                          current_step=session.get('current_step', 0),
                          user=current_user,
                          show_progress_bar=True)
 
+def schedule_question_bank(user_id, collection_name, complexities=COMPLEXITY_INSTRUCTIONS, top_up=False):
+    """Build (after ingest) or top up (when running low) a user's question bank in the background"""
+    if not app.config['QUESTION_BANK_SIZE']:
+        return
+    _, bank_service = get_user_services(user_id, route='question_bank')
+    for complexity in complexities:
+        question_bank_filler.schedule(
+            (user_id, collection_name, complexity),
+            # Top-ups skip the response cache, which would only return questions already banked
+            lambda complexity=complexity: bank_service.fill_question_bank(
+                collection_name, complexity, app.config['QUESTION_BANK_SIZE'], use_cache=not top_up
+            )
+        )
+
+def take_banked_questions(rag_service, collection_name, question_count, complexity):
+    """Questions from the pre-generated bank ([] if it can't cover the request), topping it up when low"""
+    if not app.config['QUESTION_BANK_SIZE']:
+        return []
+    questions = rag_service.sample_question_bank(collection_name, question_count, complexity)
+    if rag_service.question_bank_low(collection_name, complexity, max(question_count, app.config['QUESTION_BANK_LOW_WATER'])):
+        schedule_question_bank(current_user.id, collection_name, [complexity], top_up=True)
+    return questions
+
+@app.route('/library', methods=['GET'])
+@login_required
+def library():
+    collection_name = session.get(f'collection_name_{current_user.id}')
+    if not collection_name:
+        flash('Please upload a document first')
+        return redirect(url_for('upload_file'))
+    
+    _, rag_service = get_user_services(current_user.id)
+    return render_template('library.html',
+                         documents=rag_service.list_documents(collection_name),
+                         current_step=session.get('current_step', 0),
+                         user=current_user,
+                         show_progress_bar=True)
+
+@app.route('/library/remove', methods=['POST'])
+@login_required
+def remove_document():
+    collection_name = session.get(f'collection_name_{current_user.id}')
+    if not collection_name:
+        flash('Please upload a document first')
+        return redirect(url_for('upload_file'))
+    
+    source_id = request.form.get('source_id', '')
+    _, rag_service = get_user_services(current_user.id)
+    if rag_service.remove_document(collection_name, source_id):
+        flash(f'Removed {source_id}')
+    else:
+        flash(f'{source_id} is not in the current document set')
+    
+    if not rag_service.list_documents(collection_name):
+        # Nothing left to quiz on
+        rag_service.delete_collection(collection_name)
+        session.pop(f'collection_name_{current_user.id}', None)
+        return redirect(url_for('upload_file'))
+    return redirect(url_for('library'))
+
+@app.route('/upload_status/<job_id>', methods=['GET'])
+@login_required
+def upload_status(job_id):
+    job = ingest_queue.get(job_id, current_user.id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    if job['status'] == 'done':
+        # Hand the finished collection over to the session the same way a synchronous upload did
+        session[f'collection_name_{current_user.id}'] = job['collection_name']
+        session['current_step'] = 1
+    
+    return jsonify({
+        'job_id': job['id'],
+        'filename': job['filename'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'stage_percent': job['stage_percent'],
+        'percent': job['percent'],
+        'error': job['error'],
+        'next_url': url_for('generate_questions') if job['status'] == 'done' else None
+    })
+
 @app.route('/generate_questions', methods=['GET', 'POST'])
 @login_required
 def generate_questions():
@@ -130,53 +271,115 @@ def generate_questions():
     if request.method == 'POST':
         question_count = int(request.form.get('question_count', 5))
         complexity = request.form.get('complexity', 'Easy')
+        regenerate = request.form.get('regenerate') == '1'
         
         _, rag_service = get_user_services(current_user.id)
-        questions = rag_service.generate_questions(
-            collection_name,
-            question_count,
-            complexity
-        )
+        if app.config['QUESTION_GENERATION_MODE'] == 'diverse':
+            generate = rag_service.generate_diverse_questions
+        else:
+            generate = rag_service.generate_questions
+        questions = take_banked_questions(rag_service, collection_name, question_count, complexity)
+        if not questions:
+            try:
+                questions = generate(
+                    collection_name,
+                    question_count,
+                    complexity,
+                    use_cache=not regenerate
+                )
+            except QuotaExceededError as e:
+                flash(str(e))
+                return redirect(url_for('generate_questions'))
         
+        quiz_id = quiz_store.create(current_user.id, collection_name, questions, complexity)
         session['current_step'] = 2
         return render_template('questions.html',
                              questions=questions,
+                             quiz_id=quiz_id,
                              current_step=session['current_step'],
                              user=current_user,
                              show_progress_bar=True)
     
     return render_template('generate_questions.html',
+                         regenerate=request.args.get('regenerate') == '1',
                          current_step=session['current_step'],
                          user=current_user,
                          show_progress_bar=True)
 
-@app.route('/submit_answers', methods=['POST'])
+def sse_event(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/generate_questions/stream', methods=['GET'])
 @login_required
-def submit_answers():
+def stream_questions():
+    """Stream questions over SSE as soon as each one is complete"""
     collection_name = session.get(f'collection_name_{current_user.id}')
     if not collection_name:
-        flash('Please upload a document first')
-        return redirect(url_for('upload_file'))
+        return jsonify({'error': 'Please upload a document first'}), 400
+    
+    question_count = int(request.args.get('question_count', 5))
+    complexity = request.args.get('complexity', 'Easy')
+    regenerate = request.args.get('regenerate') == '1'
+    
+    _, rag_service = get_user_services(current_user.id)
+    session['current_step'] = 2
+    quiz_id = quiz_store.new_id()
+    user_id = current_user.id
+    banked = take_banked_questions(rag_service, collection_name, question_count, complexity)
+    
+    def events():
+        try:
+            yield sse_event('quiz', {'quiz_id': quiz_id})
+            if banked:
+                generated = iter(banked)
+            elif app.config['QUESTION_GENERATION_MODE'] == 'diverse':
+                # Each cluster's questions are sent as soon as that cluster's call finishes
+                generated = rag_service.iter_diverse_questions(collection_name, question_count, complexity, use_cache=not regenerate)
+            else:
+                generated = rag_service.stream_questions(collection_name, question_count, complexity, use_cache=not regenerate)
+            questions = []
+            for number, question in enumerate(generated, 1):
+                questions.append(question)
+                # Saved as we go so the questions already shown can be answered even if the stream breaks
+                quiz_store.save(quiz_id, user_id, collection_name, questions, complexity)
+                yield sse_event('question', {'number': number, 'question': question})
+            yield sse_event('done', {})
+        except Exception as e:
+            app.logger.error(f"Error streaming questions: {str(e)}")
+            yield sse_event('error', {'message': str(e)})
+    
+    return sse_response(events())
+
+@app.route('/submit_answers', methods=['POST'])
+@login_required
+def submit_answers():
+    quiz = quiz_store.get(request.form.get('quiz_id'), current_user.id)
+    if quiz is None:
+        flash('These questions have expired, please generate a new set')
+        return redirect(url_for('generate_questions'))
     
     session['current_step'] = 3
     
-    questions = request.form.getlist('questions')
-    answers = request.form.getlist('answers')
+    questions = quiz['questions']
+    answers = request.form.getlist('answers')[:len(questions)]
     
     _, rag_service = get_user_services(current_user.id)
-    validations = []
-    for i, (question, answer) in enumerate(zip(questions, answers), 1):
-        validation_text = rag_service.validate_answer(
-            collection_name,
-            question,
-            answer
+    try:
+        validations = rag_service.validate_answers(
+            quiz['collection_name'],
+            list(zip(questions, answers))
         )
-        
-        validations.append({
-            'number': str(i),
-            'question': question,
-            'validation': validation_text
-        })
+    except QuotaExceededError as e:
+        flash(str(e))
+        return redirect(url_for('generate_questions'))
     
     return render_template('results.html',
                          questions=questions,
@@ -187,6 +390,83 @@ def submit_answers():
                          zip=zip,
                          show_progress_bar=True)
 
+@app.route('/submit_answers/stream', methods=['POST'])
+@login_required
+def stream_answers():
+    """Stream each validation result over SSE as soon as its batch is graded"""
+    quiz = quiz_store.get(request.form.get('quiz_id'), current_user.id)
+    if quiz is None:
+        return jsonify({'error': 'These questions have expired, please generate a new set'}), 400
+    
+    session['current_step'] = 3
+    
+    questions = quiz['questions']
+    answers = request.form.getlist('answers')[:len(questions)]
+    
+    _, rag_service = get_user_services(current_user.id)
+    
+    def events():
+        try:
+            for validation in rag_service.iter_validations(quiz['collection_name'], list(zip(questions, answers))):
+                validation['answer'] = answers[int(validation['number']) - 1]
+                yield sse_event('validation', validation)
+            yield sse_event('done', {})
+        except Exception as e:
+            app.logger.error(f"Error streaming validations: {str(e)}")
+            yield sse_event('error', {'message': str(e)})
+    
+    return sse_response(events())
+
+@app.route('/metrics', methods=['GET'])
+@admin_required
+def metrics():
+    """Expose cache counters so we can confirm models aren't reloaded under load"""
+    return jsonify({
+        'model_registry': registry.get_stats(),
+        'response_cache': response_cache.get_stats() if response_cache is not None else None,
+        'login': oauth_provider.timings.get_stats(),
+        'llm_usage': llm_usage.get_stats(),
+        'llm_scheduler': llm_scheduler.get_stats(),
+        'blocking_executor': blocking_executor.get_stats(),
+        'question_bank': question_bank_filler.get_stats(),
+        'answer_screening': answer_screener.get_stats(),
+        'startup': startup.get_report(),
+        'tracing': tracer.get_stats(),
+    })
+
+@app.route('/metrics/storage', methods=['GET'])
+@admin_required
+def user_storage():
+    """A user's vector storage by tier, quota and bytes reclaimed by archiving, compaction and quota deletes (?user_id=, default the caller)"""
+    user_id = request.args.get('user_id', current_user.id)
+    # Only existing users' directories; the id becomes a path, and listdir never yields '.' or '..'
+    storage_root = app.config['BASE_STORAGE_DIR']
+    if user_id != current_user.id and (user_id not in os.listdir(storage_root) or
+                                       not os.path.isdir(os.path.join(storage_root, user_id))):
+        return jsonify({'error': 'Unknown user'}), 404
+    _, rag_service = get_user_services(user_id)
+    return jsonify(rag_service.storage_report())
+
+@app.route('/metrics/profiles', methods=['GET'])
+@admin_required
+def slow_request_profiles():
+    """Sampled stacks of recent slow requests; ?index=N&format=folded returns one as flamegraph.pl input"""
+    if tracer.profiler is None:
+        return jsonify({'error': 'Profiling is off, set PROFILE_SLOW_REQUESTS_MS to enable it'}), 404
+    profiles = tracer.profiler.get_profiles()
+    if request.args.get('format') == 'folded':
+        index = request.args.get('index', len(profiles) - 1, type=int)
+        if not -len(profiles) <= index < len(profiles):
+            return jsonify({'error': 'Unknown profile'}), 404
+        return Response(profiles[index]['folded'] + '\n', mimetype='text/plain')
+    return jsonify([{key: value for key, value in profile.items() if key != 'folded'} for profile in profiles])
+
+@app.route('/metrics/me', methods=['GET'])
+@login_required
+def my_usage():
+    """The current user's LLM token usage and remaining daily quota"""
+    return jsonify(llm_usage.get_user_stats(current_user.id))
+
 @app.context_processor
 def utility_processor():
     """Add current_step to all templates by default"""
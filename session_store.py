@@ -0,0 +1,224 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+class MemoryStore:
+    """In-process key/value store with the same get/set/delete/expire calls as a Redis client.
+
+    Stand-in for Redis in tests and single-process dev servers; nothing survives a restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}  # key -> (value, expires_at)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def expire(self, key, seconds):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False
+            self._data[key] = (entry[0], time.time() + seconds)
+            return True
+
+class SQLiteStore:
+    """Key/value store in a local SQLite file, Redis-compatible for get/set(ex=)/delete/expire.
+
+    Expired rows are ignored on read and purged at most once a minute on write.
+    """
+
+    def __init__(self, path, purge_interval=60):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ex if ex else None)
+            )
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        return True
+
+    def delete(self, key):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount
+
+    def expire(self, key, seconds):
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ?", (time.time() + seconds, key)
+            ).rowcount > 0
+
+def create_store(backend, path=None, url=None):
+    """Build the configured store: 'sqlite' (default), 'memory' or 'redis' (needs the redis package)."""
+    if backend == 'memory':
+        return MemoryStore()
+    if backend == 'redis':
+        import redis
+        return redis.Redis.from_url(url)
+    return SQLiteStore(path)
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session kept in a key/value store; the cookie only carries a random session id.
+
+    Data is serialized with the same tagged JSON Flask uses for cookie
+    sessions, so flashes and flask_login state round-trip unchanged.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl_seconds, key_prefix='session:'):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(self.key_prefix + sid)
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data.decode('utf-8')), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def regenerate(self, session):
+        """Move the session to a fresh id and drop the old one's data; call on login and logout.
+
+        Otherwise an id planted in a browser before login would stay valid for
+        the authenticated session (session fixation).
+        """
+        self.store.delete(self.key_prefix + session.sid)
+        session.sid = secrets.token_urlsafe(32)
+        session.new = True
+        session.modified = True
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+        if session.modified or session.new:
+            self.store.set(self.key_prefix + session.sid, self.serializer.dumps(dict(session)), ex=self.ttl_seconds)
+        else:
+            self.store.expire(self.key_prefix + session.sid, self.ttl_seconds)
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+class QuizStore:
+    """Generated question sets kept server-side under a quiz id.
+
+    The answer form only posts the quiz id and the answers; the questions and
+    the collection they came from are looked up here. Quizzes expire after
+    ttl_seconds and can only be read back by the user who generated them.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl_seconds, key_prefix='quiz:'):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(16)
+
+    def save(self, quiz_id, user_id, collection_name, questions, complexity=None):
+        quiz = {
+            'user_id': str(user_id),
+            'collection_name': collection_name,
+            'complexity': complexity,
+            'questions': list(questions),
+        }
+        self.store.set(self.key_prefix + quiz_id, self.serializer.dumps(quiz), ex=self.ttl_seconds)
+        return quiz_id
+
+    def create(self, user_id, collection_name, questions, complexity=None):
+        return self.save(self.new_id(), user_id, collection_name, questions, complexity)
+
+    def get(self, quiz_id, user_id):
+        """Return the quiz dict, or None if it expired, never existed or belongs to someone else."""
+        if not quiz_id:
+            return None
+        data = self.store.get(self.key_prefix + quiz_id)
+        if data is None:
+            return None
+        quiz = self.serializer.loads(data.decode('utf-8'))
+        return quiz if quiz['user_id'] == str(user_id) else None
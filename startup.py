@@ -0,0 +1,70 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+def process_uptime():
+    """Seconds since this process started (since the fork, for pre-forked workers); None off Linux."""
+    try:
+        with open('/proc/self/stat') as stat:
+            start_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as uptime:
+            return round(float(uptime.read().split()[0]) - start_ticks / os.sysconf('SC_CLK_TCK'), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupReport:
+    """Cold-start timings for one process: deferred imports, warm-up and each endpoint's first request.
+
+    Heavy modules are imported through load() the first time the ingest or
+    RAG paths need them, so their cost shows up here instead of delaying
+    every worker before it can serve / or /login.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._imports = {}
+        self._phases = {}
+        self._first_requests = {}
+        self._ready_at = None
+
+    def load(self, module_name):
+        """Import a module on first use and record how long the import took."""
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        with self._lock:
+            self._imports.setdefault(module_name, round((time.perf_counter() - start) * 1000, 1))
+        return module
+
+    def record_phase(self, name, seconds):
+        with self._lock:
+            self._phases[name] = round(seconds * 1000, 1)
+
+    def mark_ready(self):
+        """Call once the app module has finished importing."""
+        with self._lock:
+            self._ready_at = process_uptime()
+
+    def record_request(self, endpoint, seconds):
+        """Keep the latency of the first request each endpoint served in this process."""
+        with self._lock:
+            if endpoint not in self._first_requests:
+                self._first_requests[endpoint] = {
+                    'latency_ms': round(seconds * 1000, 1),
+                    'at_uptime_s': process_uptime(),
+                }
+
+    def get_report(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'ready_at_uptime_s': self._ready_at,
+                'uptime_s': process_uptime(),
+                'imports_ms': dict(self._imports),
+                'phases_ms': dict(self._phases),
+                'first_requests': {endpoint: dict(timing) for endpoint, timing in self._first_requests.items()},
+            }
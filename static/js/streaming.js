@@ -0,0 +1,160 @@
+// Stream questions and grading results over server-sent events.
+// Without EventSource/fetch streaming support the forms simply post as before.
+
+function createQuestionCard(number, question) {
+    const card = document.createElement('div');
+    card.className = 'card mb-4';
+    card.innerHTML = `
+        <div class="card-body p-4">
+            <h5 class="card-title mb-3">
+                <i class="fas fa-question-circle me-2 text-primary"></i>
+                Question ${number}
+            </h5>
+            <p class="card-text mb-4"></p>
+            <textarea name="answers" class="form-control" rows="3" placeholder="Type your answer here..." required></textarea>
+        </div>`;
+    card.querySelector('.card-text').textContent = question;
+    return card;
+}
+
+function createResultCard(validation) {
+    const correct = validation.validation.toLowerCase().includes('verdict: correct');
+    const card = document.createElement('div');
+    card.className = 'card mb-4 ' + (correct ? 'bg-success-subtle' : 'bg-danger-subtle');
+    card.innerHTML = `
+        <div class="card-header border-0 py-3">
+            <div class="d-flex align-items-center">
+                <i class="fas fa-${correct ? 'check' : 'times'}-circle me-3 text-${correct ? 'success' : 'danger'} fs-4"></i>
+                <div>
+                    <h5 class="mb-1">Question ${validation.number}</h5>
+                    <p class="mb-0 result-question"></p>
+                </div>
+            </div>
+        </div>
+        <div class="card-body p-4">
+            <div class="mb-4">
+                <h6 class="text-muted mb-2">Your Answer:</h6>
+                <p class="mb-0 result-answer"></p>
+            </div>
+            <div>
+                <h6 class="text-muted mb-2">Feedback:</h6>
+                <p class="mb-0 validation-text"></p>
+            </div>
+        </div>`;
+    card.dataset.number = validation.number;
+    card.querySelector('.result-question').textContent = validation.question;
+    card.querySelector('.result-answer').textContent = validation.answer;
+    card.querySelector('.validation-text').textContent = validation.validation;
+    return card;
+}
+
+// Parse "event: x\ndata: {...}\n\n" blocks out of a fetch response body
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const blocks = buffer.split('\n\n');
+        buffer = blocks.pop();
+        blocks.forEach(block => {
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            onEvent(event, data ? JSON.parse(data) : {});
+        });
+    }
+}
+
+function streamQuestions(generateForm) {
+    const answersForm = document.getElementById('answers-form');
+    const container = document.getElementById('streamed-questions');
+    const status = document.getElementById('stream-status');
+    const params = new URLSearchParams(new FormData(generateForm));
+    const source = new EventSource(generateForm.dataset.streamUrl + '?' + params.toString());
+    let received = 0;
+
+    document.getElementById('generate-card').classList.add('d-none');
+    answersForm.classList.remove('d-none');
+    if (typeof updateProgressSteps === 'function') updateProgressSteps(2);
+
+    source.addEventListener('quiz', event => {
+        // Questions stay on the server; the answers form only posts this id
+        document.getElementById('quiz-id').value = JSON.parse(event.data).quiz_id;
+    });
+    source.addEventListener('question', event => {
+        const data = JSON.parse(event.data);
+        container.appendChild(createQuestionCard(data.number, data.question));
+        received += 1;
+    });
+    source.addEventListener('done', () => {
+        source.close();
+        status.classList.add('d-none');
+        document.getElementById('submit-answers').classList.remove('d-none');
+    });
+    source.addEventListener('error', () => {
+        source.close();
+        if (received === 0) {
+            // Nothing arrived, fall back to the regular form post
+            generateForm.submit();
+        } else {
+            status.classList.add('d-none');
+            document.getElementById('submit-answers').classList.remove('d-none');
+        }
+    });
+}
+
+async function streamAnswers(answersForm) {
+    const results = document.getElementById('stream-results');
+    const cards = [];
+    try {
+        const response = await fetch(answersForm.dataset.streamUrl, {
+            method: 'POST',
+            body: new FormData(answersForm)
+        });
+        if (!response.ok) throw new Error(response.statusText);
+
+        answersForm.classList.add('d-none');
+        if (typeof updateProgressSteps === 'function') updateProgressSteps(3);
+        await readEventStream(response, (event, data) => {
+            if (event === 'validation') {
+                const card = createResultCard(data);
+                // Keep cards in question order even though batches finish out of order
+                const next = Array.from(results.children)
+                    .find(existing => Number(existing.dataset.number) > Number(data.number));
+                results.insertBefore(card, next || null);
+                cards.push(card);
+            } else if (event === 'error') {
+                throw new Error(data.message);
+            }
+        });
+    } catch (error) {
+        if (cards.length === 0) {
+            answersForm.classList.remove('d-none');
+            answersForm.submit();
+        }
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const generateForm = document.getElementById('generate-form');
+    if (generateForm && window.EventSource) {
+        generateForm.addEventListener('submit', event => {
+            event.preventDefault();
+            streamQuestions(generateForm);
+        });
+    }
+
+    const answersForm = document.getElementById('answers-form');
+    if (answersForm && window.fetch && window.ReadableStream) {
+        answersForm.addEventListener('submit', event => {
+            event.preventDefault();
+            streamAnswers(answersForm);
+        });
+    }
+});
@@ -0,0 +1,39 @@
+// Poll the background ingestion job and move on once the document is ready
+const STAGE_LABELS = {
+    extract: 'Extracting text',
+    split: 'Splitting into chunks',
+    embed: 'Creating embeddings',
+    persist: 'Saving'
+};
+
+function pollIngestStatus(statusUrl) {
+    fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(job => {
+            const bar = document.getElementById('ingest-progress');
+            const stage = document.getElementById('ingest-stage');
+
+            bar.style.width = job.percent + '%';
+            bar.setAttribute('aria-valuenow', job.percent);
+            bar.textContent = job.percent + '%';
+
+            if (job.status === 'done') {
+                window.location.href = job.next_url;
+            } else if (job.status === 'failed' || job.error) {
+                stage.textContent = 'Error processing document: ' + (job.error || 'Unknown job');
+                bar.classList.remove('progress-bar-animated');
+                bar.classList.add('bg-danger');
+            } else {
+                stage.textContent = job.stage ? STAGE_LABELS[job.stage] + '...' : 'Queued...';
+                setTimeout(() => pollIngestStatus(statusUrl), 1000);
+            }
+        })
+        .catch(() => setTimeout(() => pollIngestStatus(statusUrl), 3000));
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const status = document.getElementById('ingest-status');
+    if (status) {
+        pollIngestStatus(status.dataset.statusUrl);
+    }
+});
@@ -0,0 +1,95 @@
+import asyncio
+
+from llm_scheduler import LLMScheduler
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=5))
+
+def test_free_slots_go_round_robin_across_users():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+
+    def call(label):
+        async def func():
+            order.append(label)
+        return func
+
+    async def scenario():
+        holding = asyncio.create_task(scheduler.arun('alice', blocker))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(scheduler.arun(user, call(label)))
+            for user, label in [('alice', 'a1'), ('alice', 'a2'), ('alice', 'a3'), ('bob', 'b1')]
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.get_stats()['queue_depth'] == 4
+        release.set()
+        await asyncio.gather(holding, *waiting)
+
+    run(scenario())
+    # Bob's one call doesn't wait behind all of Alice's queued ones
+    assert order == ['a1', 'b1', 'a2', 'a3']
+    assert scheduler.get_stats()['active'] == 0
+
+def test_cancelling_a_queued_call_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1)
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+
+    async def answer():
+        return 'done'
+
+    async def scenario():
+        holding = asyncio.create_task(scheduler.arun('alice', blocker))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(scheduler.arun('bob', answer))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert scheduler.get_stats()['queue_depth'] == 0
+        release.set()
+        await holding
+        return await scheduler.arun('carol', answer)
+
+    assert run(scenario()) == 'done'
+    assert scheduler.get_stats()['active'] == 0
+
+def test_cancelling_a_running_call_releases_its_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def hang():
+        await asyncio.Event().wait()
+
+    async def answer():
+        return 'done'
+
+    async def scenario():
+        running = asyncio.create_task(scheduler.arun('alice', hang))
+        await asyncio.sleep(0.01)
+        assert scheduler.get_stats()['active'] == 1
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        return await scheduler.arun('bob', answer)
+
+    assert run(scenario()) == 'done'
+    assert scheduler.get_stats()['active'] == 0
+
+def test_threaded_and_async_callers_share_the_slots():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def scenario():
+        threaded = asyncio.to_thread(scheduler.run, 'alice', lambda: 'thread')
+
+        async def answer():
+            return 'coroutine'
+
+        return await asyncio.gather(threaded, scheduler.arun('bob', answer))
+
+    assert run(scenario()) == ['thread', 'coroutine']
+    assert scheduler.get_stats()['calls'] == 2
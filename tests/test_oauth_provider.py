@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from oauth_provider import GoogleProvider, StubProvider
+
+DISCOVERY = {
+    'authorization_endpoint': 'https://accounts.example.com/auth',
+    'token_endpoint': 'https://accounts.example.com/token',
+    'userinfo_endpoint': 'https://accounts.example.com/userinfo',
+}
+
+class FakeResponse:
+    def __init__(self, payload, headers=None):
+        self.payload = payload
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeSession:
+    """Serves the discovery document in place of requests.Session, counting fetches."""
+
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        self.fetches = 0
+        self.fail = False
+        self.fetched = threading.Event()
+
+    def get(self, url, timeout=None):
+        self.fetches += 1
+        self.fetched.set()
+        if self.fail:
+            raise requests.ConnectionError('discovery is down')
+        return FakeResponse(dict(DISCOVERY, fetch=self.fetches), self.headers)
+
+def make_provider(headers=None, **options):
+    provider = GoogleProvider('https://accounts.example.com/.well-known/openid-configuration', 'id', 'secret', **options)
+    provider.session = FakeSession(headers)
+    return provider
+
+def age(provider, seconds):
+    provider._fetched_at -= seconds
+
+def test_discovery_is_cached_for_the_max_age_it_sends():
+    provider = make_provider({'Cache-Control': 'public, max-age=600'})
+    assert provider.get_config()['fetch'] == 1
+    assert provider.get_config()['fetch'] == 1
+    assert provider.session.fetches == 1
+    assert provider._ttl == 600
+    assert provider.timings.get_stats()['discovery']['count'] == 1
+
+def test_discovery_is_refreshed_in_the_background_before_it_expires():
+    provider = make_provider({'Cache-Control': 'max-age=100'}, refresh_fraction=0.8)
+    provider.get_config()
+    provider.session.fetched.clear()
+    age(provider, 90)
+
+    # The caller gets the cached copy at once while a refresh runs behind it
+    assert provider.get_config()['fetch'] == 1
+    assert provider.session.fetched.wait(timeout=5)
+    for _ in range(100):
+        if not provider._refreshing:
+            break
+        time.sleep(0.01)
+    assert provider.get_config()['fetch'] == 2
+
+def test_stale_discovery_is_served_when_a_refresh_fails():
+    provider = make_provider(default_ttl=100)
+    provider.get_config()
+    provider.session.fail = True
+    age(provider, 200)
+
+    assert provider.get_config()['fetch'] == 1
+
+def test_first_discovery_failure_is_raised():
+    provider = make_provider()
+    provider.session.fail = True
+    with pytest.raises(requests.ConnectionError):
+        provider.get_config()
+
+def test_stub_provider_points_the_login_flow_at_the_app():
+    provider = StubProvider(base_url='http://localhost:5000/')
+    config = provider.get_config()
+    assert config['authorization_endpoint'] == 'http://localhost:5000/login/stub_authorize'
+    assert config['token_endpoint'] == 'http://localhost:5000/login/stub_token'
+    assert config['userinfo_endpoint'] == 'http://localhost:5000/login/stub_userinfo'
+
+    token = provider.fetch_token(config['token_endpoint'], {}, 'code=stub-code')
+    assert token['access_token'] == 'stub-token'
+    userinfo = provider.fetch_userinfo(config['userinfo_endpoint'], {}, None)
+    assert userinfo['email_verified'] and userinfo['email'] == 'student@example.com'
+    assert set(provider.timings.get_stats()) == {'token', 'userinfo'}
+
+def test_stub_provider_returns_a_copy_of_its_userinfo():
+    provider = StubProvider(userinfo={'sub': '1', 'email': 'a@example.com', 'email_verified': True, 'given_name': 'A'})
+    provider.fetch_userinfo('/login/stub_userinfo', {}, None)['email'] = 'changed@example.com'
+    assert provider.fetch_userinfo('/login/stub_userinfo', {}, None)['email'] == 'a@example.com'
@@ -0,0 +1,72 @@
+from flask import Flask, session
+
+from session_store import MemoryStore, ServerSideSessionInterface
+
+def make_app(store):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSideSessionInterface(store, ttl_seconds=3600)
+
+    @app.route('/visit')
+    def visit():
+        session['visited'] = True
+        return ''
+
+    @app.route('/login')
+    def login():
+        # What the OAuth callback does before login_user
+        app.session_interface.regenerate(session)
+        session['user_id'] = 'student'
+        return ''
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        app.session_interface.regenerate(session)
+        return ''
+
+    @app.route('/whoami')
+    def whoami():
+        return session.get('user_id', '')
+
+    return app
+
+def session_id(client):
+    return client.get_cookie('session').value
+
+def test_login_moves_the_session_to_a_new_id():
+    store = MemoryStore()
+    client = make_app(store).test_client()
+    client.get('/visit')
+    planted = session_id(client)
+
+    client.get('/login')
+    fresh = session_id(client)
+
+    assert fresh != planted
+    assert store.get('session:' + planted) is None
+    assert store.get('session:' + fresh) is not None
+    assert client.get('/whoami').get_data(as_text=True) == 'student'
+
+def test_a_planted_session_id_is_not_logged_in():
+    store = MemoryStore()
+    app = make_app(store)
+    victim = app.test_client()
+    victim.get('/visit')
+    planted = session_id(victim)
+    victim.get('/login')
+
+    attacker = app.test_client()
+    attacker.set_cookie('session', planted)
+    assert attacker.get('/whoami').get_data(as_text=True) == ''
+
+def test_logout_drops_the_logged_in_session():
+    store = MemoryStore()
+    client = make_app(store).test_client()
+    client.get('/login')
+    logged_in = session_id(client)
+
+    client.get('/logout')
+
+    assert store.get('session:' + logged_in) is None
+    assert client.get('/whoami').get_data(as_text=True) == ''
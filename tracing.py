@@ -0,0 +1,211 @@
+import functools
+import math
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+def percentile(values, pct, digits=1):
+    """Nearest-rank percentile of raw samples (e.g. a deque of recent latencies), or None without any."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], digits)
+
+class Histogram:
+    """Latency histogram with log-spaced buckets (about 9% wide), so memory is fixed however many samples arrive.
+
+    Percentiles are read from the bucket bounds, accurate to one bucket.
+    """
+
+    GROWTH = 1.09
+    MIN_MS = 0.01
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        index = 0 if ms <= self.MIN_MS else int(math.log(ms / self.MIN_MS, self.GROWTH)) + 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank = self.count * pct / 100
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return round(min(self.max_ms, self.MIN_MS * self.GROWTH ** index), 2)
+        return round(self.max_ms, 2)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 2),
+        }
+
+class SamplingProfiler:
+    """Samples the stacks of registered request threads from one background thread.
+
+    Each request's samples are kept as folded stacks ("outer;inner count"
+    lines, the input format of flamegraph.pl and speedscope); only requests
+    slower than threshold_ms are kept, in a ring of the last max_profiles.
+    """
+
+    def __init__(self, threshold_ms, interval=0.005, max_profiles=20):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._profiles = deque(maxlen=max_profiles)
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        with self._lock:
+            self._ensure_thread()
+            self._active[threading.get_ident()] = Counter()
+
+    def stop(self, name, seconds):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples is None or seconds * 1000 < self.threshold_ms:
+            return
+        with self._lock:
+            self._profiles.append({
+                'name': name,
+                'duration_ms': round(seconds * 1000, 1),
+                'captured_at': time.time(),
+                'samples': sum(samples.values()),
+                'folded': '\n'.join(f"{stack} {count}" for stack, count in samples.most_common()),
+            })
+
+    def get_profiles(self):
+        with self._lock:
+            return list(self._profiles)
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    """Process-wide spans feeding per-name latency histograms.
+
+    Routes get a span per endpoint ('route.<endpoint>') and the pipeline
+    stages get their own (extract, split, embed, chroma_add, chroma_query,
+    prompt_build, llm_call, ...). Spans nest, so a stage's time is also
+    inside its route's. When disabled, span() returns a shared no-op context
+    manager and nothing is recorded.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def configure(self, enabled=True, profile_threshold_ms=None, profile_interval=0.005):
+        """Turn spans on, and the sampling profiler too when a slow-request threshold is given."""
+        self.enabled = enabled
+        self.profiler = SamplingProfiler(profile_threshold_ms, profile_interval) if enabled and profile_threshold_ms else None
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.record(seconds * 1000)
+
+    @contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def span(self, name):
+        if not self.enabled:
+            return NOOP_SPAN
+        return self._span(name)
+
+    def traced(self, name):
+        """Decorator form of span()."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def timed_iter(self, name, iterable):
+        """Yield from iterable, recording the total time spent producing items as one span.
+
+        For lazy loaders whose work is interleaved with the consumer's, where
+        a span around the loop would count both.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self.record(name, seconds)
+
+    def get_stats(self):
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+tracer = Tracer()
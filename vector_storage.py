@@ -0,0 +1,353 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from diversity import normalize_rows
+
+DTYPES = {'float16': np.float16, 'int8': np.int8}
+SEARCH_BLOCK_ROWS = 8192  # rows dequantized at a time while scoring, bounds the float32 scratch space
+INT8_HEADROOM = 1.25  # room left above the first batch's largest component before the file has to be requantized
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed while walking
+    return total
+
+def quantize(vectors, dtype, scale=None):
+    """Quantize normalized vectors; int8 shares one symmetric scale per collection. Returns (array, scale)."""
+    if dtype == 'float16':
+        return vectors.astype(np.float16), 1.0
+    if scale is None:
+        scale = max(float(np.max(np.abs(vectors))) * INT8_HEADROOM / 127, 1e-8) if vectors.size else 1 / 127
+    return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8), scale
+
+def dequantize(vectors, scale):
+    return np.asarray(vectors, dtype=np.float32) * np.float32(scale)
+
+def write_archive(path, ids, vectors, texts, metadatas, attachments=None):
+    """Write one collection to a compressed cold-tier file: int8 vectors, chunk text and metadata.
+
+    attachments maps member names to files stored alongside (e.g. the BM25 index).
+    """
+    quantized, scale = quantize(normalize_rows(vectors), 'int8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        buffer = io.BytesIO()
+        np.save(buffer, quantized)
+        archive.writestr('vectors.npy', buffer.getvalue())
+        archive.writestr('meta.json', json.dumps({'scale': scale, 'count': len(ids)}))
+        with archive.open('chunks.jsonl', 'w') as chunks:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                chunks.write((json.dumps({'id': doc_id, 'text': text, 'metadata': metadata or {}}) + "\n").encode('utf-8'))
+        for name, source_path in (attachments or {}).items():
+            if os.path.exists(source_path):
+                archive.write(source_path, f"attachments/{name}")
+    os.replace(temp_path, path)
+
+def read_archive(path):
+    """Read a file written by write_archive; returns (ids, float32 vectors, texts, metadatas, {attachment: bytes})."""
+    with zipfile.ZipFile(path) as archive:
+        scale = json.loads(archive.read('meta.json'))['scale']
+        vectors = dequantize(np.load(io.BytesIO(archive.read('vectors.npy'))), scale)
+        ids, texts, metadatas = [], [], []
+        with archive.open('chunks.jsonl') as chunks:
+            for line in chunks:
+                chunk = json.loads(line)
+                ids.append(chunk['id'])
+                texts.append(chunk['text'])
+                metadatas.append(chunk['metadata'])
+        attachments = {
+            name[len('attachments/'):]: archive.read(name)
+            for name in archive.namelist() if name.startswith('attachments/')
+        }
+    return ids, vectors, texts, metadatas, attachments
+
+class QuantizedVectorStore(VectorStore):
+    """One collection as a flat file of float16 or int8 vectors, memory-mapped for search.
+
+    Vectors are normalized on the way in, so a dot product is their cosine
+    similarity. int8 rows share one per-collection scale factor; a batch that
+    doesn't fit it widens the scale and rewrites the file. Chunk text and
+    metadata live in SQLite beside the vectors, and index.json maps rows to
+    ids. Deleting only blanks rows in index.json; compact() (or enough
+    deletes) rewrites the file without them.
+    """
+
+    CACHE_SIZE = 64  # open collections kept mapped per process
+    _cache = OrderedDict()  # directory -> (index.json stat, state)
+    _cache_lock = threading.Lock()
+    _write_locks = {}
+
+    def __init__(self, directory, embedding_function=None, dtype='int8'):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {', '.join(DTYPES)}")
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.dtype = dtype  # for new collections; an existing one keeps the dtype it was written with
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=None, dtype='int8', **kwargs):
+        store = cls(directory, embedding, dtype)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    @contextmanager
+    def _connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.directory, 'chunks.sqlite3'), timeout=30)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _writing(self):
+        with self._cache_lock:
+            lock = self._write_locks.setdefault(self.directory, threading.Lock())
+        with lock:
+            yield
+
+    def _state(self):
+        """index.json plus the memory-mapped vectors, reused while index.json hasn't changed."""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._cache_lock:
+            cached = self._cache.get(self.directory)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(self.directory)
+                return cached[1]
+
+        with open(self.index_path, encoding='utf-8') as index_file:
+            index = json.load(index_file)
+        vectors = None
+        if index['ids']:
+            try:
+                vectors = np.memmap(
+                    os.path.join(self.directory, index['file']), dtype=DTYPES[index['dtype']], mode='r',
+                    shape=(len(index['ids']), index['dim'])
+                )
+            except FileNotFoundError:
+                # A rewrite replaced index.json and removed this file since we read it
+                return self._state()
+        state = dict(
+            index, vectors=vectors,
+            rows={doc_id: row for row, doc_id in enumerate(index['ids']) if doc_id is not None},
+            live=np.array([doc_id is not None for doc_id in index['ids']], dtype=bool)
+        )
+        with self._cache_lock:
+            self._cache[self.directory] = (version, state)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return state
+
+    def _write_index(self, index):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as index_file:
+            json.dump({key: index[key] for key in ('dtype', 'dim', 'scale', 'file', 'ids')}, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def _rewrite(self, state, new_vectors=None, new_ids=(), scale=None):
+        """Write live rows (plus any new ones) to a fresh file, requantized to `scale`; drops deleted rows."""
+        dtype = state['dtype']
+        if scale is None:
+            scale = state['scale']
+        file_name = f"vectors-{uuid.uuid4().hex[:12]}.bin"
+        ids = []
+        with open(os.path.join(self.directory, file_name), 'wb') as vector_file:
+            live_rows = np.flatnonzero(state['live']) if state['vectors'] is not None else []
+            for start in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+                rows = live_rows[start:start + SEARCH_BLOCK_ROWS]
+                block = dequantize(state['vectors'][rows], state['scale'])
+                vector_file.write(quantize(block, dtype, scale)[0].tobytes())
+                ids.extend(state['ids'][row] for row in rows)
+            if new_vectors is not None:
+                vector_file.write(quantize(new_vectors, dtype, scale)[0].tobytes())
+                ids.extend(new_ids)
+        self._write_index({**state, 'scale': scale, 'file': file_name, 'ids': ids})
+        if state['file'] and state['file'] != file_name:
+            # Readers that still map the old file keep their pages until they reopen
+            os.remove(os.path.join(self.directory, state['file']))
+
+    def add_embeddings(self, ids, vectors, texts, metadatas=None):
+        """Store precomputed vectors with their text; ids already present are replaced."""
+        ids = list(ids)
+        if not ids:
+            return []
+        vectors = normalize_rows(vectors)
+        metadatas = metadatas or [{} for _ in ids]
+        with self._writing():
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                    [(doc_id, text, json.dumps(metadata or {})) for doc_id, text, metadata in zip(ids, texts, metadatas)]
+                )
+            state = self._state()
+            if state is None:
+                state = {'dtype': self.dtype, 'dim': vectors.shape[1], 'scale': None, 'file': None, 'ids': [],
+                         'vectors': None, 'live': np.zeros(0, dtype=bool)}
+            replaced = set(ids)
+            if any(doc_id in replaced for doc_id in state['ids']):
+                state = dict(state, ids=[None if doc_id in replaced else doc_id for doc_id in state['ids']])
+                state['live'] = np.array([doc_id is not None for doc_id in state['ids']], dtype=bool)
+
+            if state['file'] is None:
+                self._rewrite(state, vectors, ids, quantize(vectors, state['dtype'])[1])
+            elif state['dtype'] == 'int8' and float(np.max(np.abs(vectors))) > state['scale'] * 127:
+                # The batch doesn't fit the collection's scale: widen it and requantize the existing rows
+                self._rewrite(state, vectors, ids, quantize(vectors, 'int8')[1])
+            elif state['live'].sum() < len(state['ids']) / 2:
+                self._rewrite(state, vectors, ids)
+            else:
+                with open(os.path.join(self.directory, state['file']), 'ab') as vector_file:
+                    vector_file.write(quantize(vectors, state['dtype'], state['scale'])[0].tobytes())
+                self._write_index({**state, 'ids': state['ids'] + ids})
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        return self.add_embeddings(ids, self.embedding_function.embed_documents(texts), texts, metadatas)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return True
+        drop = set(ids)
+        with self._writing():
+            state = self._state()
+            if state is not None:
+                state = dict(state, ids=[None if doc_id in drop else doc_id for doc_id in state['ids']])
+                state['live'] = np.array([doc_id is not None for doc_id in state['ids']], dtype=bool)
+                if state['live'].sum() < len(state['ids']) / 2:
+                    self._rewrite(state)
+                else:
+                    self._write_index(state)
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+        return True
+
+    def compact(self):
+        """Rewrite the vector file without deleted rows. Returns the bytes reclaimed."""
+        with self._writing():
+            state = self._state()
+            if state is None or state['live'].all():
+                return 0
+            before = directory_bytes(self.directory)
+            self._rewrite(state)
+            with self._connect() as conn:
+                conn.execute("VACUUM")
+            return before - directory_bytes(self.directory)
+
+    def _fetch(self, ids):
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                for doc_id, text, metadata in conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", batch
+                ):
+                    found[doc_id] = (text, json.loads(metadata))
+        return found
+
+    def get(self, ids=None, include=None, **kwargs):
+        """Chroma-style get: {'ids', 'documents', 'metadatas'}, plus 'embeddings' (float32) when included."""
+        include = ('documents', 'metadatas') if include is None else include
+        state = self._state()
+        if state is None:
+            ids = []
+        elif ids is None:
+            ids = [doc_id for doc_id in state['ids'] if doc_id is not None]
+        else:
+            ids = [doc_id for doc_id in ids if doc_id in state['rows']]
+        result = {'ids': ids, 'documents': None, 'metadatas': None, 'embeddings': None}
+        if 'documents' in include or 'metadatas' in include:
+            found = self._fetch(ids)
+            ids = result['ids'] = [doc_id for doc_id in ids if doc_id in found]
+            result['documents'] = [found[doc_id][0] for doc_id in ids]
+            result['metadatas'] = [found[doc_id][1] for doc_id in ids]
+        if 'embeddings' in include:
+            if ids:
+                result['embeddings'] = dequantize(state['vectors'][[state['rows'][doc_id] for doc_id in ids]], state['scale'])
+            else:
+                result['embeddings'] = np.zeros((0, state['dim'] if state else 0), dtype=np.float32)
+        return result
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        state = self._state()
+        if state is None or not state['rows']:
+            return []
+        query = normalize_rows([embedding])[0]
+        vectors = state['vectors']
+        scores = np.empty(len(state['ids']), dtype=np.float32)
+        for start in range(0, len(scores), SEARCH_BLOCK_ROWS):
+            scores[start:start + SEARCH_BLOCK_ROWS] = vectors[start:start + SEARCH_BLOCK_ROWS].astype(np.float32) @ query
+        scores *= np.float32(state['scale'])
+        scores[~state['live']] = -np.inf
+        k = min(k, len(state['rows']))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = [state['ids'][row] for row in top]
+        found = self._fetch(ids)
+        return [
+            (Document(id=doc_id, page_content=found[doc_id][0], metadata=found[doc_id][1]), float(scores[row]))
+            for doc_id, row in zip(ids, top) if doc_id in found
+        ]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def get_stats(self):
+        """Rows and bytes on disk, next to what the same vectors would take as float32."""
+        state = self._state()
+        if state is None:
+            return {'rows': 0, 'deleted_rows': 0, 'vector_bytes': 0, 'float32_bytes': 0, 'bytes': 0}
+        rows = len(state['rows'])
+        return {
+            'dtype': state['dtype'],
+            'rows': rows,
+            'deleted_rows': len(state['ids']) - rows,
+            'vector_bytes': len(state['ids']) * state['dim'] * np.dtype(DTYPES[state['dtype']]).itemsize,
+            'float32_bytes': rows * state['dim'] * 4,
+            'bytes': directory_bytes(self.directory),
+        }